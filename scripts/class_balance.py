@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# Class balancing without copies of the expression matrix. boostrap_label_group and
+# subsample_label_group (crc_training.py) rebalance the label groups by stacking
+# resampled rows onto the matrix or deleting rows from it; here the rebalanced training
+# set is only an index array into the samples (oversample: every sample plus the ones
+# drawn again for the smaller groups; undersample: the samples kept of the larger
+# groups). When oversampling, learners that take sample_weight are fitted on the
+# unchanged matrix with the number of times each sample is drawn as its weight; other
+# learners, and undersampling (removed samples would still be in bootstraps, boosting
+# subsamples and CV test folds with weight 0), use the indexed rows, which only copies
+# the samples kept. The same indices rebalance the full (all TC) matrix.
+# example:
+# indx = balance_indices(label_tr, 'oversample')
+# fit_balanced(clf, expr_tr, label_tr, indx)
+# scores = cross_val_balanced(clf, expr_tr, label_tr, indx, cv=10)
+
+import numpy as np
+from sklearn.utils.validation import has_fit_parameter
+from sklearn.model_selection import cross_val_score, GridSearchCV, RandomizedSearchCV
+
+balance_modes = ['none', 'oversample', 'undersample']
+## sklearn searches, which pass sample_weight on to their estimator
+searches = (GridSearchCV, RandomizedSearchCV)
+
+
+def balance_indices(labels, mode, random_state=None):
+	## sorted sample indices of the rebalanced training set, repeated for oversampled samples
+	labels = np.asarray(labels)
+	if mode not in balance_modes[1:]:
+		raise ValueError("unknown balance mode %s, options: %s" % (mode, balance_modes[1:]))
+	rs = np.random.RandomState(random_state)
+	groups = [np.where(labels == ul)[0] for ul in np.unique(labels)]
+	if mode == 'oversample':
+		## draw with replacement from the smaller groups up to the largest
+		n = max(len(x) for x in groups)
+		indx = [np.arange(len(labels))] + [rs.choice(x, n - len(x), replace=True) for x in groups if len(x) < n]
+	else:
+		## keep as many samples of every group as the smallest has
+		n = min(len(x) for x in groups)
+		indx = [np.sort(rs.choice(x, n, replace=False)) for x in groups]
+	return np.sort(np.concatenate(indx))
+
+
+def sample_weights(indx, n_samples):
+	## times each sample is in the rebalanced set (0 for removed samples)
+	return np.bincount(indx, minlength=n_samples).astype(np.float64)
+
+
+def takes_sample_weight(clf):
+	## the learner, and every estimator that a search, wrapper or ensemble fits, accepts sample_weight
+	if not has_fit_parameter(clf, 'sample_weight') and not isinstance(clf, searches):
+		return False
+	inner = [e for (name, e) in getattr(clf, 'estimators', [])]
+	if hasattr(clf, 'estimator'):
+		inner.append(clf.estimator)
+	return all(takes_sample_weight(e) for e in inner)
+
+
+def _weighted(clf, weights):
+	return takes_sample_weight(clf) and np.all(weights > 0)
+
+
+def _pairwise(clf):
+	## sklearn 0.20 searches do not pass on the _pairwise of their estimator
+	if isinstance(clf, searches):
+		return _pairwise(clf.estimator)
+	return getattr(clf, '_pairwise', False)
+
+
+def _rows(X, indx, clf):
+	## a precomputed kernel is indexed on both axes
+	return X[np.ix_(indx, indx)] if _pairwise(clf) else X[indx]
+
+
+def fit_balanced(clf, X, y, indx=None):
+	if indx is None:
+		return clf.fit(X, y)
+	y = np.asarray(y)
+	weights = sample_weights(indx, len(y))
+	if _weighted(clf, weights):
+		return clf.fit(X, y, sample_weight=weights)
+	return clf.fit(_rows(X, indx, clf), y[indx])
+
+
+def cross_val_balanced(clf, X, y, indx=None, **kwargs):
+	## cross_val_score of the rebalanced training set; with sample weights the folds split
+	## the samples, so a sample and its resampled copies are never on both sides
+	if indx is None:
+		return cross_val_score(clf, X, y, **kwargs)
+	y = np.asarray(y)
+	weights = sample_weights(indx, len(y))
+	if _weighted(clf, weights):
+		return cross_val_score(clf, X, y, fit_params={'sample_weight': weights}, **kwargs)
+	return cross_val_score(clf, _rows(X, indx, clf), y[indx], **kwargs)
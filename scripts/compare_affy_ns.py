@@ -2,6 +2,7 @@
 import sys
 import argparse
 import numpy as np
+from indexed_axis import IndexedAxis
 # from scipy.stats.mstats import gmean
 from scipy.stats import pearsonr
 from scipy.stats import spearmanr
@@ -49,11 +50,12 @@ def main(argv):
 
 	conv_data = np.loadtxt(parsed.gene_conversion, 
 		dtype=str, delimiter="\t", usecols=[1,2])
+	chip_tcs = IndexedAxis(chip_expr[:,0], 'TC IDs')
 	gene2tc = {}
 	tc2gene = {}
 	for i in range(len(conv_data)):
 		tcs = conv_data[i,1].split(",")
-		gene2tc[conv_data[i,0]] = [tc for tc in tcs if tc in chip_expr[1:,0]]
+		gene2tc[conv_data[i,0]] = [tc for tc in tcs if tc in chip_tcs]
 		if len(conv_data[i,:]) > 1:
 			for tc in tcs:
 				tc2gene[tc] = conv_data[i,0]
@@ -62,22 +64,22 @@ def main(argv):
 	valid_ns_sample_indx = [0]
 	for j in range(1,ns_expr.shape[1]):
 		ns_expr[0,j] = ns_expr[0,j].split(".")[0]
-		if ns_expr[0,j] in ns2chip.keys():
+		if ns_expr[0,j] in ns2chip:
 			valid_ns_sample_indx.append(j)
 	ns_expr = ns_expr[:,valid_ns_sample_indx]
 
 	##remove microarray samples not in nanostring data, and
 	##reorder the microarray samples to the corresponding samples in nanostring
 	valid_chip_sample_indx = [0]
+	ns_samples = set(ns_expr[0,1:])
 	for j in range(1,chip_expr.shape[1]):
 		chip_expr[0,j] = chip_expr[0,j].split(".")[0]
-		if (chip_expr[0,j] in chip2ns.keys()) and (chip2ns[chip_expr[0,j]] in ns_expr[0,1:]):
+		if (chip_expr[0,j] in chip2ns) and (chip2ns[chip_expr[0,j]] in ns_samples):
 			valid_chip_sample_indx.append(j)
 	chip_expr = chip_expr[:,valid_chip_sample_indx]
 	
-	ns_sample_indx = [0]
-	for i in range(1,ns_expr.shape[1]):
-		ns_sample_indx.append(np.where(chip_expr[0,:] == ns2chip[ns_expr[0,i]])[0][0])
+	chip_samples = IndexedAxis(chip_expr[0,:], 'microarray samples')
+	ns_sample_indx = np.append([0], chip_samples.positions([ns2chip[x] for x in ns_expr[0,1:]]))
 
 	# import random
 	# random.shuffle(ns_sample_indx)
@@ -100,7 +102,7 @@ def main(argv):
 		if parsed.chip_de_gene_list != None:
 			chip_de_genes = np.loadtxt(parsed.chip_de_gene_list, dtype=str, skiprows=1, usecols=[0])
 			for i in range(len(chip_de_genes)):
-				if chip_de_genes[i] in tc2gene.keys():
+				if chip_de_genes[i] in tc2gene:
 					chip_de_genes[i] = tc2gene[chip_de_genes[i]]
 			ns_de_genes = np.intersect1d(ns_de_genes, chip_de_genes)
 
@@ -117,10 +119,8 @@ def main(argv):
 		gene = ns_expr[i,0]
 		ns_expr_i = np.array(ns_expr[i,1:], dtype=float)
 
-		if (gene in gene2tc.keys()) and (gene in ns_de_genes):
-			tc_indx = []
-			for tc in gene2tc[gene]:
-				tc_indx.append(np.where(chip_expr[:,0] == tc)[0][0])
+		if (gene in gene2tc) and (gene in ns_de_genes):
+			tc_indx = chip_tcs.positions(gene2tc[gene])
 			chip_expr_i = np.array(chip_expr[tc_indx,1:], dtype=float)
 			chip_expr_i = np.power(2, chip_expr_i) #since microarray expr are in log2
 			chip_expr_i = np.mean(chip_expr_i, axis=0)
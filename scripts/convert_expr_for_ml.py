@@ -2,6 +2,8 @@
 import sys
 import argparse
 import numpy as np
+from indexed_axis import IndexedAxis
+import expr_store
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description='')
@@ -13,9 +15,9 @@ def parse_args(argv):
 
 def main(argv):
 	parsed = parse_args(argv)
-	input_expr = np.loadtxt(parsed.input_expr, dtype=str, delimiter="\t")
-	samples = input_expr[0,1:]
-	genes = input_expr[1:,0]
+	[header, rownames, input_expr] = expr_store.load_expr(parsed.input_expr, keep_text=True)
+	samples = header[1:]
+	genes = rownames[:,0]
 	if parsed.top_genes != None:
 		top_genes = np.loadtxt(parsed.top_genes, dtype=str, skiprows=1, usecols=[0])
 	
@@ -25,17 +27,13 @@ def main(argv):
 		tmp = samples[i].split(".")
 		sample_ids.append(tmp[0])
 		labels.append(tmp[1])
+	sample_rows = np.hstack((np.array(sample_ids)[np.newaxis].T, np.array(labels)[np.newaxis].T))
 
-	input_expr = input_expr[1:,1:]
-	top_indx = []
 	if parsed.top_genes != None:
-		for i in range(len(top_genes)):
-			top_indx.append(np.where(genes == top_genes[i])[0][0])
-		output_expr = np.vstack((np.append(['sample','label'], top_genes)[np.newaxis], np.hstack((np.array(sample_ids)[np.newaxis].T, np.array(labels)[np.newaxis].T, input_expr[top_indx,:].T))))
+		top_indx = IndexedAxis(genes, 'TC IDs').positions(top_genes)
+		expr_store.write_expr(parsed.output_expr, np.append(['sample','label'], top_genes), sample_rows, input_expr[top_indx,:].T)
 	else:
-		output_expr = np.vstack((np.append(['sample','label'], genes)[np.newaxis], np.hstack((np.array(sample_ids)[np.newaxis].T, np.array(labels)[np.newaxis].T, input_expr.T))))
-	
-	np.savetxt(parsed.output_expr, output_expr, fmt="%s", delimiter="\t")
+		expr_store.write_expr(parsed.output_expr, np.append(['sample','label'], genes), sample_rows, input_expr.T)
 
 if __name__ == "__main__":
-    main(sys.argv)
\ No newline at end of file
+    main(sys.argv)
@@ -2,9 +2,11 @@
 import sys
 import argparse
 import numpy as np
+from indexed_axis import IndexedAxis
+import expr_store
 from sklearn.externals import joblib
 
-learning_algorithms = ['random_forest', 'svm', 'svr', 'neural_net', 'grad_boosting']
+learning_algorithms = ['random_forest', 'svm', 'nu_svm', 'svr', 'neural_net', 'grad_boosting', 'adaboost', 'gauss_process']
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description="")
@@ -20,28 +22,25 @@ def parse_args(argv):
 
 
 def parse_data(filename, label_col, data_col_start):
-	data = np.loadtxt(filename, dtype=str, delimiter='\t')
-	gene_id = data[0, data_col_start:]
-	sample_id = data[1:, 0]
-	expr = np.array(data[1:, data_col_start:], dtype=np.float32)
-	label = data[1:, label_col]
+	[header, rows, expr] = expr_store.load_expr(filename, data_col_start)
+	gene_id = header[data_col_start:]
+	sample_id = rows[:, 0]
+	label = rows[:, label_col]
 	return [gene_id, sample_id, expr, label]
 
 def get_predictor_expr(filename, expr, gene_id):
 	print expr.shape
 	f = open(filename, "r")
 	lines = f.readlines()
-	tc_predictors_indx = []
 	tc_predictors = []
 	for line in lines:
 		tmp_arr = line.strip().split("\t")
 		if len(tmp_arr) > 1:
-			for tmp_tc in tmp_arr[1].split(","):
-				if tmp_tc in gene_id:
-					tmp_indx = np.where(gene_id == tmp_tc)[0][0]
-					tc_predictors_indx.append(tmp_indx)
-					tc_predictors.append(tmp_tc)
-	return (tc_predictors, expr[:, tc_predictors_indx])
+			tc_predictors += tmp_arr[1].split(",")
+	## predictors absent from the data are skipped
+	genes = IndexedAxis(gene_id, 'TC IDs')
+	tc_predictors = [tc for tc in tc_predictors if tc in genes]
+	return (tc_predictors, genes.take(expr, tc_predictors, axis=1))
 
 
 def parse_normal_stats(filename):
@@ -109,7 +108,9 @@ def main(argv):
 	##### Random Forest #####
 	if parsed.learning_algorithm.lower() ==	'random_forest':
 		from sklearn.ensemble import RandomForestClassifier
-		
+		## models trained on bin codes (quantize.QuantizedModel) bin the raw features in predict
+		import quantize
+
 		# predict on validation set
 		clf = joblib.load(parsed.model_filename)
 		label_predicted = clf.predict(expr_te)
@@ -129,6 +130,8 @@ def main(argv):
 	##### SVM #####
 	elif parsed.learning_algorithm.lower() == 'svm':
 		from sklearn.svm import SVC
+		## precomputed-kernel models (kernel_cache.RBFKernelModel) build the test kernel in predict
+		import kernel_cache
 
 		# predict on validation set
 		clf = joblib.load(parsed.model_filename)
@@ -149,6 +152,7 @@ def main(argv):
 	##### Nu-SVM #####
 	elif parsed.learning_algorithm.lower() == 'nu_svm':
 		from sklearn.svm import NuSVC
+		import kernel_cache
 
 		# predict on validation set
 		clf = joblib.load(parsed.model_filename)
@@ -169,6 +173,7 @@ def main(argv):
 	##### SVR #####
 	elif parsed.learning_algorithm.lower() == 'svr':
 		from sklearn.svm import SVR
+		import kernel_cache
 
 		# predict on validation set
 		clf = joblib.load(parsed.model_filename)
@@ -203,6 +208,9 @@ def main(argv):
 	##### Gradient Boosting #####
 	elif parsed.learning_algorithm.lower() == 'grad_boosting':
 		from sklearn.ensemble import GradientBoostingClassifier
+		## binned models (hist_boosting, quantize.QuantizedModel) bin the raw features in predict
+		import hist_boosting
+		import quantize
 		
 		# ## convert to two class
 		# label_te = np.array([1 if x=='P' or x=='C' else 0 for x in label_te])
@@ -250,6 +258,8 @@ def main(argv):
 	elif parsed.learning_algorithm.lower() == "adaboost":
 		from sklearn.ensemble import AdaBoostClassifier
 		from sklearn.tree import DecisionTreeClassifier
+		## models trained on bin codes (quantize.QuantizedModel) bin the raw features in predict
+		import quantize
 
 		# predict on validation set
 		clf = joblib.load(parsed.model_filename)
@@ -271,6 +281,7 @@ def main(argv):
 	elif parsed.learning_algorithm.lower() == 'gauss_process':
 		from sklearn.gaussian_process import GaussianProcessClassifier
 		from sklearn.gaussian_process.kernels import RBF
+		import kernel_cache
 		
 		# predict on validation set
 		clf = joblib.load(parsed.model_filename)
@@ -0,0 +1,155 @@
+#!/usr/bin/python
+# train-many: load the training matrix once and train a list of learning algorithms
+# concurrently. Every model is fitted in its own forked process, which inherits the
+# loaded matrix, with a budget of -c cores (the n_jobs of its forests and CV searches);
+# the -j cores are shared, so up to j/c models train at a time. Models are written to
+# <output>/<algorithm>/<algorithm>_model.pkl as crc_training.py -o writes them, and the
+# wall and CPU time of every model (its n_jobs workers included) to
+# <output>/training_times.txt.
+# example:
+# python crc_train_many.py -i ../data/run_proj_batch1-17_1/training/training_set.txt -a random_forest svm neural_net grad_boosting adaboost gauss_process -j 8 -c 2 -o ../data/run_proj_batch1-17_1/training
+
+import sys
+import os
+import argparse
+import shutil
+import time
+import resource
+import traceback
+import multiprocessing
+import Queue
+import numpy as np
+import crc_training
+import class_balance
+
+REPORT_FILENAME = 'training_times.txt'
+REPORT_COLUMNS = ['algorithm', 'status', 'n_jobs', 'wall_sec', 'cpu_sec']
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Train several learning algorithms on one training set in parallel.')
+	parser.add_argument('-i', '--input_expr', dest='input_expr')
+	parser.add_argument('-a', '--learning_algorithms', dest='learning_algorithms', nargs='+', default=crc_training.learning_algorithms, help='options: %s' % crc_training.learning_algorithms)
+	parser.add_argument('-j', '--cores', dest='cores', type=int, default=multiprocessing.cpu_count())
+	parser.add_argument('-c', '--cores_per_model', dest='cores_per_model', type=int, default=4)
+	parser.add_argument('-cv', '--cross_valid', dest='cross_valid', default=None, type=int)
+	parser.add_argument('-cvs', '--cv_seed', dest='cv_seed', default=None, type=int, help='shuffle the stratified CV folds with this seed')
+	parser.add_argument('-cs', '--cv_search', dest='cv_search', default='exhaustive', help='options: %s' % crc_training.cv_searches)
+	parser.add_argument('-gb', '--boosting', dest='boosting', default='sklearn', help='grad_boosting backend, options: %s' % crc_training.boosting_backends)
+	parser.add_argument('-b', '--balance', dest='balance', default='none', help='rebalance the label groups by sample weights, options: %s' % class_balance.balance_modes)
+	parser.add_argument('-q', '--quantize', dest='quantize', action='store_true', help='train %s on uint8 bin codes of the features' % crc_training.quantized_algorithms)
+	parser.add_argument('-g', '--grow_forest', dest='grow_forest', action='store_true', help='random_forest: grow trees until the out-of-bag accuracy plateaus')
+	parser.add_argument('-rg', '--rbf_gamma', dest='rbf_gamma', nargs='+', type=float, default=None, help='svm, nu_svm, svr: RBF kernel gamma values searched with -cv (default 1/n_features)')
+	parser.add_argument('-o', '--output_directory', dest='output_directory')
+	parsed = parser.parse_args(argv[1:])
+	parsed.learning_algorithms = [x.lower() for x in parsed.learning_algorithms]
+	unknown = [x for x in parsed.learning_algorithms if x not in crc_training.learning_algorithms]
+	if len(unknown) > 0:
+		sys.exit("Error: unknown learning algorithms %s, options: %s" % (", ".join(unknown), crc_training.learning_algorithms))
+	if parsed.cv_search not in crc_training.cv_searches:
+		sys.exit("Error: unknown CV search %s, options: %s" % (parsed.cv_search, crc_training.cv_searches))
+	if parsed.boosting not in crc_training.boosting_backends:
+		sys.exit("Error: unknown boosting backend %s, options: %s" % (parsed.boosting, crc_training.boosting_backends))
+	if parsed.balance not in class_balance.balance_modes:
+		sys.exit("Error: unknown balance mode %s, options: %s" % (parsed.balance, class_balance.balance_modes))
+	if parsed.cores_per_model < 1 or parsed.cores < parsed.cores_per_model:
+		sys.exit("Error: need 1 <= cores per model (-c) <= cores (-j)")
+	return parsed
+
+
+def model_directory(output_directory, algorithm):
+	## emptied first, as crc_training.py does with its -o directory
+	directory = os.path.join(output_directory, algorithm) + '/'
+	if os.path.exists(directory):
+		shutil.rmtree(directory)
+	os.makedirs(directory)
+	return directory
+
+
+def _cpu_time():
+	## CPU seconds of this process and of its reaped children (the model's n_jobs workers)
+	usage = [resource.getrusage(x) for x in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]]
+	return sum(x.ru_utime + x.ru_stime for x in usage)
+
+
+def _stop_workers():
+	## joblib keeps its loky workers for reuse; reaping them adds their CPU time to RUSAGE_CHILDREN
+	from sklearn.externals.joblib.externals.loky import get_reusable_executor
+	get_reusable_executor().shutdown(wait=True)
+
+
+def _train(algorithm, expr_tr, label_tr, balance, parsed, queue):
+	(wall_start, cpu_start) = (time.time(), _cpu_time())
+	status = 'ok'
+	try:
+		## seeded folds are index arrays: every process builds the same ones
+		cross_valid = parsed.cross_valid
+		if cross_valid and parsed.cv_seed != None:
+			cross_valid = crc_training.generate_cross_validation(label_tr, parsed.cross_valid, parsed.cv_seed)
+		clf = crc_training.train_model(algorithm, expr_tr, label_tr, cross_valid, parsed.cores_per_model, parsed.cv_search, parsed.grow_forest, parsed.boosting, parsed.quantize, balance, parsed.rbf_gamma)
+		crc_training.save_model(clf, model_directory(parsed.output_directory, algorithm), algorithm)
+	except Exception:
+		traceback.print_exc()
+		status = 'failed'
+	_stop_workers()
+	sys.stdout.flush()
+	queue.put((algorithm, status, time.time() - wall_start, _cpu_time() - cpu_start))
+
+
+def train_many(expr_tr, label_tr, balance, parsed):
+	## [algorithm, status, n_jobs, wall, cpu] of every algorithm, in the order they finished
+	slots = parsed.cores / parsed.cores_per_model
+	queue = multiprocessing.Queue()
+	pending = list(parsed.learning_algorithms)
+	running = {}
+	report = []
+	while len(pending) > 0 or len(running) > 0:
+		while len(pending) > 0 and len(running) < slots:
+			algorithm = pending.pop(0)
+			running[algorithm] = (multiprocessing.Process(target=_train, args=(algorithm, expr_tr, label_tr, balance, parsed, queue)), time.time())
+			running[algorithm][0].start()
+			print "Training", algorithm, "on", parsed.cores_per_model, "cores"
+		try:
+			(algorithm, status, wall, cpu) = queue.get(timeout=5)
+		except Queue.Empty:
+			## a process killed before it could report (out of memory, signal)
+			for (algorithm, (proc, started)) in running.items():
+				if not proc.is_alive() and proc.exitcode != 0:
+					proc.join()
+					del running[algorithm]
+					report.append([algorithm, 'failed (exit code %d)' % proc.exitcode, parsed.cores_per_model, time.time() - started, np.nan])
+			continue
+		if algorithm not in running:
+			continue
+		running.pop(algorithm)[0].join()
+		report.append([algorithm, status, parsed.cores_per_model, wall, cpu])
+		print "Trained", algorithm, ":", status, ",", wall, "sec"
+	return report
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	[gene_id, sample_id, expr_tr, label_tr] = crc_training.parse_data(parsed.input_expr, 1, 2)
+	print "Training set dimension:", expr_tr.shape[0], "samples x", expr_tr.shape[1], "features"
+	## one rebalancing (sample weights / row indices) shared by all models
+	balance = class_balance.balance_indices(label_tr, parsed.balance) if parsed.balance != 'none' else None
+	if not os.path.exists(parsed.output_directory):
+		os.makedirs(parsed.output_directory)
+
+	time_start = time.time()
+	report = train_many(expr_tr, label_tr, balance, parsed)
+	time_total = time.time() - time_start
+
+	with open(os.path.join(parsed.output_directory, REPORT_FILENAME), 'w') as f:
+		f.write('\t'.join(REPORT_COLUMNS) + '\n')
+		for row in report:
+			f.write('\t'.join(str(x) for x in row[:3]) + '\t' + '\t'.join('%.2f' % x for x in row[3:]) + '\n')
+		f.write('total\t\t%d\t%.2f\t\n' % (parsed.cores, time_total))
+	print "Training time elapsed:", time_total, "sec"
+	failed = [row[0] for row in report if row[1] != 'ok']
+	if len(failed) > 0:
+		sys.exit("Error: training failed for " + ", ".join(failed))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -4,11 +4,23 @@ import os
 import argparse
 import shutil
 import numpy as np
+from indexed_axis import IndexedAxis
+import expr_store
 import time
 from sklearn.externals import joblib
-import random
-
-learning_algorithms = ['random_forest', 'svm', 'nu_svm', 'svr', 'neural_net', 'grad_boosting']
+from halving_search import HalvingSearchCV
+from staged_search import StagedBoostingCV, write_surface
+import kernel_cache
+import forest_growth
+import quantize
+import class_balance
+import cv_folds
+
+learning_algorithms = ['random_forest', 'svm', 'nu_svm', 'svr', 'neural_net', 'grad_boosting', 'adaboost', 'gauss_process']
+cv_searches = ['exhaustive', 'halving', 'staged']
+boosting_backends = ['sklearn', 'hist']
+## tree models that can be trained on the uint8 bin codes (-q)
+quantized_algorithms = ['random_forest', 'grad_boosting', 'adaboost']
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description="")
@@ -19,50 +31,50 @@ def parse_args(argv):
 	parser.add_argument('-s', '--normal_stats', dest='normal_stats')
 	parser.add_argument('-o', '--output_directory', dest='output_directory')
 	parser.add_argument('-cv', '--cross_valid', dest='cross_valid', default=None, type=int)
+	parser.add_argument('-cvs', '--cv_seed', dest='cv_seed', default=None, type=int, help='shuffle the stratified CV folds with this seed')
+	parser.add_argument('-cs', '--cv_search', dest='cv_search', default='exhaustive', help='options: %s (staged: grad_boosting and adaboost only, exhaustive for the others)' % cv_searches)
+	parser.add_argument('-gb', '--boosting', dest='boosting', default='sklearn', help='grad_boosting backend, options: %s' % boosting_backends)
+	parser.add_argument('-b', '--balance', dest='balance', default='none', help='rebalance the label groups by sample weights, options: %s' % class_balance.balance_modes)
+	parser.add_argument('-q', '--quantize', dest='quantize', action='store_true', help='train %s on uint8 bin codes of the features' % quantized_algorithms)
+	parser.add_argument('-g', '--grow_forest', dest='grow_forest', action='store_true', help='random_forest: grow trees until the out-of-bag accuracy plateaus')
+	parser.add_argument('-rg', '--rbf_gamma', dest='rbf_gamma', nargs='+', type=float, default=None, help='svm, nu_svm, svr: RBF kernel gamma values searched with -cv (default 1/n_features)')
 	parsed = parser.parse_args(argv[1:])
+	if parsed.cv_search not in cv_searches:
+		sys.exit("Error: unknown CV search %s, options: %s" % (parsed.cv_search, cv_searches))
+	if parsed.boosting not in boosting_backends:
+		sys.exit("Error: unknown boosting backend %s, options: %s" % (parsed.boosting, boosting_backends))
+	if parsed.balance not in class_balance.balance_modes:
+		sys.exit("Error: unknown balance mode %s, options: %s" % (parsed.balance, class_balance.balance_modes))
 	return parsed
 
 
 def parse_data(filename, label_col, data_col_start):
-	data = np.loadtxt(filename, dtype=str, delimiter='\t')
-	gene_id = data[0, data_col_start:]
-	sample_id = data[1:, 0]
-	expr = np.array(data[1:, data_col_start:], dtype=np.float32)
-	label = data[1:, label_col]
+	[header, rows, expr] = expr_store.load_expr(filename, data_col_start)
+	gene_id = header[data_col_start:]
+	sample_id = rows[:, 0]
+	label = rows[:, label_col]
 	return [gene_id, sample_id, expr, label]
 
 
-def generate_cross_validation(expr_tr, label_tr, n_folds=10):
+def generate_cross_validation(label_tr, n_folds=10, seed=None):
 	# make sure at least one Normal, at least one CRC in each fold
-	indx_N = np.where(label_tr == "N")[0]
-	indx_C = np.setdiff1d(range(len(label_tr)), indx_N)
-	random.shuffle(indx_N)
-	random.shuffle(indx_C)
-	indx_N_rand_chunks = np.array_split(indx_N, n_folds)
-	indx_C_rand_chunks = np.array_split(indx_C, n_folds)
-	expr_tr_rand_chuks = []
-	label_tr_rand_chuks = []
-	for i in range(len(indx_N_rand_chunks)):
-		indx_combined = list(indx_N_rand_chunks[i]) + list(indx_C_rand_chunks[i])
-		expr_tr_rand_chuks.append(expr_tr[indx_combined,:])
-		label_tr_rand_chuks.append(label_tr[indx_combined])
-	return (np.array(expr_tr_rand_chuks), np.array(label_tr_rand_chuks))
+	## every label group is split across the folds; the folds are index arrays into expr_tr
+	## (cv_folds.py), not copies of its rows, and are the cv argument of the searches
+	return cv_folds.StratifiedFolds(label_tr, n_folds, seed)
 
 
 def get_predictor_expr(filename, expr, gene_id):
 	f = open(filename, "r")
 	lines = f.readlines()
-	tc_predictors_indx = []
 	tc_predictors = []
 	for line in lines:
 		tmp_arr = line.strip().split("\t")
 		if len(tmp_arr) > 1:
-			for tmp_tc in tmp_arr[1].split(","):
-				if tmp_tc in gene_id:
-					tmp_indx = np.where(gene_id == tmp_tc)[0][0]
-					tc_predictors_indx.append(tmp_indx)
-					tc_predictors.append(tmp_tc)
-	return (tc_predictors, expr[:, tc_predictors_indx])
+			tc_predictors += tmp_arr[1].split(",")
+	## predictors absent from the data are skipped
+	genes = IndexedAxis(gene_id, 'TC IDs')
+	tc_predictors = [tc for tc in tc_predictors if tc in genes]
+	return (tc_predictors, genes.take(expr, tc_predictors, axis=1))
 
 
 def parse_predictor_stats(expr):
@@ -149,46 +161,35 @@ def parse_cv_result(clf):
 	return opt_params
 
 
-def main(argv):
-	# parse data
-	parsed = parse_args(argv)
-	if parsed.output_directory != None:
-		parsed.output_directory += '/' if (not parsed.output_directory.endswith('/')) else ''
-		if (os.path.exists(parsed.output_directory)):
-			shutil.rmtree(parsed.output_directory)
-		os.makedirs(parsed.output_directory)
-	
-	[gene_id, sample_id, expr_tr, label_tr] = parse_data(parsed.input_expr, 1, 2)
-	[gene_id_full, foo, expr_tr_full, foo] = parse_data(parsed.input_expr_full, 1, 2)
+def train_model(algorithm, expr_tr, label_tr, cross_valid=None, n_jobs=4, search='exhaustive', grow_forest=False, boosting='sklearn', quantized=False, balance=None, gammas=None):
+	## fit (and optionally tune by cross_valid-fold CV) one learning algorithm; n_jobs is its core budget;
+	## balance: class_balance.balance_indices of the training set, if rebalanced;
+	## gammas: the RBF gamma values of svm, nu_svm and svr (the first one without CV)
+	if quantized and algorithm in quantized_algorithms and not (algorithm == 'grad_boosting' and boosting == 'hist'):
+		## bin the training set once; the CV search and the model use its uint8 codes
+		edges = quantize.bin_edges(expr_tr)
+		clf = train_model(algorithm, quantize.apply_bins(expr_tr, edges), label_tr, cross_valid, n_jobs, search, grow_forest, boosting, balance=balance, gammas=gammas)
+		return quantize.QuantizedModel.fitted(clf, edges)
 
-	## boostrap the label groups with smaller samples
-	# [foo, expr_tr_full, foo] = boostrap_label_group(sample_id, expr_tr_full, label_tr)
-	# [sample_id, expr_tr, label_tr] = boostrap_label_group(sample_id, expr_tr, label_tr)
-	## subsample the label groups with larger samples
-	# [foo, expr_tr_full, foo] = subsample_label_group(sample_id, expr_tr_full, label_tr)
-	# [sample_id, expr_tr, label_tr] = subsample_label_group(sample_id, expr_tr, label_tr)
-	
-	label_unique= np.unique(label_tr)
-	label_count = np.array([len(np.where(label_tr == l)[0]) for l in label_unique])
-
-	print "Training set dimension:", expr_tr.shape[0], "samples x", expr_tr.shape[1], "features"
-	print "CRC labels:", label_unique, ", counts:", label_count
-
-	time_start = time.clock()
-	
 	##### Random Forest #####
-	if parsed.learning_algorithm.lower() ==	'random_forest':
+	if algorithm ==	'random_forest':
 		from sklearn.ensemble import RandomForestClassifier
 
-		if parsed.cross_valid:
+		if cross_valid:
 			## sklearn model selection
 			from sklearn.model_selection import GridSearchCV
 			rf = RandomForestClassifier()
 			hyperparams = {'n_estimators': [250, 500, 1000],
 							'criterion': ['gini', 'entropy'],
 							'class_weight': [None, 'balanced']}
-			clf = GridSearchCV(rf, hyperparams, cv=parsed.cross_valid, n_jobs=4)
-			clf.fit(expr_tr, label_tr)
+			if grow_forest:
+				## the number of trees is set by the OOB curve, so the grid uses the smallest forest
+				rf.set_params(n_estimators=min(hyperparams.pop('n_estimators')))
+			if search == 'halving':
+				clf = HalvingSearchCV(rf, hyperparams, resource='n_samples' if grow_forest else 'n_estimators', cv=cross_valid, n_jobs=n_jobs)
+			else:
+				clf = GridSearchCV(rf, hyperparams, cv=cross_valid, n_jobs=n_jobs)
+			class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 			params = parse_cv_result(clf)
 		else:
 			params = {'n_estimators': 1000,
@@ -196,23 +197,21 @@ def main(argv):
 							'class_weight': None}
 			
 		## train the model
-		clf = RandomForestClassifier(n_estimators=params['n_estimators'], 
+		clf = RandomForestClassifier(n_estimators=params.get('n_estimators', 1000), 
 										criterion=params['criterion'],
 										class_weight=params['class_weight'],
 										oob_score=True,
-										n_jobs=4, 
+										n_jobs=n_jobs, 
 										verbose=False)
-		clf.fit(expr_tr, label_tr)
+		if grow_forest:
+			clf = forest_growth.grow_forest(clf, expr_tr, label_tr, step=50, max_estimators=1000, balance=balance)
+		else:
+			class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 		label_pred = clf.predict(expr_tr)
 		accuracy_pred = clf.score(expr_tr, label_tr)
 		print "Training accuracy:", accuracy_pred
 		print "Out-of-bag accuracy:", clf.oob_score_
 
-		## save the model
-		if parsed.output_directory != None:
-			joblib.dump(clf, parsed.output_directory + 
-				parsed.learning_algorithm.lower() + '_model.pkl')
-		
 		## sort genes by importance
 		num_most_important_gene = 25
 		gene_score = clf.feature_importances_
@@ -221,144 +220,144 @@ def main(argv):
 
 
 	##### C-SVM #####
-	elif parsed.learning_algorithm.lower() == 'svm':
+	elif algorithm == 'svm':
 		from sklearn.svm import SVC
+		## RBF kernel, by default with gamma 1/n_features, from the cached training distances
+		gammas = gammas or [1. / expr_tr.shape[1]]
 
-		if parsed.cross_valid:
+		if cross_valid:
 			## sklearn model selection
 			from sklearn.model_selection import GridSearchCV
-			svm = SVC()
+			svm = kernel_cache.PrecomputedRBF(SVC(kernel='precomputed'))
 			
 			# hyperparams = {'C': [.5, 1., 1.5, 2., 3,4,5,8,10],
 			# 				'kernel':['rbf'],
 			# 				# 'kernel': ['rbf', 'linear', 'poly', 'sigmoid'],
 			# 				'class_weight': [None]}
-			# clf = GridSearchCV(svm, hyperparams, cv=parsed.cross_valid, n_jobs=4)
+			# clf = GridSearchCV(svm, hyperparams, cv=cross_valid, n_jobs=n_jobs)
 
 			from sklearn.model_selection import RandomizedSearchCV
 			import scipy.stats as ss
-			hyperparams = {'C': ss.expon(scale=10), #randomized parameters
-							'kernel':['rbf'],
+			hyperparams = {'estimator__C': ss.expon(scale=10), #randomized parameters
 							# 'kernel': ['rbf', 'linear', 'poly', 'sigmoid'],
-							'class_weight': [None]}
-			clf = RandomizedSearchCV(svm, hyperparams, n_iter=500, cv=parsed.cross_valid, n_jobs=4)
+							'estimator__class_weight': [None],
+							'gamma': gammas}
+			if search == 'halving':
+				clf = HalvingSearchCV(svm, hyperparams, n_candidates=500, resource='n_samples', cv=cross_valid, n_jobs=n_jobs)
+			else:
+				clf = RandomizedSearchCV(svm, hyperparams, n_iter=500, cv=cross_valid, n_jobs=n_jobs)
 			
-			clf.fit(expr_tr, label_tr)
-			params = parse_cv_result(clf)
+			class_balance.fit_balanced(clf, kernel_cache.cached_squared_distances(expr_tr), label_tr, balance)
+			params = kernel_cache.search_params(parse_cv_result(clf))
 		else:
 			params = {'C': 1.2, #1.1 for 330 samples, 4.5 for 273 samples
-						'kernel': 'rbf',
-						'class_weight': None}
+						'class_weight': None,
+						'gamma': gammas[0]}
 
 		## train the model
-		clf = SVC(C=params['C'], 
-					kernel=params['kernel'], 
+		clf = kernel_cache.RBFKernelModel(SVC(C=params['C'], 
+					kernel='precomputed', 
 					class_weight=params['class_weight'],
 					probability=True, 
-					verbose=False)
-		clf.fit(expr_tr, label_tr)
+					verbose=False), params['gamma'])
+		class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 		label_pred = clf.predict(expr_tr)
 		accuracy_pred = clf.score(expr_tr, label_tr)
 		print "Training accuracy:", accuracy_pred
 
-		## save the model
-		if parsed.output_directory != None:
-			joblib.dump(clf, parsed.output_directory + 
-				parsed.learning_algorithm.lower() + '_model.pkl')
-
 
 	##### Nu-SVM #####
-	elif parsed.learning_algorithm.lower() == 'nu_svm':
+	elif algorithm == 'nu_svm':
 		from sklearn.svm import NuSVC
+		## RBF kernel, by default with gamma 1/n_features, from the cached training distances
+		gammas = gammas or [1. / expr_tr.shape[1]]
 
-		if parsed.cross_valid:
+		if cross_valid:
 			## sklearn model selection
 			from sklearn.model_selection import GridSearchCV
-			svm = NuSVC()
+			svm = kernel_cache.PrecomputedRBF(NuSVC(kernel='precomputed'))
 			
 			# hyperparams = {'C': [.5, 1., 1.5, 2., 3,4,5,8,10],
 			# 				'kernel':['rbf'],
 			# 				# 'kernel': ['rbf', 'linear', 'poly', 'sigmoid'],
 			# 				'class_weight': [None]}
-			# clf = GridSearchCV(svm, hyperparams, cv=parsed.cross_valid, n_jobs=4)
+			# clf = GridSearchCV(svm, hyperparams, cv=cross_valid, n_jobs=n_jobs)
 
 			from sklearn.model_selection import RandomizedSearchCV
 			import scipy.stats as ss
-			hyperparams = {'nu': ss.expon(scale=10), #randomized parameters
-							'kernel':['rbf'],
+			hyperparams = {'estimator__nu': ss.expon(scale=10), #randomized parameters
 							# 'kernel': ['rbf', 'linear', 'poly', 'sigmoid'],
-							'class_weight': [None]}
-			clf = RandomizedSearchCV(svm, hyperparams, n_iter=500, cv=parsed.cross_valid, n_jobs=4)
+							'estimator__class_weight': [None],
+							'gamma': gammas}
+			if search == 'halving':
+				clf = HalvingSearchCV(svm, hyperparams, n_candidates=500, resource='n_samples', cv=cross_valid, n_jobs=n_jobs)
+			else:
+				clf = RandomizedSearchCV(svm, hyperparams, n_iter=500, cv=cross_valid, n_jobs=n_jobs)
 			
-			clf.fit(expr_tr, label_tr)
-			params = parse_cv_result(clf)
+			class_balance.fit_balanced(clf, kernel_cache.cached_squared_distances(expr_tr), label_tr, balance)
+			params = kernel_cache.search_params(parse_cv_result(clf))
 		else:
 			params = {'nu': 0.82, 
-						'kernel': 'rbf',
-						'class_weight': 'balanced'}
+						'class_weight': 'balanced',
+						'gamma': gammas[0]}
 
 		## train the model
-		clf = NuSVC(nu=params['nu'], 
-					kernel=params['kernel'], 
+		clf = kernel_cache.RBFKernelModel(NuSVC(nu=params['nu'], 
+					kernel='precomputed', 
 					class_weight=params['class_weight'],
 					probability=True, 
-					verbose=False)
-		clf.fit(expr_tr, label_tr)
+					verbose=False), params['gamma'])
+		class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 		label_pred = clf.predict(expr_tr)
 		accuracy_pred = clf.score(expr_tr, label_tr)
 		print "Training accuracy:", accuracy_pred
 
-		## save the model
-		if parsed.output_directory != None:
-			joblib.dump(clf, parsed.output_directory + 
-				parsed.learning_algorithm.lower() + '_model.pkl')
-
 
 	##### SVR #####
-	elif parsed.learning_algorithm.lower() == 'svr':
+	elif algorithm == 'svr':
 		from sklearn.svm import SVR
+		## RBF kernel, by default with gamma 1/n_features, from the cached training distances
+		gammas = gammas or [1. / expr_tr.shape[1]]
 
-		if parsed.cross_valid:
+		if cross_valid:
 			## sklearn model selection
-			svr = SVR()
+			svr = kernel_cache.PrecomputedRBF(SVR(kernel='precomputed'))
 			from sklearn.model_selection import GridSearchCV
 			
 			# hyperparams = {'C': [.5, 1., 1.5, 2., 3,4,5,8,10],
 			# 				'kernel':['rbf'],
 			# 				# 'kernel': ['rbf', 'linear', 'poly', 'sigmoid'],
 			# 				'class_weight': [None]}
-			# clf = GridSearchCV(svr, hyperparams, cv=parsed.cross_valid, n_jobs=4)
+			# clf = GridSearchCV(svr, hyperparams, cv=cross_valid, n_jobs=n_jobs)
 
 			from sklearn.model_selection import RandomizedSearchCV
 			import scipy.stats as ss
-			hyperparams = {'C': ss.expon(scale=10), #randomized parameters
-							'kernel':['rbf'], # 'kernel': ['rbf', 'linear', 'poly', 'sigmoid']
-							}
-			clf = RandomizedSearchCV(svr, hyperparams, n_iter=500, cv=parsed.cross_valid, n_jobs=4)
+			hyperparams = {'estimator__C': ss.expon(scale=10), #randomized parameters
+							# 'kernel': ['rbf', 'linear', 'poly', 'sigmoid']
+							'gamma': gammas}
+			if search == 'halving':
+				clf = HalvingSearchCV(svr, hyperparams, n_candidates=500, resource='n_samples', cv=cross_valid, n_jobs=n_jobs)
+			else:
+				clf = RandomizedSearchCV(svr, hyperparams, n_iter=500, cv=cross_valid, n_jobs=n_jobs)
 			
-			clf.fit(expr_tr, convert_labels(label_tr))
-			params = parse_cv_result(clf)
+			class_balance.fit_balanced(clf, kernel_cache.cached_squared_distances(expr_tr), convert_labels(label_tr), balance)
+			params = kernel_cache.search_params(parse_cv_result(clf))
 		else:
 			params = {'C': 1.1, #1.1 for 330 samples, 4.5 for 273 samples
-						'kernel': 'rbf'}
+						'gamma': gammas[0]}
 
 		## train the model
-		clf = SVR(C=params['C'], 
-					kernel=params['kernel'], 
-					verbose=False)
-		clf.fit(expr_tr, convert_labels(label_tr))
+		clf = kernel_cache.RBFKernelModel(SVR(C=params['C'], 
+					kernel='precomputed', 
+					verbose=False), params['gamma'])
+		class_balance.fit_balanced(clf, expr_tr, convert_labels(label_tr), balance)
 		label_pred = clf.predict(expr_tr)
 		accuracy_pred = clf.score(expr_tr, convert_labels(label_tr)) #coefficient of determination R^2 of the prediction
 		print "Training accuracy:", accuracy_pred
 
-		## save the model
-		if parsed.output_directory != None:
-			joblib.dump(clf, parsed.output_directory + 
-				parsed.learning_algorithm.lower() + '_model.pkl')
-
 
 	##### Neural Network #####
-	elif parsed.learning_algorithm.lower() == 'neural_net':
+	elif algorithm == 'neural_net':
 		from sklearn.linear_model import LogisticRegression
 		from sklearn.neural_network import BernoulliRBM
 		from sklearn.pipeline import Pipeline
@@ -367,49 +366,62 @@ def main(argv):
 		logistic = LogisticRegression(C=10)
 		rbm = BernoulliRBM(n_components=256, learning_rate=.001, n_iter=100, verbose=False)
 		clf = Pipeline(steps=[('rmb', rbm), ('logistic', logistic)])
-		clf.fit(expr_tr, label_tr)
-		if parsed.output_directory != None:
-			joblib.dump(clf, parsed.output_directory + 
-				parsed.learning_algorithm.lower() + '_model.pkl')
+		class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 
 
 	##### Gradient Boosting #####		
-	elif parsed.learning_algorithm.lower() == 'grad_boosting':
-		from sklearn.ensemble import GradientBoostingClassifier
+	elif algorithm == 'grad_boosting':
+		if boosting == 'hist':
+			## trees on <= 64 uint8 bins per feature, early stopping on a held-out 10%
+			from hist_boosting import HistGradientBoostingClassifier as GradientBoostingClassifier
+			backend_params = {'max_bins': 64}
+		else:
+			from sklearn.ensemble import GradientBoostingClassifier
+			backend_params = {}
 
 		# ## convert to two class 
 		# label_tr = [1 if x=='P' or x=='C' else 0 for x in label_tr]
 
-		if parsed.cross_valid:
+		if cross_valid:
 			## sklearn model selection
 			from sklearn.model_selection import GridSearchCV
-			gb = GradientBoostingClassifier()
+			gb = GradientBoostingClassifier(**backend_params)
 			hyperparams = {'learning_rate': [.01, .0075, .005, .001, .0005], 
 							'max_depth': [3],
 							'subsample': [1, .8, .5],
 							'n_estimators': [1000]}
-			clf = GridSearchCV(gb, hyperparams, cv=parsed.cross_valid, n_jobs=4)
-			clf.fit(expr_tr, label_tr)
+			if search == 'halving':
+				clf = HalvingSearchCV(gb, hyperparams, resource='n_estimators', cv=cross_valid, n_jobs=n_jobs)
+			elif search == 'staged':
+				clf = StagedBoostingCV(gb, hyperparams, cv=cross_valid, n_jobs=n_jobs)
+			else:
+				clf = GridSearchCV(gb, hyperparams, cv=cross_valid, n_jobs=n_jobs)
+			class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 			params = parse_cv_result(clf)
+			cv_surface = (clf.candidates_, clf.surface_) if search == 'staged' else None
 		else:
 			params = {'learning_rate': .0025, 
 						'max_depth': 3,
 						'subsample': .8,
 						'n_estimators': 1000}
+			cv_surface = None
 
 		## train the model
+		if boosting == 'hist':
+			backend_params.update({'n_iter_no_change': 50, 'validation_fraction': .1})
 		clf = GradientBoostingClassifier(learning_rate=params['learning_rate'], 
 											n_estimators=params['n_estimators'], 
 											max_depth=params['max_depth'], 
 											subsample=params['subsample'], 
-											verbose=False)
-		clf.fit(expr_tr, label_tr)
+											verbose=False,
+											**backend_params)
+		class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
+		print "Boosting iterations:", clf.n_estimators_
+		if cv_surface != None:
+			clf.staged_surface_ = cv_surface
 		label_pred = clf.predict(expr_tr)
 		accuracy_pred = clf.score(expr_tr, label_tr)
 		print "Training accuracy:", clf.score(expr_tr, label_tr)
-		if parsed.output_directory != None:
-			joblib.dump(clf, parsed.output_directory + 
-				parsed.learning_algorithm.lower() + '_model.pkl')
 
 
 		# ## calculate score for ML prediction
@@ -444,69 +456,121 @@ def main(argv):
 
 
 	##### AdaBoost #####
-	elif parsed.learning_algorithm.lower() == "adaboost":
+	elif algorithm == "adaboost":
 		from sklearn.ensemble import AdaBoostClassifier
 		from sklearn.tree import DecisionTreeClassifier
 
-		if parsed.cross_valid:
+		if cross_valid:
 			## sklearn model selection
 			from sklearn.model_selection import GridSearchCV
 			ab = AdaBoostClassifier(DecisionTreeClassifier(max_depth=3))
 			hyperparams = {'learning_rate': [.01, .0075, .005, .001, .0005], 
 							'n_estimators': [1000]}
-			clf = GridSearchCV(ab, hyperparams, cv=parsed.cross_valid, n_jobs=4)
-			clf.fit(expr_tr, label_tr)
+			if search == 'halving':
+				clf = HalvingSearchCV(ab, hyperparams, resource='n_estimators', cv=cross_valid, n_jobs=n_jobs)
+			elif search == 'staged':
+				clf = StagedBoostingCV(ab, hyperparams, cv=cross_valid, n_jobs=n_jobs)
+			else:
+				clf = GridSearchCV(ab, hyperparams, cv=cross_valid, n_jobs=n_jobs)
+			class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 			params = parse_cv_result(clf)
+			cv_surface = (clf.candidates_, clf.surface_) if search == 'staged' else None
 		else:
 			params = {'learning_rate': .0025, 
 						'n_estimators': 1000}
+			cv_surface = None
 
 		## train the model
 		clf = AdaBoostClassifier(DecisionTreeClassifier(max_depth=3), 
 									learning_rate=params['learning_rate'],
 									n_estimators=params['n_estimators'])
-		clf.fit(expr_tr, label_tr)
+		class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
+		if cv_surface != None:
+			clf.staged_surface_ = cv_surface
 		label_pred = clf.predict(expr_tr)
 		accuracy_pred = clf.score(expr_tr, label_tr)
 		print "Training accuracy:", clf.score(expr_tr, label_tr)
 
-		## save the model
-		if parsed.output_directory != None:
-			joblib.dump(clf, parsed.output_directory + 
-				parsed.learning_algorithm.lower() + '_model.pkl')
-
 
 	##### Gaussian Process #####
-	elif parsed.learning_algorithm.lower() == 'gauss_process':
+	elif algorithm == 'gauss_process':
 		from sklearn.gaussian_process import GaussianProcessClassifier
-		from sklearn.gaussian_process.kernels import RBF
 
-		if parsed.cross_valid:
+		if cross_valid:
 			## sklearn model selection
 			from sklearn.model_selection import GridSearchCV
 			gb = GaussianProcessClassifier()
 			hyperparams = {}
-			clf = GridSearchCV(gb, hyperparams, cv=parsed.cross_valid, n_jobs=4)
-			clf.fit(expr_tr, label_tr)
+			clf = GridSearchCV(gb, hyperparams, cv=cross_valid, n_jobs=n_jobs)
+			class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 			params = parse_cv_result(clf)
 		else:
 			params = {}
 
 		## train the model
-		clf = GaussianProcessClassifier(kernel=1.0 * RBF(length_scale=1.0), 
+		clf = GaussianProcessClassifier(kernel=1.0 * kernel_cache.CachedRBF(length_scale=1.0), 
 										optimizer="fmin_l_bfgs_b")
-		clf.fit(expr_tr, label_tr)
+		class_balance.fit_balanced(clf, expr_tr, label_tr, balance)
 		label_pred = clf.predict(expr_tr)
 		print "Training accuracy:", clf.score(expr_tr, label_tr)
 
-		## save the model
-		if parsed.output_directory != None:
-			joblib.dump(clf, parsed.output_directory + 
-				parsed.learning_algorithm.lower() + '_model.pkl')
 
 	else:
 		sys.exit('Improper learning algorithm option given.')
 
+	return clf
+
+
+def save_model(clf, output_directory, algorithm):
+	joblib.dump(clf, output_directory + algorithm + '_model.pkl')
+	if isinstance(clf, quantize.QuantizedModel):
+		clf = clf.estimator
+	if hasattr(clf, 'oob_curve_'):
+		forest_growth.write_oob_curve(clf.oob_curve_, output_directory + algorithm + forest_growth.OOB_CURVE_SUFFIX)
+	if hasattr(clf, 'staged_surface_'):
+		write_surface(clf.staged_surface_[0], clf.staged_surface_[1], output_directory + algorithm + '_staged_surface.txt')
+
+
+def main(argv):
+	# parse data
+	parsed = parse_args(argv)
+	if parsed.output_directory != None:
+		parsed.output_directory += '/' if (not parsed.output_directory.endswith('/')) else ''
+		if (os.path.exists(parsed.output_directory)):
+			shutil.rmtree(parsed.output_directory)
+		os.makedirs(parsed.output_directory)
+	
+	[gene_id, sample_id, expr_tr, label_tr] = parse_data(parsed.input_expr, 1, 2)
+	[gene_id_full, foo, expr_tr_full, foo] = parse_data(parsed.input_expr_full, 1, 2)
+
+	## boostrap the label groups with smaller samples
+	# [foo, expr_tr_full, foo] = boostrap_label_group(sample_id, expr_tr_full, label_tr)
+	# [sample_id, expr_tr, label_tr] = boostrap_label_group(sample_id, expr_tr, label_tr)
+	## subsample the label groups with larger samples
+	# [foo, expr_tr_full, foo] = subsample_label_group(sample_id, expr_tr_full, label_tr)
+	# [sample_id, expr_tr, label_tr] = subsample_label_group(sample_id, expr_tr, label_tr)
+	## or rebalance them as sample weights / row indices, without copies of both matrices
+	balance = class_balance.balance_indices(label_tr, parsed.balance) if parsed.balance != 'none' else None
+	
+	label_unique= np.unique(label_tr)
+	label_count = np.array([len(np.where(label_tr == l)[0]) for l in label_unique])
+
+	print "Training set dimension:", expr_tr.shape[0], "samples x", expr_tr.shape[1], "features"
+	print "CRC labels:", label_unique, ", counts:", label_count
+	if balance is not None:
+		print "Rebalanced counts:", np.array([np.sum(label_tr[balance] == l) for l in label_unique])
+
+	## seeded folds of the label groups, the same for every search; otherwise sklearn's unshuffled ones
+	cross_valid = parsed.cross_valid
+	if cross_valid and parsed.cv_seed != None:
+		cross_valid = generate_cross_validation(label_tr, parsed.cross_valid, parsed.cv_seed)
+
+	time_start = time.clock()
+	clf = train_model(parsed.learning_algorithm.lower(), expr_tr, label_tr, cross_valid, search=parsed.cv_search, grow_forest=parsed.grow_forest, boosting=parsed.boosting, quantized=parsed.quantize, balance=balance, gammas=parsed.rbf_gamma)
+
+	## save the model
+	if parsed.output_directory != None:
+		save_model(clf, parsed.output_directory, parsed.learning_algorithm.lower())
 
 	## print timer messages
 	time_end = time.clock()
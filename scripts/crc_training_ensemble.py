@@ -4,9 +4,12 @@ import os
 import argparse
 import shutil
 import numpy as np
+from indexed_axis import IndexedAxis
+import expr_store
 import time
 from sklearn.externals import joblib
-import random
+import class_balance
+import cv_folds
 
 learning_algorithms = ['random_forest', 'svm', 'neural_net', 'grad_boosting']
 
@@ -17,50 +20,41 @@ def parse_args(argv):
 	parser.add_argument('-p', '--outlier_predictors', dest='outlier_predictors')
 	parser.add_argument('-s', '--normal_stats', dest='normal_stats')
 	parser.add_argument('-o', '--output_directory', dest='output_directory')
+	parser.add_argument('-cvs', '--cv_seed', dest='cv_seed', default=None, type=int, help='shuffle the stratified CV folds with this seed')
+	parser.add_argument('-b', '--balance', dest='balance', default='none', help='rebalance the label groups by sample weights, options: %s' % class_balance.balance_modes)
 	parsed = parser.parse_args(argv[1:])
+	if parsed.balance not in class_balance.balance_modes:
+		sys.exit("Error: unknown balance mode %s, options: %s" % (parsed.balance, class_balance.balance_modes))
 	return parsed
 
 
 def parse_data(filename, label_col, data_col_start):
-	data = np.loadtxt(filename, dtype=str, delimiter='\t')
-	gene_id = data[0, data_col_start:]
-	sample_id = data[1:, 0]
-	expr = np.array(data[1:, data_col_start:], dtype=np.float32)
-	label = data[1:, label_col]
+	[header, rows, expr] = expr_store.load_expr(filename, data_col_start)
+	gene_id = header[data_col_start:]
+	sample_id = rows[:, 0]
+	label = rows[:, label_col]
 	return [gene_id, sample_id, expr, label]
 
 
-def generate_cross_validation(expr_tr, label_tr, n_folds=10):
+def generate_cross_validation(label_tr, n_folds=10, seed=None):
 	# make sure at least one Normal, at least one CRC in each fold
-	indx_N = np.where(label_tr == "N")[0]
-	indx_C = np.setdiff1d(range(len(label_tr)), indx_N)
-	random.shuffle(indx_N)
-	random.shuffle(indx_C)
-	indx_N_rand_chunks = np.array_split(indx_N, n_folds)
-	indx_C_rand_chunks = np.array_split(indx_C, n_folds)
-	expr_tr_rand_chuks = []
-	label_tr_rand_chuks = []
-	for i in range(len(indx_N_rand_chunks)):
-		indx_combined = list(indx_N_rand_chunks[i]) + list(indx_C_rand_chunks[i])
-		expr_tr_rand_chuks.append(expr_tr[indx_combined,:])
-		label_tr_rand_chuks.append(label_tr[indx_combined])
-	return (np.array(expr_tr_rand_chuks), np.array(label_tr_rand_chuks))
+	## every label group is split across the folds; the folds are index arrays into expr_tr
+	## (cv_folds.py), not copies of its rows, and are the cv argument of the searches
+	return cv_folds.StratifiedFolds(label_tr, n_folds, seed)
 
 
 def get_predictor_expr(filename, expr, gene_id):
 	f = open(filename, "r")
 	lines = f.readlines()
-	tc_predictors_indx = []
 	tc_predictors = []
 	for line in lines:
 		tmp_arr = line.strip().split("\t")
 		if len(tmp_arr) > 1:
-			for tmp_tc in tmp_arr[1].split(","):
-				if tmp_tc in gene_id:
-					tmp_indx = np.where(gene_id == tmp_tc)[0][0]
-					tc_predictors_indx.append(tmp_indx)
-					tc_predictors.append(tmp_tc)
-	return (tc_predictors, expr[:, tc_predictors_indx])
+			tc_predictors += tmp_arr[1].split(",")
+	## predictors absent from the data are skipped
+	genes = IndexedAxis(gene_id, 'TC IDs')
+	tc_predictors = [tc for tc in tc_predictors if tc in genes]
+	return (tc_predictors, genes.take(expr, tc_predictors, axis=1))
 
 
 def parse_predictor_stats(expr):
@@ -147,6 +141,8 @@ def main(argv):
 	## subsample the label groups with larger samples
 	# [foo, expr_tr_full, foo] = subsample_label_group(sample_id, expr_tr_full, label_tr)
 	# [sample_id, expr_tr, label_tr] = subsample_label_group(sample_id, expr_tr, label_tr)
+	## or rebalance them as sample weights / row indices, without copies of both matrices
+	balance = class_balance.balance_indices(label_tr, parsed.balance) if parsed.balance != 'none' else None
 	
 	label_unique= np.unique(label_tr)
 	label_count = np.array([len(np.where(label_tr == l)[0]) for l in label_unique])
@@ -206,13 +202,15 @@ def main(argv):
 
 
 	eclf = VotingClassifier(estimators=[('rf',clfrf), ('svm',clfsvm), ('gb',clfgb), ('ab',clfab), ('gp',clfgp)], voting="hard", weights=[1,1,1,1,1])
+	## 10-fold CV, the same seeded folds for every model with -cvs
+	cross_valid = generate_cross_validation(label_tr, 10, parsed.cv_seed) if parsed.cv_seed != None else 10
 	for clf, label in zip([clfrf, clfsvm, clfgb, clfab, clfgp, eclf], 
 		['Random forest', 'SVM', 'Grad boost', 'Adabost', 'Gauss proc', 'Ensemble']):
-		scores = cross_val_score(clf, expr_tr, label_tr, cv=10, scoring='accuracy')
+		scores = class_balance.cross_val_balanced(clf, expr_tr, label_tr, balance, cv=cross_valid, scoring='accuracy')
 		print("Accuracy: %0.5f (+/- %0.5f) [%s]" % (scores.mean(), scores.std(), label))
 	
 	## fit model
-	eclf = eclf.fit(expr_tr, label_tr)
+	eclf = class_balance.fit_balanced(eclf, expr_tr, label_tr, balance)
 
 	## save the model
 	if parsed.output_directory != None:
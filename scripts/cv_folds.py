@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# Stratified CV folds kept as index arrays, without copies of the expression matrix.
+# The samples of every label group (N/P/C, or N vs CRC) are shuffled with the seed and
+# split into n_folds chunks, fold i being the i-th chunk of every group; a seeded object
+# gives the folds that random.seed(seed) and random.shuffle of each group gave before.
+# split() yields the (training, held-out) indices of every fold, so the object is the
+# cv argument of GridSearchCV, RandomizedSearchCV, HalvingSearchCV, StagedBoostingCV and
+# cross_val_score. For statistics accumulated fold by fold (the DE stage), arrange()
+# puts the samples of a matrix in fold order once, and fold() is then a slice of it, a
+# view without copy.
+# example:
+# folds = StratifiedFolds(label_tr, 10, seed=0)
+# clf = GridSearchCV(rf, hyperparams, cv=folds).fit(expr_tr, label_tr)
+# chips = folds.arrange(expr, axis=1)
+# fold_1 = folds.fold(chips, 0, axis=1)
+
+import random
+import numpy as np
+
+
+class StratifiedFolds(object):
+	def __init__(self, labels, n_folds=10, seed=None, groups=None):
+		## groups: the labels stratified, in the order they are shuffled (default all, sorted);
+		## samples of other labels are in no fold
+		self.labels = np.asarray(labels)
+		self.n_folds = n_folds
+		self.seed = seed
+		self.groups = list(np.unique(self.labels)) if groups is None else list(groups)
+		self.folds = self._stratify(self.labels, self.groups)
+		self.order = np.concatenate(self.folds)
+		self.bounds = np.cumsum([0] + [len(x) for x in self.folds])
+
+	def _stratify(self, labels, groups):
+		rng = random.Random(self.seed)
+		chunks = []
+		for x in groups:
+			indx = np.where(labels == x)[0]
+			rng.shuffle(indx)
+			chunks.append(np.array_split(indx, self.n_folds))
+		return [np.concatenate([c[i] for c in chunks]) for i in range(self.n_folds)]
+
+	def get_n_splits(self, X=None, y=None, groups=None):
+		return self.n_folds
+
+	def train(self, i):
+		## samples of every fold but i, in fold order
+		return np.concatenate(self.folds[:i] + self.folds[i+1:])
+
+	def split(self, X=None, y=None, groups=None):
+		## a training set of another size (a halving round's subsample, undersampled rows) is
+		## stratified by its own labels with the same seed
+		folds = self.folds
+		if y is not None and len(y) != len(self.labels):
+			folds = self._stratify(np.asarray(y), np.unique(y))
+		for i in range(self.n_folds):
+			yield (np.concatenate(folds[:i] + folds[i+1:]), folds[i])
+
+	def arrange(self, X, axis=0):
+		## the samples of X in fold order (one copy), for fold()
+		return np.take(X, self.order, axis=axis)
+
+	def fold(self, X_arranged, i, axis=0):
+		## the samples of fold i in an arranged matrix, a view
+		indx = [slice(None)] * np.ndim(X_arranged)
+		indx[axis] = slice(self.bounds[i], self.bounds[i+1])
+		return X_arranged[tuple(indx)]
@@ -1,51 +1,91 @@
 #!/usr/bin/python
-import numpy as np
+# Variance-outlier DE genes: a gene is reported for a group when its linear-scale SD is
+# well above the normal SD and more than 10% of the group's samples lie beyond 1.5 SD
+# of the group mean. Statistics are computed for blocks of genes at once in float32.
+# example:
+# python de_analysis_sd.py ../data/run_proj_a_b_c_d/training/chipdata.txt ../data/run_proj_a_b_c_d/training/valid_chips.txt ../data/run_proj_a_b_c_d/training/top_de_genes_sd.txt
+# python de_analysis_sd.py -g N_vs_P_vs_C ../data/run_proj_a_b_c_d/training/chipdata.txt ../data/run_proj_a_b_c_d/training/valid_chips.txt ../data/run_proj_a_b_c_d/training/top_de_genes_sd.txt
+
 import sys
+import argparse
+import numpy as np
+import expr_store
+from indexed_axis import IndexedAxis
+
+## valid chip labels of the groups compared with the normals ('0')
+group_labels = {'N_vs_C': [('cancer', '1')],
+				'N_vs_P_vs_C': [('polyp', '1'), ('cancer', '2')]}
+CHUNK_SIZE = 4096
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Variance-outlier DE genes of each group against the normals.')
+	parser.add_argument('expr_data')
+	parser.add_argument('valid_chips')
+	parser.add_argument('de_genes')
+	parser.add_argument('-g', '--group', dest='group', default='N_vs_C', help='options: %s' % sorted(group_labels.keys()))
+	parser.add_argument('-c', '--chunk_size', dest='chunk_size', type=int, default=CHUNK_SIZE)
+	parsed = parser.parse_args(argv[1:])
+	if parsed.group not in group_labels:
+		sys.exit("Error: unknown group %s, options: %s" % (parsed.group, sorted(group_labels.keys())))
+	return parsed
+
+
+def group_stats(expr):
+	## mean, SD and fraction of samples beyond 1.5 SD of every row
+	mean = np.mean(expr, axis=1)
+	std = np.std(expr, axis=1)
+	outside = (expr > (mean + 1.5*std)[:,np.newaxis]) | (expr < (mean - 1.5*std)[:,np.newaxis])
+	return (mean, std, np.mean(outside, axis=1, dtype=np.float32))
+
+
+def outlier_genes(expr, indx_n, indx_groups, chunk_size=CHUNK_SIZE):
+	## per group: (mean, std, pct) of all genes and the DE mask; normals: (mean, std)
+	num_genes = expr.shape[0]
+	normal = [np.zeros(num_genes, dtype=np.float32) for i in range(2)]
+	groups = [[np.zeros(num_genes, dtype=np.float32) for i in range(3)] + [np.zeros(num_genes, dtype=bool)] for x in indx_groups]
+	for start in range(0, num_genes, chunk_size):
+		block = np.exp2(np.asarray(expr[start:start+chunk_size], dtype=np.float32))
+		(mean_n, std_n, pct_n) = group_stats(block[:,indx_n])
+		normal[0][start:start+chunk_size] = mean_n
+		normal[1][start:start+chunk_size] = std_n
+		for (indx, stats) in zip(indx_groups, groups):
+			(mean, std, pct) = group_stats(block[:,indx])
+			diff = std - std_n
+			for (x, y) in zip(stats, [mean, std, pct, (diff > .8) & (pct > .1)]):
+				x[start:start+chunk_size] = y
+	return (normal, groups)
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	[header, rows, expr] = expr_store.load_expr(parsed.expr_data)
+	genes = rows[:,0]
+	samples = header[1:]
+	valid_chips = np.loadtxt(parsed.valid_chips, dtype=str, ndmin=2)
+	labels = valid_chips[IndexedAxis(valid_chips[:,0], 'valid chips').positions(samples),1]
+
+	## every sample not in one of the compared groups counts as normal, as before
+	names = [x[0] for x in group_labels[parsed.group]]
+	indx_groups = [np.where(labels == x[1])[0] for x in group_labels[parsed.group]]
+	indx_n = np.setdiff1d(np.arange(len(samples)), np.concatenate(indx_groups))
+	print "Normal samples :", " : ".join(names), "samples =", len(indx_n), ":", " : ".join(str(len(x)) for x in indx_groups)
+
+	(normal, groups) = outlier_genes(expr, indx_n, indx_groups, parsed.chunk_size)
+	de = np.any([x[3] for x in groups], axis=0)
+	print "DE genes identified:", np.sum(de)
+
+	de_genes_header = ['TC id', 'normal mean', 'normal std']
+	columns = [genes[de], normal[0][de], normal[1][de]]
+	for (name, stats) in zip(names, groups):
+		de_genes_header += [name+' mean', name+' std', 'pct '+name+' > 1.5std']
+		columns += [x[de] for x in stats[:3]]
+	if len(names) > 1:
+		de_genes_header.append('DE groups')
+		columns.append([",".join(names[j] for j in range(len(names)) if groups[j][3][i]) for i in np.where(de)[0]])
+	de_genes = np.array([de_genes_header] + zip(*[[str(x) for x in c] for c in columns]), dtype=str)
+	np.savetxt(parsed.de_genes, de_genes.reshape(-1, len(de_genes_header)), fmt="%s", delimiter="\t")
 
-# dir_proj = "/Users/KANG/geneoscopy_dev/data/run_proj_a_b_c_d/"
-# file_expr_data = dir_proj + "training/chipdata.txt"
-# file_valid_chips = dir_proj + "training/valid_chips.txt"
-# file_de_genes = dir_proj + "training/top_de_genes_sd.txt"
-
-file_expr_data = sys.argv[1]
-file_valid_chips = sys.argv[2]
-file_de_genes = sys.argv[3]
-
-expr_data = np.loadtxt(file_expr_data, dtype=str, delimiter="\t")
-genes = expr_data[1:,0]
-samples = expr_data[0,1:]
-expr_data = np.exp2(np.array(expr_data[1:,1:], dtype=float))
-valid_chips = np.loadtxt(file_valid_chips, dtype=str)
-
-label_dict = {}
-for i in range(len(valid_chips)):
-	label_dict[valid_chips[i,0]] = valid_chips[i,1]
-
-indx_n = []
-indx_c = []
-for i in range(len(samples)):
-	if label_dict[samples[i]] == '1':
-		indx_c.append(i)
-	else:
-		indx_n.append(i)
-print "Normal samples : cancer samples =", len(indx_n), ":", len(indx_c)
-
-de_genes = []
-for i in range(len(genes)):
-	mean_n = np.mean(expr_data[i,indx_n])
-	mean_c = np.mean(expr_data[i,indx_c])
-	std_n = np.std(expr_data[i,indx_n])
-	std_c = np.std(expr_data[i,indx_c])
-	if (std_c > std_n) and (abs(std_c-std_n) > .1):
-		std_c_counts = 0
-		std_c_counts += len(np.where(expr_data[i,indx_c] > mean_c+1.5*std_c)[0])
-		std_c_counts += len(np.where(expr_data[i,indx_c] < mean_c-1.5*std_c)[0])
-		std_c_pct = std_c_counts/float(len(indx_c))
-		if (std_c_pct > .1) and (abs(std_c-std_n) > .8):
-			de_genes.append([genes[i], mean_n, std_n, mean_c, std_c, std_c_pct])
-
-print "DE genes identified:", len(de_genes)
-de_genes_header = np.array(['TC id', 'normal mean', 'normal std', 'cancer mean', 'cancer std', 'pct cancer > 1.5std'])
-de_genes = np.vstack((de_genes_header[np.newaxis], np.array(de_genes, dtype=str)))
-np.savetxt(file_de_genes, de_genes, fmt="%s", delimiter="\t")
 
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+# Incremental DE state: per-gene, per-group sample counts, sums and sums of squares.
+# The group design's least squares fit is a function of these sufficient statistics
+# only (group means, residual sum of squares), so new chip batches are folded in (or
+# samples removed) by adding/subtracting their columns, and the limma top tables are
+# recomputed in O(genes) without touching the earlier chips.
+# example:
+# python de_state.py -s ../data/de_state.npz -g N_vs_P_vs_C -i ../data/run_proj_batch1-17_1/training/chipdata.txt -v ../data/run_proj_batch1-17_1/training/valid_chips.txt
+# python de_state.py -s ../data/de_state.npz -i ../data/batch18/chipdata.txt -v ../data/batch18/valid_chips.txt -o ../data/top_de_genes.txt
+# python de_state.py -s ../data/de_state.npz -r -i ../data/batch18/chipdata.txt -v ../data/batch18/failed_chips.txt -o ../data/top_de_genes.txt
+
+import sys
+import os
+import argparse
+import numpy as np
+import expr_store
+import limma
+from indexed_axis import IndexedAxis
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Fold chip batches into (or out of) a DE state and write the limma top tables.')
+	parser.add_argument('-s', '--state', dest='state', help='state file (.npz), created by the first batch')
+	parser.add_argument('-g', '--group', dest='group', default='N_vs_P_vs_C', help='options: %s (for a new state)' % limma.groups)
+	parser.add_argument('-i', '--input_expr', dest='input_expr', default=None)
+	parser.add_argument('-v', '--valid_chips', dest='valid_chips', default=None, help='samples (and labels) to add or remove')
+	parser.add_argument('-r', '--remove', dest='remove', action='store_true', default=False)
+	parser.add_argument('-p', '--thld_pval', dest='thld_pval', type=float, default=1.)
+	parser.add_argument('-f', '--thld_fc', dest='thld_fc', type=float, default=0.)
+	parser.add_argument('-c', '--contrasts', dest='contrasts', nargs='+', default=None)
+	parser.add_argument('-m', '--merge', dest='merge', action='store_true', default=False)
+	parser.add_argument('-t', '--num_top_genes', dest='num_top_genes', type=int, default=None)
+	parser.add_argument('-o', '--output', dest='output', default=None)
+	parsed = parser.parse_args(argv[1:])
+	if parsed.merge and parsed.num_top_genes == None:
+		sys.exit("Error: -m needs the number of top genes (-t).")
+	return parsed
+
+
+class DEState(object):
+	def __init__(self, gene_ids, levels, group, shift):
+		## values are accumulated relative to a per-gene shift (the first batch's means)
+		## so sumsq - sum^2/n does not cancel catastrophically
+		self.gene_ids = np.asarray(gene_ids)
+		self.genes = IndexedAxis(self.gene_ids, 'TC IDs')
+		self.levels = list(levels)
+		self.group = group
+		self.shift = np.asarray(shift, dtype=np.float64)
+		self.samples = {}
+		self.counts = np.zeros(len(self.levels))
+		self.sums = np.zeros((len(self.gene_ids), len(self.levels)))
+		self.sumsq = np.zeros((len(self.gene_ids), len(self.levels)))
+
+	def _update(self, expr, gene_ids, labels, sign):
+		indx = self.genes.positions(gene_ids) if len(gene_ids) != len(self.gene_ids) or np.any(gene_ids != self.gene_ids) else None
+		unknown = sorted(set(labels) - set(self.levels))
+		if len(unknown) > 0:
+			sys.exit("Error: labels %s are not levels of the DE state (%s)" % (", ".join(unknown), ", ".join(self.levels)))
+		for (j, level) in enumerate(self.levels):
+			cols = np.where(np.asarray(labels) == level)[0]
+			if len(cols) == 0:
+				continue
+			y = np.asarray(np.take(expr, cols, axis=1), dtype=np.float64)
+			if indx is not None:
+				## batch rows in another gene order: align to the state
+				y_aligned = np.zeros((len(self.gene_ids), len(cols)))
+				y_aligned[indx] = y
+				y = y_aligned
+			y -= self.shift[:,np.newaxis]
+			self.counts[j] += sign * len(cols)
+			self.sums[:,j] += sign * np.sum(y, axis=1)
+			self.sumsq[:,j] += sign * np.sum(y**2, axis=1)
+
+	def add(self, expr, gene_ids, samples, labels):
+		## fold in the columns of expr (genes x samples)
+		present = [x for x in samples if x in self.samples]
+		if len(present) > 0:
+			sys.exit("Error: %d samples already in the DE state: %s" % (len(present), ", ".join(present[:20])))
+		self._update(expr, gene_ids, labels, 1)
+		for (x, label) in zip(samples, labels):
+			self.samples[x] = label
+
+	def remove(self, expr, gene_ids, samples):
+		## take out the columns of expr, with the labels they were added with
+		missing = [x for x in samples if x not in self.samples]
+		if len(missing) > 0:
+			sys.exit("Error: %d samples not in the DE state: %s" % (len(missing), ", ".join(missing[:20])))
+		labels = [self.samples[x] for x in samples]
+		self._update(expr, gene_ids, labels, -1)
+		for x in samples:
+			del self.samples[x]
+
+	def _merged(self, other, sign):
+		if len(other.gene_ids) != len(self.gene_ids) or np.any(other.gene_ids != self.gene_ids) or other.levels != self.levels:
+			sys.exit("Error: DE states over different TCs or levels")
+		if np.any(other.shift != self.shift):
+			sys.exit("Error: DE states accumulated with different shifts")
+		if sign > 0 and any(x in self.samples for x in other.samples):
+			sys.exit("Error: DE states share samples")
+		if sign < 0 and any(x not in self.samples for x in other.samples):
+			sys.exit("Error: samples to take out are not in the DE state")
+		state = DEState(self.gene_ids, self.levels, self.group, self.shift)
+		state.samples = dict(self.samples)
+		if sign > 0:
+			state.samples.update(other.samples)
+		else:
+			for x in other.samples:
+				del state.samples[x]
+		state.counts = self.counts + sign * other.counts
+		state.sums = self.sums + sign * other.sums
+		state.sumsq = self.sumsq + sign * other.sumsq
+		return state
+
+	def merged(self, other):
+		## the state of the samples of both (disjoint) states
+		return self._merged(other, 1)
+
+	def without(self, other):
+		## the state with the samples of other (a subset) taken out
+		return self._merged(other, -1)
+
+	def fit(self):
+		## the limma lmFit of the group design, from the sufficient statistics
+		if np.any(self.counts == 0):
+			sys.exit("Error: no samples left for levels %s" % ", ".join(np.array(self.levels)[self.counts == 0]))
+		n = np.sum(self.counts)
+		rss = np.sum(np.maximum(self.sumsq - self.sums**2 / self.counts, 0), axis=1)
+		df_residual = n - len(self.levels)
+		cov = np.diag(1. / self.counts)
+		return limma.LinearFit(self.sums / self.counts + self.shift[:,np.newaxis], np.sqrt(np.diag(cov)),
+			np.sqrt(rss / df_residual), df_residual, np.sum(self.sums, axis=1) / n + self.shift, cov, range(len(self.levels)))
+
+	def ebayes(self):
+		(names, contrasts) = limma.contrast_matrix(self.group, self.levels)
+		return limma.ebayes(limma.contrasts_fit(self.fit(), contrasts, names))
+
+	def save(self, filename):
+		samples = sorted(self.samples.keys())
+		tmp = filename + '.%d.tmp' % os.getpid()
+		with open(tmp, 'wb') as f:
+			np.savez(f, gene_ids=self.gene_ids, levels=np.array(self.levels), group=np.array(self.group),
+				shift=self.shift, samples=np.array(samples, dtype=str), labels=np.array([self.samples[x] for x in samples], dtype=str),
+				counts=self.counts, sums=self.sums, sumsq=self.sumsq)
+		os.rename(tmp, filename)
+
+
+def load_state(filename):
+	data = np.load(filename)
+	state = DEState(data['gene_ids'], data['levels'], str(data['group']), data['shift'])
+	state.samples = dict(zip(data['samples'], data['labels']))
+	(state.counts, state.sums, state.sumsq) = (data['counts'], data['sums'], data['sumsq'])
+	return state
+
+
+def new_state(expr, gene_ids, labels, group):
+	(design, levels) = limma.design_matrix(labels)
+	limma.contrast_matrix(group, levels)
+	shift = np.mean(np.asarray(expr, dtype=np.float64), axis=1)
+	return DEState(gene_ids, levels, group, shift)
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	state = load_state(parsed.state) if os.path.isfile(parsed.state) else None
+
+	if parsed.input_expr != None:
+		[header, rows, expr] = expr_store.load_expr(parsed.input_expr)
+		valid_chips = np.loadtxt(parsed.valid_chips, dtype=str, delimiter='\t', ndmin=2)
+		expr = np.take(expr, IndexedAxis(header[1:], 'samples').positions(valid_chips[:,0]), axis=1)
+		if state == None:
+			if parsed.remove:
+				sys.exit("Error: no DE state to remove samples from: " + parsed.state)
+			state = new_state(expr, rows[:,0], valid_chips[:,1], parsed.group)
+		if parsed.remove:
+			state.remove(expr, rows[:,0], valid_chips[:,0])
+		else:
+			state.add(expr, rows[:,0], valid_chips[:,0], valid_chips[:,1])
+		state.save(parsed.state)
+	elif state == None:
+		sys.exit("Error: no DE state and no batch to start it: " + parsed.state)
+	print "Samples in DE state:", len(state.samples), "(" + ", ".join("%s: %d" % (l, c) for (l, c) in zip(state.levels, state.counts)) + ")"
+
+	if parsed.output != None:
+		limma.write_results(state.ebayes(), state.gene_ids, parsed.output, parsed.contrasts, parsed.merge,
+			parsed.num_top_genes, parsed.thld_pval, parsed.thld_fc)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
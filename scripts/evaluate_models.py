@@ -1,8 +1,11 @@
 #!/usr/bin/python
 import numpy as np
+from indexed_axis import IndexedAxis
+import expr_store
+import limma
+import staged_search
+import quantize
 import json
-import os
-import time
 import sys
 
 from sklearn.ensemble import RandomForestClassifier
@@ -28,7 +31,7 @@ def split_expr(expr, label_split):
 	return [expr[indx_tr,:], label[indx_tr], expr[indx_te,:], label[indx_te]]
 
 
-def write_valid_chips(label_indx_dict, samples, labels, filename):
+def training_valid_chips(label_indx_dict, samples, labels):
 	out = []
 	for i in label_indx_dict['N']:
 		out.append([samples[i]+'.'+labels[i], '0', '0'])
@@ -36,17 +39,20 @@ def write_valid_chips(label_indx_dict, samples, labels, filename):
 		out.append([samples[i]+'.'+labels[i], '1', '0'])
 	for i in label_indx_dict['C']:
 		out.append([samples[i]+'.'+labels[i], '2', '0'])
-	np.savetxt(filename, np.array(out), fmt='%s', delimiter='\t')
+	return np.array(out)
 
 
-def load_de_genes(filename):
-	return np.loadtxt(filename, dtype=str, skiprows=1, usecols=[0])
+def select_de_genes(chipdata, valid_chips, num_top_genes):
+	## in-process limma fit of the training chips, top genes of the first contrast (CvsN)
+	[header, rows, expr] = chipdata
+	fit = limma.de_analysis(expr, header[1:], valid_chips, 'N_vs_P_vs_C')
+	(indx, table) = limma.top_table(fit, coef=0)
+	indx = limma.select_genes(indx, table, 1, 0)
+	return rows[indx[:num_top_genes],0]
 
 
 def filter_features(expr, features):
-	indx = np.array([0,1])
-	for f in features:
-		indx = np.append(indx, np.where(expr[0,:]==f)[0][0])
+	indx = np.append([0,1], IndexedAxis(expr[0,:], 'features').positions(features))
 	return expr[:,indx]
 
 
@@ -79,6 +85,11 @@ T = 200 #num of top genes
 
 #### Evaluation of machine learning models ####
 cross_valid = False
+## tree models (random forest, AdaBoost) train and predict on the uint8 bin codes of every split
+quantized = False
+## AdaBoost search by staged_search.StagedBoostingCV on the training split: one fit per learning
+## rate and fold, every n_estimators scored by staged predictions
+staged = True
 
 ## Load training set
 expr_full = np.loadtxt(file_expr, dtype=str, delimiter='\t')
@@ -86,11 +97,13 @@ feat_header = expr_full[0,:]
 samples = expr_full[1:,0]
 labels = expr_full[1:,1]
 
+## Load expression data for DE analysis
+chipdata = expr_store.load_expr(dir_proj + '/training/chipdata.txt')
+
 ## Randomly select N times
 label_keys = ['C', 'P', 'N']
 label_dict = {}
-
-os.system('rm -rf tmp/; mkdir tmp/')
+staged_surface = []
 
 for i in range(N):
 	print '##### Set '+ str(i+1) + ' #####'
@@ -99,22 +112,14 @@ for i in range(N):
 	label_dict[i] = {'training':{}, 'testing':{}}
 	for k in label_keys:
 		indx = np.where(labels == k)[0]
-		indx_tr = np.random.choice(indx, size=np.floor(len(indx)*.8), replace=False)
+		indx_tr = np.random.choice(indx, size=int(np.floor(len(indx)*.8)), replace=False)
 		indx_te = np.setdiff1d(indx, indx_tr)
 		label_dict[i]['training'][k] = list(indx_tr)
 		label_dict[i]['testing'][k] = list(indx_te)
 
-	## LIMMA wrapper
-	write_valid_chips(label_dict[i]['training'], samples, labels, 'tmp/valid_chips_'+str(i)+'.txt')
-
-	while not os.path.isfile('tmp/valid_chips_'+str(i)+'.txt'):
-		time.sleep(1)
-	# print('#analyzing DE genes for this set ...')
-	os.system('Rscript ../../../scripts/de_analysis.r ../training/chipdata.txt tmp/valid_chips_'+str(i)+'.txt N_vs_P_vs_C 1 0 tmp/top_de_genes_'+str(i)+'.txt; cp tmp/top_de_genes_'+str(i)+'.txt tmp/tmp.txt; head -'+ str(T+1) +' tmp/tmp.txt > tmp/top_de_genes_'+str(i)+'.txt; rm tmp/tmp.txt')
-
-	while not os.path.isfile('tmp/top_de_genes_'+str(i)+'.txt'):
-		time.sleep(5)
-	de_genes = load_de_genes('tmp/top_de_genes_'+str(i)+'.txt')
+	## LIMMA
+	valid_chips = training_valid_chips(label_dict[i]['training'], samples, labels)
+	de_genes = select_de_genes(chipdata, valid_chips, T)
 	expr = filter_features(expr_full, de_genes)
 
 
@@ -139,6 +144,12 @@ for i in range(N):
 	## prepare data
 	label_split = label_dict[i]
 	[expr_tr, label_tr, expr_te, label_te] = split_expr(expr, label_split)
+	if quantized:
+		## binned once per split, by the edges of its training samples
+		edges = quantize.bin_edges(expr_tr)
+		[tree_tr, tree_te] = [quantize.apply_bins(expr_tr, edges), quantize.apply_bins(expr_te, edges)]
+	else:
+		[tree_tr, tree_te] = [expr_tr, expr_te]
 	
 	## train the model
 	clf = RandomForestClassifier(n_estimators=params['n_estimators'], 
@@ -147,10 +158,10 @@ for i in range(N):
 									oob_score=True,
 									n_jobs=4, 
 									verbose=False)
-	clf.fit(expr_tr, label_tr)
+	clf.fit(tree_tr, label_tr)
 
 	## test the model
-	label_predicted = clf.predict(expr_te)
+	label_predicted = clf.predict(tree_te)
 	[sens, spec, accu] = calculate_confusion_matrix(label_te, label_predicted)
 	sys.stdout.write('Random forest\t%.3f\t%.3f\t%.3f\t%.3f\n' % 
 					(sens, spec, accu, (sens+spec)/2))
@@ -299,9 +310,17 @@ for i in range(N):
 		ab = AdaBoostClassifier(DecisionTreeClassifier(max_depth=3))
 		hyperparams = {'learning_rate': [.01, .0075, .005, .001, .0005], 
 						'n_estimators': [1000]}
-		clf = GridSearchCV(ab, hyperparams, cv=parsed.cross_valid, n_jobs=4)
-		clf.fit(expr_tr, label_tr)
-		params = parse_cv_result(clf)
+		if staged:
+			## params at the early stopping point of the CV surface, the test split is not seen
+			clf = staged_search.StagedBoostingCV(ab, hyperparams, cv=cross_valid, n_jobs=4)
+			clf.fit(tree_tr, label_tr)
+			staged_surface.append(clf.surface_)
+			staged_candidates = clf.candidates_
+			params = clf.best_params_
+		else:
+			clf = GridSearchCV(ab, hyperparams, cv=parsed.cross_valid, n_jobs=4)
+			clf.fit(expr_tr, label_tr)
+			params = parse_cv_result(clf)
 	else:
 		params = {'learning_rate': 1, 
 					'n_estimators': 50}
@@ -314,10 +333,10 @@ for i in range(N):
 	clf = AdaBoostClassifier(DecisionTreeClassifier(max_depth=3), 
 								learning_rate=params['learning_rate'],
 								n_estimators=params['n_estimators'])
-	clf.fit(expr_tr, label_tr)
+	clf.fit(tree_tr, label_tr)
 
 	#test the model
-	label_predicted = clf.predict(expr_te)
+	label_predicted = clf.predict(tree_te)
 	[sens, spec, accu] = calculate_confusion_matrix(label_te, label_predicted)
 	sys.stdout.write('AdaBoost\t%.3f\t%.3f\t%.3f\t%.3f\n' % 
 					(sens, spec, accu, (sens+spec)/2))
@@ -402,6 +421,10 @@ for i in range(N):
 
 
 
+## AdaBoost CV surface (learning rate x n_estimators) of the training folds, over the splits
+if staged_surface:
+	staged_search.write_surface(staged_candidates, np.mean(staged_surface, axis=0), dir_proj + '/validation/adaboost_staged_surface.txt')
+
 ## Dump json data
 with open(dir_proj + '/validation/random_split_indices.json', 'w') as writer:
 	json.dump(label_dict, writer)
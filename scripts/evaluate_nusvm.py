@@ -1,8 +1,10 @@
 #!/usr/bin/python
 import numpy as np
+from indexed_axis import IndexedAxis
+import expr_store
+import limma
+import kernel_cache
 import json
-import os
-import time
 from scipy.stats import rankdata
 
 from sklearn.ensemble import RandomForestClassifier
@@ -27,7 +29,7 @@ def split_expr(expr, label_split):
 	return [expr[indx_tr,:], label[indx_tr], expr[indx_te,:], label[indx_te]]
 
 
-def write_valid_chips(label_indx_dict, samples, labels, filename):
+def training_valid_chips(label_indx_dict, samples, labels):
 	out = []
 	for i in label_indx_dict['N']:
 		out.append([samples[i]+'.'+labels[i], '0', '0'])
@@ -35,17 +37,20 @@ def write_valid_chips(label_indx_dict, samples, labels, filename):
 		out.append([samples[i]+'.'+labels[i], '1', '0'])
 	for i in label_indx_dict['C']:
 		out.append([samples[i]+'.'+labels[i], '2', '0'])
-	np.savetxt(filename, np.array(out), fmt='%s', delimiter='\t')
+	return np.array(out)
 
 
-def load_de_genes(filename):
-	return np.loadtxt(filename, dtype=str, skiprows=1, usecols=[0])
+def select_de_genes(chipdata, valid_chips, num_top_genes):
+	## in-process limma fit of the training chips, top genes of the first contrast (CvsN)
+	[header, rows, expr] = chipdata
+	fit = limma.de_analysis(expr, header[1:], valid_chips, 'N_vs_P_vs_C')
+	(indx, table) = limma.top_table(fit, coef=0)
+	indx = limma.select_genes(indx, table, 1, 0)
+	return rows[indx[:num_top_genes],0]
 
 
 def filter_features(expr, features):
-	indx = np.array([0,1])
-	for f in features:
-		indx = np.append(indx, np.where(expr[0,:]==f)[0][0])
+	indx = np.append([0,1], IndexedAxis(expr[0,:], 'features').positions(features))
 	return expr[:,indx]
 
 
@@ -74,6 +79,8 @@ T = 200 #num of top genes
 
 #### Evaluation of machine learning models ####
 cross_valid = False
+## all nu values of a split on one precomputed kernel, without the probability (Platt scaling) fits
+sweep = True
 
 ## Load training set
 expr_full = np.loadtxt(file_expr, dtype=str, delimiter='\t')
@@ -81,6 +88,9 @@ feat_header = expr_full[0,:]
 samples = expr_full[1:,0]
 labels = expr_full[1:,1]
 
+## Load expression data for DE analysis
+chipdata = expr_store.load_expr(dir_proj + '/training/chipdata.txt')
+
 ## Randomly select N times
 label_keys = ['C', 'P', 'N']
 label_dict = {}
@@ -97,26 +107,39 @@ for i in range(N):
 	label_dict[i] = {'training':{}, 'testing':{}}
 	for k in label_keys:
 		indx = np.where(labels == k)[0]
-		indx_tr = np.random.choice(indx, size=np.floor(len(indx)*.8), replace=False)
+		indx_tr = np.random.choice(indx, size=int(np.floor(len(indx)*.8)), replace=False)
 		indx_te = np.setdiff1d(indx, indx_tr)
 		label_dict[i]['training'][k] = list(indx_tr)
 		label_dict[i]['testing'][k] = list(indx_te)
 
-	## LIMMA wrapper
-	write_valid_chips(label_dict[i]['training'], samples, labels, 'valid_chips_'+str(i)+'.txt')
-
-	while not os.path.isfile('valid_chips_'+str(i)+'.txt'):
-		time.sleep(1)
+	## LIMMA
 	print('analyzing DE genes for this set ...')
-	os.system('Rscript ../../../scripts/de_analysis.r ../training/chipdata.txt valid_chips_'+str(i)+'.txt N_vs_P_vs_C 1 0 top_de_genes_'+str(i)+'.txt; cp top_de_genes_'+str(i)+'.txt tmp.txt; head -'+ str(T+1) +' tmp.txt > top_de_genes_'+str(i)+'.txt; rm tmp.txt')
-
-	while not os.path.isfile('top_de_genes_'+str(i)+'.txt'):
-		time.sleep(5)
-	de_genes = load_de_genes('top_de_genes_'+str(i)+'.txt')
+	valid_chips = training_valid_chips(label_dict[i]['training'], samples, labels)
+	de_genes = select_de_genes(chipdata, valid_chips, T)
 	expr = filter_features(expr_full, de_genes)
 
 
+	## prepare data
+	label_split = label_dict[i]
+	[expr_tr, label_tr, expr_te, label_te] = split_expr(expr, label_split)
+
 	## Nu-SVM
+	if sweep:
+		## libsvm has no warm start: the split's kernel is computed once and shared by all nu,
+		## and predict does not use the probability model, so it is not fitted
+		gamma = 1. / expr_tr.shape[1]
+		kernel_tr = kernel_cache.rbf_kernel(expr_tr, gamma)
+		kernel_te = kernel_cache.rbf_kernel(expr_te, gamma, expr_tr)
+		for j in range(len(hyperparams)):
+			p = hyperparams[j]
+			clf = NuSVC(nu=p, kernel='precomputed', class_weight='balanced', verbose=False)
+			clf.fit(kernel_tr, label_tr)
+			label_predicted = clf.predict(kernel_te)
+			[sens, spec, accu] = calculate_confusion_matrix(label_te, label_predicted)
+			print 'Nu-SVM\t', p,'\t', sens, spec, accu
+			eval_metrics[i, j] = accu
+		continue
+
 	for j in range(len(hyperparams)):
 		p = hyperparams[j]
 
@@ -146,10 +169,6 @@ for i in range(N):
 						'kernel': 'rbf',
 						'class_weight': 'balanced'}
 
-		## prepare data
-		label_split = label_dict[i]
-		[expr_tr, label_tr, expr_te, label_te] = split_expr(expr, label_split)
-		
 		## train the model
 		clf = NuSVC(nu=params['nu'], 
 					kernel=params['kernel'], 
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# Binary expression store: a tab-delimited expression matrix is converted once
+# into a float32 memory-mapped matrix (matrix.npy), with the header row and the
+# leading ID columns of every row saved as side indexes (header.txt, rows.txt).
+# example:
+# python expr_store.py -i ../data/run_proj_batch1-17_1/chipdata_rma.expression_console.good_rin.TXT -o ../data/run_proj_batch1-17_1/chipdata_rma.expression_console.good_rin.store
+# python expr_store.py -i ../data/run_proj_batch1-17_1/training/training_set.txt -c 2 -o ../data/run_proj_batch1-17_1/training/training_set.store
+
+import sys
+import os
+import argparse
+import numpy as np
+
+STORE_SUFFIX = '.store'
+STORE_MATRIX = 'matrix.npy'
+STORE_HEADER = 'header.txt'
+STORE_ROWS = 'rows.txt'
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Convert a tab-delimited expression matrix into a memory-mapped expression store.')
+	parser.add_argument('-i', '--input_expr', dest='input_expr')
+	parser.add_argument('-c', '--id_columns', dest='id_columns', type=int, default=1)
+	parser.add_argument('-n', '--num_data_columns', dest='num_data_columns', type=int, default=None)
+	parser.add_argument('-o', '--output_store', dest='output_store')
+	parsed = parser.parse_args(argv[1:])
+	return parsed
+
+
+def is_store(path):
+	return os.path.isdir(path) and os.path.isfile(os.path.join(path, STORE_MATRIX))
+
+
+def _split_line(line):
+	return line.rstrip('\r\n').split('\t')
+
+
+def _count_rows(filename):
+	## count non-empty data rows below the header
+	with open(filename, 'r') as f:
+		header = _split_line(f.readline())
+		num_rows = sum(1 for line in f if line.strip())
+	return (header, num_rows)
+
+
+def _fill_rows(filename, id_columns, num_data_columns, expr):
+	## parse one line at a time into the preallocated float32 matrix
+	rows = []
+	with open(filename, 'r') as f:
+		f.readline()
+		i = 0
+		for line in f:
+			if not line.strip():
+				continue
+			tmp_arr = _split_line(line)
+			rows.append(tmp_arr[:id_columns])
+			expr[i,:] = np.array(tmp_arr[id_columns:id_columns+num_data_columns], dtype=np.float32)
+			i += 1
+	return np.array(rows, dtype=str).reshape(len(rows), id_columns)
+
+
+def _read_text(filename, id_columns, num_data_columns):
+	## the ID columns and the value strings as read, for stages that pass text through to text
+	(rows, values) = ([], [])
+	with open(filename, 'r') as f:
+		f.readline()
+		for line in f:
+			if not line.strip():
+				continue
+			tmp_arr = _split_line(line)
+			rows.append(tmp_arr[:id_columns])
+			values.append(tmp_arr[id_columns:id_columns+num_data_columns])
+	rows = np.array(rows, dtype=str).reshape(len(rows), id_columns)
+	return (rows, np.array(values, dtype=str).reshape(len(values), num_data_columns))
+
+
+def convert_tsv(filename, store_dir, id_columns=1, num_data_columns=None):
+	(header, num_rows) = _count_rows(filename)
+	if num_data_columns == None:
+		num_data_columns = len(header) - id_columns
+	header = header[:id_columns+num_data_columns]
+
+	if not os.path.exists(store_dir):
+		os.makedirs(store_dir)
+	expr = np.lib.format.open_memmap(os.path.join(store_dir, STORE_MATRIX), mode='w+',
+		dtype=np.float32, shape=(num_rows, num_data_columns))
+	rows = _fill_rows(filename, id_columns, num_data_columns, expr)
+	expr.flush()
+	del expr
+
+	_write_index(store_dir, header, rows)
+	return store_dir
+
+
+def _write_index(store_dir, header, rows):
+	with open(os.path.join(store_dir, STORE_HEADER), 'w') as f:
+		f.write('\t'.join(header) + '\n')
+	with open(os.path.join(store_dir, STORE_ROWS), 'w') as f:
+		for row in rows:
+			f.write('\t'.join(row) + '\n')
+
+
+def open_store(store_dir, mode='r'):
+	## the matrix is returned as a read-only memmap, so only the pages touched are resident
+	with open(os.path.join(store_dir, STORE_HEADER), 'r') as f:
+		header = np.array(_split_line(f.readline()), dtype=str)
+	with open(os.path.join(store_dir, STORE_ROWS), 'r') as f:
+		rows = [_split_line(line) for line in f]
+	expr = np.load(os.path.join(store_dir, STORE_MATRIX), mmap_mode=mode)
+	id_columns = len(header) - expr.shape[1]
+	rows = np.array(rows, dtype=str).reshape(len(rows), id_columns)
+	return [header, rows, expr]
+
+
+def load_expr(filename, id_columns=1, num_data_columns=None, keep_text=False):
+	## returns [header, rows, expr]: the full header row, the leading ID columns of
+	## each row (str), and the numeric block as float32 (memmap if filename is a store);
+	## with keep_text the block of a text file is its value strings, written back as read
+	if is_store(filename):
+		[header, rows, expr] = open_store(filename)
+		if rows.shape[1] != id_columns:
+			sys.exit("Error: %s has %d ID columns, %d expected (expr_store.py -c)" % (filename, rows.shape[1], id_columns))
+		if num_data_columns != None:
+			header = header[:id_columns+num_data_columns]
+			expr = expr[:,:num_data_columns]
+		return [header, rows, expr]
+
+	(header, num_rows) = _count_rows(filename)
+	if num_data_columns == None:
+		num_data_columns = len(header) - id_columns
+	header = np.array(header[:id_columns+num_data_columns], dtype=str)
+	if keep_text:
+		(rows, expr) = _read_text(filename, id_columns, num_data_columns)
+		return [header, rows, expr]
+	expr = np.empty((num_rows, num_data_columns), dtype=np.float32)
+	rows = _fill_rows(filename, id_columns, num_data_columns, expr)
+	return [header, rows, expr]
+
+
+def save_store(store_dir, header, rows, expr):
+	if not os.path.exists(store_dir):
+		os.makedirs(store_dir)
+	out = np.lib.format.open_memmap(os.path.join(store_dir, STORE_MATRIX), mode='w+',
+		dtype=np.float32, shape=expr.shape)
+	out[:] = expr
+	out.flush()
+	del out
+	_write_index(store_dir, header, rows)
+
+
+def write_tsv(filename, header, rows, expr, fmt='%.9g'):
+	## value strings (load_expr keep_text) are written as read; %.9g is the shortest format
+	## every float32 reads back from exactly
+	text = expr.dtype.kind in 'SU'
+	with open(filename, 'w') as f:
+		f.write('\t'.join(header) + '\n')
+		for i in range(expr.shape[0]):
+			f.write('\t'.join(list(rows[i]) + (list(expr[i]) if text else [fmt % x for x in expr[i]])) + '\n')
+
+
+def write_expr(filename, header, rows, expr):
+	## outputs named *.store are written as expression stores, anything else as text
+	if filename.endswith(STORE_SUFFIX):
+		save_store(filename, header, rows, expr)
+	else:
+		write_tsv(filename, header, rows, expr)
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	convert_tsv(parsed.input_expr, parsed.output_store, parsed.id_columns, parsed.num_data_columns)
+	[header, rows, expr] = open_store(parsed.output_store)
+	print('Expression store: %d rows x %d columns -> %s' % (expr.shape[0], expr.shape[1], parsed.output_store))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
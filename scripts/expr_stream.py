@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# Line-by-line routing of expression rows: every data row of the input is read once
+# and written verbatim to each output whose row filter accepts its ID, so memory
+# stays constant regardless of the number of chips.
+
+import numpy as np
+
+
+def read_transcript_clusters(filename, column_number):
+	## comma-separated TC IDs in the given column of a gene annotation list
+	tcs = set()
+	with open(filename, "r") as f:
+		for line in f:
+			tmp_arr = line.strip().split("\t")
+			if len(tmp_arr) > column_number:
+				for tmp_tc in tmp_arr[column_number].split(","):
+					tcs.add(tmp_tc)
+	return tcs
+
+
+def in_set(ids):
+	return lambda row_id: row_id in ids
+
+
+def is_tc(row_id):
+	return row_id.startswith("TC")
+
+
+def route_rows(filename, routes, convert_header=None):
+	## routes: list of (output filename, row filter on the row ID)
+	## returns the number of data rows written to each output
+	outs = [open(fn, "w") for (fn, keep) in routes]
+	counts = np.zeros(len(routes), dtype=int)
+	with open(filename, "r") as f:
+		header = f.readline()
+		if convert_header != None:
+			header = convert_header(header)
+		for out in outs:
+			out.write(header)
+		for line in f:
+			if not line.strip():
+				continue
+			row_id = line.split("\t", 1)[0]
+			for j in range(len(routes)):
+				if routes[j][1](row_id):
+					outs[j].write(line)
+					counts[j] += 1
+	for out in outs:
+		out.close()
+	return counts
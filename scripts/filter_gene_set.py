@@ -2,6 +2,7 @@
 import sys
 import argparse
 import numpy as np
+import expr_stream
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description='Perform quality control.')
@@ -9,24 +10,20 @@ def parse_args(argv):
 	parser.add_argument('-l', '--transcript_cluster_list', dest='transcript_cluster_list')
 	parser.add_argument('-c', '--column_number', dest='column_number', type=int)
 	parser.add_argument('-o', '--output_expr', dest='output_expr')
+	parser.add_argument('-s', '--stream', dest='stream', action='store_true', default=False, help='filter the input line by line in constant memory')
 	parsed = parser.parse_args(argv[1:])
 	return parsed
 
 def main(argv):
 	parsed = parse_args(argv)
 
-	f = open(parsed.transcript_cluster_list, "r")
-	lines = f.readlines()
-	tcs = set()
-	for line in lines:
-		tmp_arr = line.strip().split("\t")
-		if len(tmp_arr) > parsed.column_number:
-			for tmp_tc in tmp_arr[parsed.column_number].split(","):
-				tcs.add(tmp_tc)
-	f.close()
-	tcs = list(tcs)
+	tcs = expr_stream.read_transcript_clusters(parsed.transcript_cluster_list, parsed.column_number)
 	print "Transript cluster count:", len(tcs)
 
+	if parsed.stream:
+		expr_stream.route_rows(parsed.input_expr, [(parsed.output_expr, expr_stream.in_set(tcs))])
+		return
+
 	expr = np.loadtxt(parsed.input_expr, dtype=str, delimiter="\t")
 	tc_indx = [0]
 	for i in range(1,len(expr)):
@@ -0,0 +1,44 @@
+#!/usr/bin/python
+# Random forest growth by out-of-bag accuracy. Instead of fitting a fixed number of
+# trees, the forest is grown with warm_start in steps of `step` trees (the trees
+# already grown are kept) and its OOB accuracy is recorded after every step; growth
+# stops once the OOB accuracy has not improved by more than tol for `patience` steps,
+# or at max_estimators. The curve is kept on the model as oob_curve_ (n_estimators,
+# OOB accuracy) and written next to the model by crc_training.save_model.
+# example:
+# clf = grow_forest(RandomForestClassifier(criterion='gini', n_jobs=4), expr_tr, label_tr, step=50, max_estimators=1000)
+# write_oob_curve(clf.oob_curve_, 'random_forest_oob_curve.txt')
+
+import numpy as np
+from class_balance import fit_balanced
+
+OOB_CURVE_SUFFIX = '_oob_curve.txt'
+
+
+def grow_forest(clf, X, y, step=50, max_estimators=1000, tol=0.002, patience=3, balance=None):
+	## balance: class_balance.balance_indices of the training set, if rebalanced
+	clf.set_params(warm_start=True, oob_score=True)
+	curve = []
+	(best, stalled) = (-np.inf, 0)
+	for n in range(step, max_estimators + step, step):
+		clf.set_params(n_estimators=min(n, max_estimators))
+		fit_balanced(clf, X, y, balance)
+		curve.append([clf.n_estimators, clf.oob_score_])
+		if clf.oob_score_ > best + tol:
+			(best, stalled) = (clf.oob_score_, 0)
+		else:
+			stalled += 1
+		if stalled >= patience or clf.n_estimators >= max_estimators:
+			break
+	## a later fit() starts a new forest
+	clf.set_params(warm_start=False)
+	clf.oob_curve_ = np.array(curve)
+	print "Forest grown to", clf.n_estimators, "trees, out-of-bag accuracy by size:", ", ".join('%d: %.4f' % (n, s) for (n, s) in curve)
+	return clf
+
+
+def write_oob_curve(curve, filename):
+	with open(filename, 'w') as f:
+		f.write('n_estimators\toob_accuracy\n')
+		for (n, s) in curve:
+			f.write('%d\t%.6f\n' % (n, s))
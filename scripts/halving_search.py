@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# Successive halving hyperparameter search (sklearn 0.20 has no HalvingGridSearchCV).
+# All candidates are cross-validated on a small resource first, and only the best
+# 1/factor of them are promoted to the next round, which gets factor times the
+# resource; the last round runs on the full resource. The resource is either
+# 'n_samples' (a stratified subsample of the training set, redrawn every round) or an
+# integer parameter such as 'n_estimators', which is then taken out of the searched
+# grid (its largest value is the full resource). cv_results_ holds the last round,
+# run on the full resource, in the GridSearchCV layout, so crc_training.parse_cv_result
+# reads it as before; history_ keeps the scores of every round.
+# example:
+# clf = HalvingSearchCV(SVC(), {'C': ss.expon(scale=10), 'kernel': ['rbf']}, n_candidates=500, resource='n_samples', cv=10, n_jobs=4)
+# clf.fit(expr_tr, label_tr)
+# params = parse_cv_result(clf)
+
+import math
+import numpy as np
+from sklearn.base import clone, is_classifier
+from sklearn.model_selection import ParameterGrid, ParameterSampler, cross_validate, train_test_split
+from sklearn.externals.joblib import Parallel, delayed
+
+
+def _evaluate(estimator, params, X, y, cv, scoring, fit_params):
+	## mean/std test and mean train score of one candidate; NaN for infeasible parameters
+	scores = cross_validate(clone(estimator).set_params(**params), X, y, cv=cv, scoring=scoring,
+		n_jobs=1, return_train_score=True, error_score=np.nan, fit_params=fit_params)
+	return (np.mean(scores['test_score']), np.std(scores['test_score']), np.mean(scores['train_score']))
+
+
+class HalvingSearchCV(object):
+	def __init__(self, estimator, param_distributions, n_candidates=None, resource='n_samples',
+		min_resources=None, max_resources=None, factor=3, cv=5, scoring=None, n_jobs=1, random_state=None):
+		## n_candidates=None searches the whole grid, otherwise n_candidates draws from the distributions
+		self.estimator = estimator
+		self.param_distributions = param_distributions
+		self.n_candidates = n_candidates
+		self.resource = resource
+		self.min_resources = min_resources
+		self.max_resources = max_resources
+		self.factor = factor
+		self.cv = cv
+		self.scoring = scoring
+		self.n_jobs = n_jobs
+		self.random_state = random_state
+
+	@property
+	def _pairwise(self):
+		## a search over a precomputed kernel is fitted on the kernel, as GridSearchCV
+		return getattr(self.estimator, '_pairwise', False)
+
+	def _candidates(self):
+		space = dict(self.param_distributions)
+		max_resources = self.max_resources
+		if self.resource != 'n_samples' and self.resource in space:
+			max_resources = max_resources or max(space.pop(self.resource))
+		if self.n_candidates == None:
+			return (list(ParameterGrid(space)), max_resources)
+		return (list(ParameterSampler(space, self.n_candidates, random_state=self.random_state)), max_resources)
+
+	def _schedule(self, n_candidates, min_resources, max_resources):
+		## resources of the rounds: candidates shrink by factor until at most factor are left,
+		## the last round gets max_resources and every earlier one factor times less (not below min)
+		n_rounds = 1 if n_candidates <= self.factor else 1 + int(math.ceil(math.log(n_candidates / float(self.factor)) / math.log(self.factor)))
+		return [max(min_resources, max_resources / float(self.factor)**(n_rounds-1-i)) for i in range(n_rounds)]
+
+	def fit(self, X, y, sample_weight=None):
+		y = np.asarray(y)
+		rs = np.random.RandomState(self.random_state)
+		(candidates, max_resources) = self._candidates()
+		n_splits = self.cv if isinstance(self.cv, int) else self.cv.get_n_splits()
+		if self.resource == 'n_samples':
+			max_resources = max_resources or len(y)
+			n_classes = len(np.unique(y)) if is_classifier(self.estimator) else 1
+			min_resources = self.min_resources or min(max_resources, 2 * n_splits * n_classes)
+		else:
+			min_resources = self.min_resources or 1
+		resources = self._schedule(len(candidates), min_resources, max_resources)
+
+		self.history_ = []
+		alive = range(len(candidates))
+		for (i, r) in enumerate(resources):
+			if self.resource == 'n_samples':
+				r = int(r)
+				if r < len(y):
+					stratify = y if is_classifier(self.estimator) else None
+					(indx, foo) = train_test_split(np.arange(len(y)), train_size=r, test_size=None, stratify=stratify, random_state=rs)
+				else:
+					indx = np.arange(len(y))
+				## a precomputed kernel is subsampled on both axes
+				X_r = X[np.ix_(indx, indx)] if self._pairwise else X[indx]
+				(y_r, params) = (y[indx], [candidates[c] for c in alive])
+			else:
+				r = int(round(r))
+				(X_r, y_r, params) = (X, y, [dict(candidates[c], **{self.resource: r}) for c in alive])
+				indx = np.arange(len(y))
+			fit_params = None if sample_weight is None else {'sample_weight': np.asarray(sample_weight)[indx]}
+			scores = Parallel(n_jobs=self.n_jobs)(delayed(_evaluate)(self.estimator, p, X_r, y_r, self.cv, self.scoring, fit_params) for p in params)
+			scores = np.array(scores)
+			self.history_.append({'params': params, 'n_resources': r, 'mean_test_score': scores[:,0],
+				'std_test_score': scores[:,1], 'mean_train_score': scores[:,2]})
+			print "Halving round", i+1, ":", len(params), "candidates,", self.resource, "=", r, ", best CV score", np.nanmax(scores[:,0]) if np.any(~np.isnan(scores[:,0])) else np.nan
+			## candidates that failed (infeasible parameters) are not promoted
+			order = [j for j in np.argsort(-np.nan_to_num(scores[:,0]), kind='mergesort') if not np.isnan(scores[j,0])]
+			if len(order) == 0:
+				raise ValueError("all %d candidates failed with %s = %d" % (len(params), self.resource, r))
+			alive = [alive[j] for j in order[:max(1, int(math.ceil(len(alive) / float(self.factor))))]]
+
+		## the last round without its failed candidates, so argmax over cv_results_ is the best
+		last = self.history_[-1]
+		keep = np.where(~np.isnan(last['mean_test_score']))[0]
+		self.cv_results_ = dict((key, last[key][keep]) for key in ['mean_test_score', 'std_test_score', 'mean_train_score'])
+		self.cv_results_['params'] = [last['params'][j] for j in keep]
+		self.cv_results_['rank_test_score'] = np.argsort(np.argsort(-self.cv_results_['mean_test_score'], kind='mergesort')) + 1
+		self.best_index_ = int(np.argmax(self.cv_results_['mean_test_score']))
+		self.best_params_ = self.cv_results_['params'][self.best_index_]
+		self.best_score_ = self.cv_results_['mean_test_score'][self.best_index_]
+		return self
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# Histogram gradient boosting classifier, an optional backend of the grad_boosting model
+# (crc_training.py -gb hist). The training matrix is quantized once into uint8 bin codes
+# (quantize.py, <= 256 bins per feature), and every tree is grown on per-node gradient and
+# hessian histograms of the codes (features x bins, one bincount each) instead of sorting
+# the samples of every feature at every node; the histograms of the larger child are the
+# parent's minus the smaller child's. The loss is the multinomial deviance (the binomial
+# one for two classes), leaves are Newton steps, and the parameters are those of
+# GradientBoostingClassifier (learning_rate, n_estimators, max_depth, subsample,
+# min_samples_leaf) plus max_bins, l2_regularization and early stopping: with
+# n_iter_no_change, validation_fraction of the training set is held out and boosting
+# stops once its loss has not improved by tol for n_iter_no_change iterations, keeping
+# the trees up to the best iteration. The bin edges are saved with the model, so
+# predict() takes raw features.
+# example:
+# clf = HistGradientBoostingClassifier(learning_rate=.01, n_estimators=1000, max_depth=3, subsample=.8, n_iter_no_change=50)
+# clf.fit(expr_tr, label_tr)
+# print clf.n_estimators_, clf.score(expr_te, label_te)
+
+import numpy as np
+from scipy.special import expit, logsumexp
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.model_selection import train_test_split
+import quantize
+
+
+def _bin_index(codes, n_bins):
+	## position of every (sample, feature) code in the flattened features x bins histogram
+	return codes.astype(np.intp) + np.arange(codes.shape[1]) * n_bins
+
+
+def _histograms(index, rows, g, h, n_bins, counts):
+	## gradient, hessian and (if counts) sample count sums of the rows, features x bins
+	n_features = index.shape[1]
+	flat = index[rows].ravel()
+	size = n_features * n_bins
+	G = np.bincount(flat, weights=np.repeat(g[rows], n_features), minlength=size).reshape(n_features, n_bins)
+	H = np.bincount(flat, weights=np.repeat(h[rows], n_features), minlength=size).reshape(n_features, n_bins)
+	C = np.bincount(flat, minlength=size).reshape(n_features, n_bins) if counts else None
+	return (G, H, C)
+
+
+def _best_split(G, H, C, min_samples_leaf, l2):
+	## (feature, bin, gain) of the best split "code <= bin" of a node, gain <= 0 for none;
+	## a split with an empty side has zero gain, so the counts are only needed for
+	## min_samples_leaf > 1 (the last bin leaves no sample on the right)
+	(GL, HL) = (np.cumsum(G, axis=1), np.cumsum(H, axis=1))
+	(Gt, Ht) = (GL[0,-1], HL[0,-1])
+	HL += l2 + 1e-12
+	HR = (Ht + 2 * (l2 + 1e-12)) - HL
+	gain = np.square(GL)
+	gain /= HL
+	GL -= Gt
+	np.square(GL, out=GL)
+	GL /= HR
+	gain += GL
+	if min_samples_leaf > 1:
+		CL = np.cumsum(C, axis=1)
+		CR = CL[0,-1] - CL
+		np.minimum(CL, CR, out=CR)
+		gain[CR < min_samples_leaf] = -np.inf
+	(f, b) = np.unravel_index(np.argmax(gain), gain.shape)
+	return (f, b, gain[f,b] - Gt**2 / (Ht + l2 + 1e-12))
+
+
+class _Tree(object):
+	## regression tree on bin codes; feature -1 marks a leaf
+	def __init__(self):
+		(self.feature, self.threshold, self.left, self.right, self.value, self.gain) = ([], [], [], [], [], [])
+
+	def _add_node(self):
+		for x in [self.feature, self.threshold, self.left, self.right, self.value, self.gain]:
+			x.append(0)
+		self.feature[-1] = -1
+		return len(self.feature) - 1
+
+	def grow(self, codes, index, rows, g, h, n_bins, max_depth, min_samples_leaf, l2, scale):
+		## nodes that cannot split (max_depth, too few samples) get no histograms
+		splits = lambda rows, depth: depth < max_depth and len(rows) >= 2 * min_samples_leaf
+		counts = min_samples_leaf > 1
+		stack = [(rows, 0, _histograms(index, rows, g, h, n_bins, counts) if splits(rows, 0) else None, self._add_node())]
+		while len(stack) > 0:
+			(rows, depth, hist, node) = stack.pop()
+			gain = 0.
+			if hist != None:
+				(G, H, C) = hist
+				(f, b, gain) = _best_split(G, H, C, min_samples_leaf, l2)
+			if not gain > 1e-12:
+				Ht = h[rows].sum() + l2
+				self.value[node] = -scale * g[rows].sum() / Ht if Ht > 1e-150 else 0.
+				continue
+			go_left = codes[rows, f] <= b
+			children = [rows[go_left], rows[~go_left]]
+			hist = [None, None]
+			if splits(children[0], depth+1) or splits(children[1], depth+1):
+				## histograms of the smaller child, the larger one's by subtraction
+				small = 0 if len(children[0]) <= len(children[1]) else 1
+				hist[small] = _histograms(index, children[small], g, h, n_bins, counts)
+				hist[1-small] = (G - hist[small][0], H - hist[small][1], C - hist[small][2] if counts else None)
+				hist = [hist[c] if splits(children[c], depth+1) else None for c in [0, 1]]
+			(self.feature[node], self.threshold[node], self.gain[node]) = (f, b, gain)
+			self.left[node] = self._add_node()
+			self.right[node] = self._add_node()
+			stack.append((children[1], depth+1, hist[1], self.right[node]))
+			stack.append((children[0], depth+1, hist[0], self.left[node]))
+		for x in ['feature', 'threshold', 'left', 'right']:
+			setattr(self, x, np.array(getattr(self, x), dtype=np.intp))
+		(self.value, self.gain) = (np.array(self.value), np.array(self.gain))
+		return self
+
+	def predict(self, codes):
+		node = np.zeros(codes.shape[0], dtype=np.intp)
+		internal = np.where(self.feature[node] >= 0)[0]
+		while len(internal) > 0:
+			n = node[internal]
+			go_left = codes[internal, self.feature[n]] <= self.threshold[n]
+			node[internal] = np.where(go_left, self.left[n], self.right[n])
+			internal = internal[self.feature[node[internal]] >= 0]
+		return self.value[node]
+
+
+class HistGradientBoostingClassifier(BaseEstimator, ClassifierMixin):
+	def __init__(self, learning_rate=.1, n_estimators=100, max_depth=3, subsample=1., min_samples_leaf=1,
+		max_bins=256, l2_regularization=0., n_iter_no_change=None, validation_fraction=.1, tol=1e-4,
+		random_state=None, verbose=False):
+		self.learning_rate = learning_rate
+		self.n_estimators = n_estimators
+		self.max_depth = max_depth
+		self.subsample = subsample
+		self.min_samples_leaf = min_samples_leaf
+		self.max_bins = max_bins
+		self.l2_regularization = l2_regularization
+		self.n_iter_no_change = n_iter_no_change
+		self.validation_fraction = validation_fraction
+		self.tol = tol
+		self.random_state = random_state
+		self.verbose = verbose
+
+	def _proba(self, raw):
+		## probabilities of the raw scores, samples x classes
+		if len(self.classes_) == 2:
+			p = expit(raw[:,0])
+			return np.column_stack((1-p, p))
+		return np.exp(raw - logsumexp(raw, axis=1)[:,np.newaxis])
+
+	def _loss(self, Y, raw, w):
+		## weighted mean deviance, Y one-hot samples x classes
+		p = np.clip(self._proba(raw), 1e-15, 1.)
+		return -np.average(np.sum(Y * np.log(p), axis=1), weights=w)
+
+	def fit(self, X, y, sample_weight=None):
+		y = np.asarray(y)
+		w = np.ones(len(y)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+		(self.classes_, y_code) = np.unique(y, return_inverse=True)
+		if len(self.classes_) < 2:
+			raise ValueError("need samples of at least 2 classes, got %s" % self.classes_)
+		rs = np.random.RandomState(self.random_state)
+		self.bin_edges_ = quantize.bin_edges(X, self.max_bins)
+		codes = quantize.apply_bins(X, self.bin_edges_)
+		Y = np.eye(len(self.classes_))[y_code]
+
+		indx_tr = np.arange(len(y))
+		if self.n_iter_no_change:
+			(indx_tr, indx_val) = train_test_split(indx_tr, test_size=self.validation_fraction, stratify=y_code, random_state=rs)
+			(codes_val, Y_val, w_val) = (codes[indx_val], Y[indx_val], w[indx_val])
+		(codes, Y, w) = (codes[indx_tr], Y[indx_tr], w[indx_tr])
+		n = len(indx_tr)
+		## histograms only as wide as the bins used
+		n_bins = int(codes.max()) + 1
+		index = _bin_index(codes, n_bins)
+
+		## one tree per class, one for two classes (the log odds of the second)
+		K = 1 if len(self.classes_) == 2 else len(self.classes_)
+		prior = np.clip(np.average(Y, axis=0, weights=w), 1e-15, 1.)
+		self.init_ = np.log(prior[1:] / prior[:1]) if K == 1 else np.log(prior)
+		raw = np.tile(self.init_, (n, 1))
+		scale = 1. if K == 1 else (K - 1.) / K
+		if self.n_iter_no_change:
+			raw_val = np.tile(self.init_, (len(Y_val), 1))
+			(best_loss, best_iter) = (np.inf, 0)
+			self.validation_score_ = []
+
+		self.estimators_ = []
+		for it in range(self.n_estimators):
+			p = self._proba(raw)
+			(G, P) = ((p - Y)[:,-K:] * w[:,np.newaxis], p[:,-K:])
+			rows = np.arange(n)
+			if self.subsample < 1.:
+				rows = np.sort(rs.choice(n, max(1, int(self.subsample * n)), replace=False))
+			trees = [_Tree().grow(codes, index, rows, G[:,k], P[:,k] * (1 - P[:,k]) * w, n_bins, self.max_depth,
+				self.min_samples_leaf, self.l2_regularization, scale * self.learning_rate) for k in range(K)]
+			self.estimators_.append(trees)
+			raw += np.column_stack([t.predict(codes) for t in trees])
+
+			if self.n_iter_no_change:
+				raw_val += np.column_stack([t.predict(codes_val) for t in trees])
+				loss = self._loss(Y_val, raw_val, w_val)
+				self.validation_score_.append(loss)
+				if loss < best_loss - self.tol:
+					(best_loss, best_iter) = (loss, it)
+				elif it - best_iter >= self.n_iter_no_change:
+					break
+		if self.n_iter_no_change:
+			self.estimators_ = self.estimators_[:best_iter+1]
+			self.validation_score_ = np.array(self.validation_score_)
+		self.n_estimators_ = len(self.estimators_)
+		if self.verbose:
+			print "Histogram boosting:", self.n_estimators_, "iterations"
+		return self
+
+	@property
+	def feature_importances_(self):
+		importance = np.zeros(self.bin_edges_.shape[0])
+		for trees in self.estimators_:
+			for t in trees:
+				internal = t.feature >= 0
+				np.add.at(importance, t.feature[internal], t.gain[internal])
+		return importance / importance.sum() if importance.sum() > 0 else importance
+
+	def staged_decision_function(self, X):
+		codes = quantize.apply_bins(X, self.bin_edges_)
+		raw = np.tile(self.init_, (codes.shape[0], 1))
+		for trees in self.estimators_:
+			raw += np.column_stack([t.predict(codes) for t in trees])
+			yield raw.copy()
+
+	def decision_function(self, X):
+		codes = quantize.apply_bins(X, self.bin_edges_)
+		raw = np.tile(self.init_, (codes.shape[0], 1))
+		for trees in self.estimators_:
+			raw += np.column_stack([t.predict(codes) for t in trees])
+		return raw[:,0] if raw.shape[1] == 1 else raw
+
+	def predict_proba(self, X):
+		raw = self.decision_function(X)
+		return self._proba(raw.reshape(len(raw), -1))
+
+	def predict(self, X):
+		return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+	def staged_predict(self, X):
+		for raw in self.staged_decision_function(X):
+			yield self.classes_[np.argmax(self._proba(raw), axis=1)]
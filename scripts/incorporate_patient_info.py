@@ -1,12 +1,14 @@
 #!/usr/bin/python
 import sys
 import argparse
+import os
 import numpy as np
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description='')
 	parser.add_argument('-p', '--patientinfo', dest='patientinfo')
 	parser.add_argument('-d', '--chipdata', dest='chipdata')
+	parser.add_argument('-o', '--output', dest='output', help='default: <chipdata>.patient_info.txt; the input is never overwritten')
 	parsed = parser.parse_args(argv[1:])
 	return parsed
 
@@ -16,6 +18,9 @@ def main(argv):
 	# read data
 	patientinfo = np.loadtxt(parsed.patientinfo, dtype=str, delimiter="\t")
 	chipdata = np.loadtxt(parsed.chipdata, dtype=str, delimiter="\t")
+	features_added = ['Sex', 'Age', 'Background', 'Smoking', 'FamilyHistory']
+	if len(np.intersect1d(chipdata[0,:], features_added)) > 0:
+		sys.exit("Error: Patient info already incorporated in " + parsed.chipdata)
 	
 	chipdata_chipids = chipdata[1:,0]
 	# patient_chipids = filter(None, patientinfo[1:,4])
@@ -52,15 +57,18 @@ def main(argv):
 		patient_dict[p] = [sex, age, background, smoking, family_hist]
 
 	# append patient info to data matrix
-	features_added = ['Sex', 'Age', 'Background', 'Smoking', 'FamilyHistory']
 	for i in range(len(features_added)):
 		tmp_entry = [features_added[i]]
 		for j in range(len(chipdata_chipids)):
 			tmp_entry.append(patient_dict[chipdata_chipids[j]][i])
 		chipdata = np.hstack((chipdata, np.array(tmp_entry)[np.newaxis].T))
 
-	# save data
-	np.savetxt(parsed.chipdata, chipdata, fmt="%s", delimiter="\t")
+	# save data as a new artifact
+	if parsed.output == None:
+		parsed.output = os.path.splitext(parsed.chipdata)[0] + '.patient_info.txt'
+	if os.path.abspath(parsed.output) == os.path.abspath(parsed.chipdata):
+		sys.exit("Error: Output would overwrite the input chipdata")
+	np.savetxt(parsed.output, chipdata, fmt="%s", delimiter="\t")
 
 if __name__ == "__main__":
     main(sys.argv)
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# Hash index over an axis of IDs (TC IDs, sample IDs), so a list of k IDs is resolved
+# to positions with k dict lookups instead of k np.where scans over the whole axis.
+# example:
+# genes = IndexedAxis(rownames[:,0])
+# expr_top = genes.take(expr, top_genes, axis=0)
+
+import numpy as np
+
+
+class MissingIDError(KeyError):
+	def __init__(self, missing, name='IDs'):
+		self.missing = list(missing)
+		shown = ", ".join(self.missing[:20]) + (", ..." if len(self.missing) > 20 else "")
+		KeyError.__init__(self, "%d %s not found: %s" % (len(self.missing), name, shown))
+
+	def __str__(self):
+		return self.args[0]
+
+
+class IndexedAxis(object):
+	def __init__(self, ids, name='IDs'):
+		self.ids = np.asarray(ids)
+		self.name = name
+		## keep the first occurrence of duplicated IDs, as np.where(...)[0][0] did
+		self.index = {}
+		for i in range(len(self.ids)-1, -1, -1):
+			self.index[self.ids[i]] = i
+
+	def __len__(self):
+		return len(self.ids)
+
+	def __contains__(self, x):
+		return x in self.index
+
+	def lookup(self, ids):
+		## positions of the IDs found on this axis, and the IDs that are not
+		ids = np.asarray(ids)
+		indx = np.array([self.index.get(x, -1) for x in ids], dtype=int)
+		found = indx >= 0
+		return (indx[found], ids[~found])
+
+	def positions(self, ids):
+		## positions of all IDs; every missing ID is reported in one MissingIDError
+		(indx, missing) = self.lookup(ids)
+		if len(missing) > 0:
+			raise MissingIDError(missing, self.name)
+		return indx
+
+	def take(self, matrix, ids, axis=0):
+		return np.take(matrix, self.positions(ids), axis=axis)
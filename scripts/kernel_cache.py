@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# RBF kernel cache. The squared distances between the training samples are computed
+# once per training set, and the kernel for any gamma is derived from them. SVC,
+# NuSVC and SVR are then fitted with kernel='precomputed'; PrecomputedRBF takes the
+# distances and gamma as a parameter, so the CV searches over gamma and C/nu reuse one
+# distance matrix and only slice it per fold. RBFKernelModel wraps the fitted
+# precomputed-kernel model with the training samples it needs (the support vectors),
+# so crc_prediction.py gets the test kernel from raw features through predict().
+# CachedRBF is the gaussian process RBF kernel on the same cached distances.
+# example:
+# clf = RandomizedSearchCV(PrecomputedRBF(SVC(kernel='precomputed')), {'estimator__C': ss.expon(scale=10), 'gamma': [1e-4, 1e-3]}, n_iter=500, cv=10)
+# clf.fit(cached_squared_distances(expr_tr), label_tr)
+# params = search_params(clf.best_params_)
+# clf = RBFKernelModel(SVC(C=params['C'], kernel='precomputed', probability=True), params['gamma']).fit(expr_tr, label_tr)
+
+import numpy as np
+from scipy.spatial.distance import pdist, cdist, squareform
+from sklearn.base import BaseEstimator
+from sklearn.gaussian_process.kernels import RBF
+
+## the last training set (the array object, held so that its id is not reused), its shape
+## and its squared distances
+_cache = {'X': None, 'shape': None, 'distances': None}
+
+
+def squared_distances(X, Y=None):
+	X = np.asarray(X, dtype=np.float64)
+	if Y is None:
+		return squareform(pdist(X, 'sqeuclidean'))
+	return cdist(X, np.asarray(Y, dtype=np.float64), 'sqeuclidean')
+
+
+def cached_squared_distances(X):
+	## squared distances between the rows of X, computed once for the same training set; the
+	## cache is keyed on the array object and its shape, not on its values, so a training set
+	## changed in place is not seen
+	if _cache['X'] is not X or _cache['shape'] != np.shape(X):
+		_cache['X'] = X
+		_cache['shape'] = np.shape(X)
+		_cache['distances'] = squared_distances(X)
+	return _cache['distances']
+
+
+def rbf_kernel(X, gamma, Y=None):
+	## exp(-gamma |x - y|^2) of the training samples (from the cache) or of X against Y
+	distances = cached_squared_distances(X) if Y is None else squared_distances(X, Y)
+	return np.exp(-gamma * distances)
+
+
+def search_params(params):
+	## the best_params_ of a PrecomputedRBF search as estimator parameters plus gamma
+	return dict((k.split('__')[-1], v) for (k, v) in params.items())
+
+
+class PrecomputedRBF(BaseEstimator):
+	## an SVC/NuSVC/SVR with kernel='precomputed' fitted on squared distances: gamma is a
+	## parameter of the search, and the estimator's as estimator__C, estimator__nu, ...
+	_pairwise = True
+
+	def __init__(self, estimator, gamma=None):
+		self.estimator = estimator
+		self.gamma = gamma
+
+	@property
+	def _estimator_type(self):
+		return getattr(self.estimator, '_estimator_type', None)
+
+	def fit(self, D, y, sample_weight=None):
+		self.estimator.fit(np.exp(-self.gamma * D), y, sample_weight=sample_weight)
+		return self
+
+	@property
+	def classes_(self):
+		return self.estimator.classes_
+
+	def predict(self, D):
+		return self.estimator.predict(np.exp(-self.gamma * D))
+
+	def decision_function(self, D):
+		return self.estimator.decision_function(np.exp(-self.gamma * D))
+
+	def score(self, D, y):
+		return self.estimator.score(np.exp(-self.gamma * D), y)
+
+
+class RBFKernelModel(BaseEstimator):
+	## an SVC/NuSVC/SVR with kernel='precomputed' that takes raw features
+	def __init__(self, estimator, gamma):
+		self.estimator = estimator
+		self.gamma = gamma
+
+	def fit(self, X, y, sample_weight=None):
+		## the array itself goes to the cache, which a float64 copy would miss
+		self.estimator.fit(rbf_kernel(X, self.gamma), y, sample_weight=sample_weight)
+		## libsvm only reads the kernel columns of the support vectors
+		self.n_fit_ = np.shape(X)[0]
+		self.support_ = getattr(self.estimator, 'support_', np.arange(self.n_fit_))
+		self.X_support_ = np.asarray(X, dtype=np.float64)[self.support_]
+		return self
+
+	def test_kernel(self, X):
+		K = np.zeros((np.shape(X)[0], self.n_fit_))
+		K[:, self.support_] = rbf_kernel(X, self.gamma, self.X_support_)
+		return K
+
+	@property
+	def classes_(self):
+		return self.estimator.classes_
+
+	def predict(self, X):
+		return self.estimator.predict(self.test_kernel(X))
+
+	def predict_proba(self, X):
+		return self.estimator.predict_proba(self.test_kernel(X))
+
+	def decision_function(self, X):
+		return self.estimator.decision_function(self.test_kernel(X))
+
+	def score(self, X, y):
+		return self.estimator.score(self.test_kernel(X), y)
+
+
+class CachedRBF(RBF):
+	## isotropic RBF whose k(X, X) (and gradient) come from the cached squared distances
+	def __call__(self, X, Y=None, eval_gradient=False):
+		if Y is not None or np.ndim(self.length_scale) > 0:
+			return RBF.__call__(self, X, Y, eval_gradient)
+		X = np.atleast_2d(X)
+		dists = cached_squared_distances(X) / self.length_scale**2
+		K = np.exp(-.5 * dists)
+		if not eval_gradient:
+			return K
+		if self.hyperparameter_length_scale.fixed:
+			return K, np.empty((X.shape[0], X.shape[0], 0))
+		return K, (K * dists)[:, :, np.newaxis]
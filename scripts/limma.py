@@ -0,0 +1,323 @@
+#!/usr/bin/python
+# numpy port of the limma path in de_analysis.r: lmFit -> contrasts.fit -> eBayes
+# -> topTable(adjust.method="BH", sort.by="P"). All genes are fitted at once with a
+# few matrix products, so DE runs in-process instead of one Rscript call per split.
+# One fit gives the tables of every contrast (-c, written as <output>.<contrast>.txt),
+# and -m -t N merges the top N/k genes of each of the k contrasts into <output>, as the
+# head/tail concatenation of the p_vs_n and c_vs_n tables in run_pipeline_1.sh.
+# example:
+# python limma.py -i ../data/run_proj_batch1-17_1/training/chipdata.txt -v ../data/run_proj_batch1-17_1/training/valid_chips.txt -g N_vs_P_vs_C -p 1 -f 0 -o ../data/run_proj_batch1-17_1/training/top_de_genes.txt
+# python limma.py -i ../data/run_proj_batch1-17_1/training/chipdata.txt -v ../data/run_proj_batch1-17_1/training/valid_chips.txt -g N_vs_P_vs_C -c PvsN CvsN -m -t 400 -o ../data/run_proj_batch1-17_1/training/top_de_genes.txt
+
+import sys
+import os
+import argparse
+import numpy as np
+from scipy.special import digamma, polygamma
+from scipy.stats import t as t_dist
+import expr_store
+from indexed_axis import IndexedAxis
+
+groups = ['N_vs_C', 'N_vs_P_vs_C']
+## design columns (sorted label levels) and contrasts of de_analysis.r
+group_levels = {'N_vs_C': ['Normal', 'Cancer'],
+				'N_vs_P_vs_C': ['Normal', 'Polyp', 'Cancer']}
+group_contrasts = {'N_vs_C': [('CvsN', 'Cancer', 'Normal')],
+					'N_vs_P_vs_C': [('CvsN', 'Cancer', 'Normal'), ('CvsP', 'Cancer', 'Polyp'), ('PvsN', 'Polyp', 'Normal')]}
+TOP_TABLE_COLUMNS = ['logFC', 'AveExpr', 't', 'P.Value', 'adj.P.Val', 'B']
+CHUNK_SIZE = 8192
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='limma-style moderated t-test between sample groups.')
+	parser.add_argument('-i', '--input_expr', dest='input_expr')
+	parser.add_argument('-v', '--valid_chips', dest='valid_chips')
+	parser.add_argument('-g', '--group', dest='group', default='N_vs_P_vs_C', help='options: %s' % groups)
+	parser.add_argument('-p', '--thld_pval', dest='thld_pval', type=float, default=1.)
+	parser.add_argument('-f', '--thld_fc', dest='thld_fc', type=float, default=0.)
+	parser.add_argument('-c', '--contrasts', dest='contrasts', nargs='+', default=None, help='contrast names or "all" (default: the first contrast)')
+	parser.add_argument('-m', '--merge', dest='merge', action='store_true', default=False, help='write the merged top genes of the contrasts to the output')
+	parser.add_argument('-t', '--num_top_genes', dest='num_top_genes', type=int, default=None)
+	parser.add_argument('-o', '--output', dest='output')
+	parsed = parser.parse_args(argv[1:])
+	if parsed.merge and parsed.num_top_genes == None:
+		sys.exit("Error: -m needs the number of top genes (-t).")
+	return parsed
+
+
+class LinearFit(object):
+	## per-gene fit of all genes against one design, as limma's MArrayLM
+	def __init__(self, coefficients, stdev_unscaled, sigma, df_residual, Amean, cov_coefficients, names):
+		self.coefficients = coefficients
+		self.stdev_unscaled = stdev_unscaled
+		self.sigma = sigma
+		self.df_residual = df_residual
+		self.Amean = Amean
+		self.cov_coefficients = cov_coefficients
+		self.names = list(names)
+
+
+def design_matrix(labels):
+	## model.matrix(~0+factor(labels)): one indicator column per sorted label level
+	labels = np.asarray(labels)
+	try:
+		levels = sorted(set(labels), key=float)
+	except ValueError:
+		levels = sorted(set(labels))
+	design = np.array([labels == x for x in levels], dtype=np.float64).T
+	return (design, levels)
+
+
+def contrast_matrix(group, levels):
+	## makeContrasts over the design columns named after the group levels
+	if group not in group_levels:
+		sys.exit("Error: unknown group %s, options: %s" % (group, groups))
+	names = group_levels[group]
+	if len(levels) != len(names):
+		sys.exit("Error: group %s needs %d label levels, found %d: %s" % (group, len(names), len(levels), ", ".join(levels)))
+	contrasts = np.zeros((len(names), len(group_contrasts[group])))
+	for j, (name, plus, minus) in enumerate(group_contrasts[group]):
+		contrasts[names.index(plus), j] = 1
+		contrasts[names.index(minus), j] = -1
+	return ([x[0] for x in group_contrasts[group]], contrasts)
+
+
+def lm_fit(expr, design, chunk_size=CHUNK_SIZE):
+	## least squares fit of every gene (row of expr) on the design, in float64 chunks of genes
+	(n, k) = design.shape
+	cov = np.linalg.inv(np.dot(design.T, design))
+	proj = np.dot(design, cov)
+	num_genes = expr.shape[0]
+	coefficients = np.zeros((num_genes, k))
+	rss = np.zeros(num_genes)
+	Amean = np.zeros(num_genes)
+	for start in range(0, num_genes, chunk_size):
+		y = np.asarray(expr[start:start+chunk_size], dtype=np.float64)
+		coef = np.dot(y, proj)
+		coefficients[start:start+chunk_size] = coef
+		rss[start:start+chunk_size] = np.sum((y - np.dot(coef, design.T))**2, axis=1)
+		Amean[start:start+chunk_size] = np.mean(y, axis=1)
+	df_residual = n - np.linalg.matrix_rank(design)
+	sigma = np.sqrt(rss / df_residual)
+	return LinearFit(coefficients, np.sqrt(np.diag(cov)), sigma, df_residual, Amean, cov, range(k))
+
+
+def contrasts_fit(fit, contrasts, names):
+	## no missing values, so stdev.unscaled is shared by all genes: sqrt(diag(C' cov C))
+	cov = np.dot(contrasts.T, np.dot(fit.cov_coefficients, contrasts))
+	return LinearFit(np.dot(fit.coefficients, contrasts), np.sqrt(np.diag(cov)), fit.sigma,
+		fit.df_residual, fit.Amean, cov, names)
+
+
+def trigamma_inverse(x):
+	## Newton iteration of limma's trigammaInverse, elementwise
+	x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+	y = 0.5 + 1. / x
+	## iterate on the values that the asymptotic limits do not cover
+	todo = (x >= 1e-6) & (x <= 1e7)
+	for i in range(50):
+		if not np.any(todo):
+			break
+		tri = polygamma(1, y[todo])
+		dif = tri * (1 - tri / x[todo]) / polygamma(2, y[todo])
+		y[todo] += dif
+		todo[todo] = -dif / y[todo] >= 1e-8
+	y[x > 1e7] = 1. / np.sqrt(x[x > 1e7])
+	y[x < 1e-6] = 1. / x[x < 1e-6]
+	return y
+
+
+def fit_f_dist(x, df1):
+	## moment estimation of the scaled F prior on the residual variances (limma fitFDist),
+	## over the last axis, so a batch of variance vectors is fitted at once
+	x = np.maximum(x, 0)
+	m = np.median(x, axis=-1)[...,np.newaxis]
+	if np.any(m == 0):
+		sys.stderr.write("Warning: more than half of residual variances are exactly zero: eBayes unreliable\n")
+		m[m == 0] = 1
+	x = np.maximum(x, 1e-5 * m)
+	e = np.log(x) - digamma(df1 / 2.) + np.log(df1 / 2.)
+	emean = np.mean(e, axis=-1)
+	evar = np.sum((e - emean[...,np.newaxis])**2, axis=-1) / (x.shape[-1] - 1) - polygamma(1, df1 / 2.)
+	evar = np.atleast_1d(evar)
+	df2 = np.repeat(np.inf, len(evar))
+	df2[evar > 0] = 2 * trigamma_inverse(evar[evar > 0])
+	s20 = np.atleast_1d(np.exp(emean))
+	finite = np.isfinite(df2)
+	s20[finite] = np.exp(np.atleast_1d(emean)[finite] + digamma(df2[finite] / 2.) - np.log(df2[finite] / 2.))
+	if np.ndim(emean) == 0:
+		return (s20[0], df2[0])
+	return (s20, df2)
+
+
+def squeeze_var(s2, df):
+	## posterior variances (limma squeezeVar): (s2_post, s2_prior, df_prior) over the last axis
+	(s2_prior, df_prior) = fit_f_dist(s2, df)
+	s2_prior_b = np.asarray(s2_prior)[...,np.newaxis]
+	df_prior_b = np.asarray(df_prior)[...,np.newaxis]
+	with np.errstate(invalid='ignore'):
+		s2_post = (df * s2 + df_prior_b * s2_prior_b) / (df + df_prior_b)
+	s2_post = np.where(np.isinf(df_prior_b), s2_prior_b, s2_post)
+	return (s2_post, s2_prior, df_prior)
+
+
+def tmixture(tstat, stdev_unscaled, df, proportion, v0_lim):
+	## prior variance of the non-zero coefficients from the top t statistics, step by step as
+	## limma tmixture.vector: missing statistics dropped, df made equal, the ntarget largest
+	## |t| (order(tstat, decreasing=TRUE)[1:ntarget]) compared with the null order statistics
+	tstat = np.abs(np.asarray(tstat, dtype=np.float64))
+	v1 = np.broadcast_to(np.asarray(stdev_unscaled, dtype=np.float64)**2, tstat.shape)
+	df = np.broadcast_to(np.asarray(df, dtype=np.float64), tstat.shape)
+	keep = ~np.isnan(tstat)
+	(tstat, v1, df) = (tstat[keep], v1[keep], df[keep])
+	ngenes = len(tstat)
+	ntarget = int(np.ceil(proportion / 2. * ngenes))
+	if ntarget < 1:
+		return np.nan
+	p = max(ntarget / float(ngenes), proportion)
+	max_df = np.max(df)
+	i = df < max_df
+	if np.any(i):
+		tstat[i] = t_dist.isf(t_dist.sf(tstat[i], df[i]), max_df)
+	o = np.argsort(-tstat, kind='mergesort')[:ntarget]
+	(tstat, v1) = (tstat[o], v1[o])
+	r = np.arange(1, ntarget+1)
+	p0 = 2 * t_dist.sf(tstat, max_df)
+	ptarget = ((r - 0.5) / ngenes - (1 - p) * p0) / p
+	v0 = np.zeros(ntarget)
+	pos = ptarget > p0
+	if np.any(pos):
+		qtarget = t_dist.isf(ptarget[pos] / 2., max_df)
+		v0[pos] = v1[pos] * ((tstat[pos] / qtarget)**2 - 1)
+	v0 = np.minimum(np.maximum(v0, v0_lim[0]), v0_lim[1])
+	return np.mean(v0)
+
+
+def ebayes(fit, proportion=0.01, stdev_coef_lim=(0.1, 4)):
+	## moderated t statistics, p-values and log-odds (B) of every gene and coefficient
+	s2 = fit.sigma**2
+	(fit.s2_post, fit.s2_prior, fit.df_prior) = squeeze_var(s2, fit.df_residual)
+	df_pooled = fit.df_residual * len(s2)
+	fit.df_total = min(fit.df_residual + fit.df_prior, df_pooled)
+	fit.t = fit.coefficients / fit.stdev_unscaled / np.sqrt(fit.s2_post)[:,np.newaxis]
+	fit.p_value = 2 * t_dist.sf(np.abs(fit.t), fit.df_total)
+
+	var_prior_lim = np.array(stdev_coef_lim)**2 / fit.s2_prior
+	fit.var_prior = np.array([tmixture(fit.t[:,j], fit.stdev_unscaled[j], fit.df_total, proportion, var_prior_lim)
+		for j in range(fit.t.shape[1])])
+	fit.var_prior[np.isnan(fit.var_prior)] = 1. / fit.s2_prior
+	r = (fit.stdev_unscaled**2 + fit.var_prior) / fit.stdev_unscaled**2
+	t2 = fit.t**2
+	if fit.df_prior > 1e6:
+		kernel = t2 * (1 - 1. / r) / 2
+	else:
+		kernel = (1 + fit.df_total) / 2. * np.log((t2 + fit.df_total) / (t2 / r + fit.df_total))
+	fit.lods = np.log(proportion / (1 - proportion)) - np.log(r) / 2 + kernel
+	return fit
+
+
+def p_adjust_bh(p):
+	## Benjamini-Hochberg adjusted p-values, as p.adjust(method="BH")
+	n = len(p)
+	o = np.argsort(p)[::-1]
+	adj = np.minimum.accumulate(np.asarray(p)[o] * n / np.arange(n, 0, -1, dtype=np.float64))
+	out = np.empty(n)
+	out[o] = np.minimum(adj, 1)
+	return out
+
+
+def top_table(fit, coef=0):
+	## (gene order by P.Value, genes x TOP_TABLE_COLUMNS table) of one coefficient
+	p = fit.p_value[:,coef]
+	table = np.column_stack((fit.coefficients[:,coef], fit.Amean, fit.t[:,coef], p, p_adjust_bh(p), fit.lods[:,coef]))
+	return (np.argsort(p, kind='mergesort'), table)
+
+
+def top_tables(fit, contrasts=None):
+	## {contrast name: (gene order, table)} of every (or the named) contrasts of one fit
+	if contrasts == None:
+		contrasts = fit.names
+	missing = [x for x in contrasts if x not in fit.names]
+	if len(missing) > 0:
+		sys.exit("Error: unknown contrasts %s, options: %s" % (", ".join(missing), ", ".join(fit.names)))
+	return dict((x, top_table(fit, fit.names.index(x))) for x in contrasts)
+
+
+def merge_top_tables(parts, num_top_genes):
+	## top num/k genes of each of the k (gene order, table) parts, in order; a gene ranked
+	## in two contrasts is kept twice, as the head/tail concatenation did
+	per_part = num_top_genes / len(parts)
+	return [(indx[:per_part], table) for (indx, table) in parts]
+
+
+def select_genes(indx, table, thld_pval=1., thld_fc=0.):
+	## the row filter of de_analysis.r: logFC > log2(fc) & P.Value < pval
+	with np.errstate(divide='ignore'):
+		min_fc = np.log2(thld_fc)
+	keep = (table[indx,0] > min_fc) & (table[indx,3] < thld_pval)
+	return indx[keep]
+
+
+def de_analysis(expr, samples, valid_chips, group):
+	## fit the group design on the valid chips (sample, label) and return the eBayes fit
+	indx = IndexedAxis(samples, 'samples').positions(valid_chips[:,0])
+	(design, levels) = design_matrix(valid_chips[:,1])
+	(names, contrasts) = contrast_matrix(group, levels)
+	expr = np.take(expr, indx, axis=1)
+	fit = lm_fit(expr, design)
+	return ebayes(contrasts_fit(fit, contrasts, names))
+
+
+def write_top_table(filename, gene_ids, indx, table):
+	## same layout as write.table(top_genes) in de_analysis.r (header has no row name column)
+	write_merged_table(filename, gene_ids, [(indx, table)])
+
+
+def write_merged_table(filename, gene_ids, parts):
+	## one header, then the rows of every (gene order, table) part
+	with open(filename, 'w') as f:
+		f.write('\t'.join(TOP_TABLE_COLUMNS) + '\n')
+		for (indx, table) in parts:
+			for i in indx:
+				f.write(gene_ids[i] + '\t' + '\t'.join('%.15g' % x for x in table[i]) + '\n')
+
+
+def contrast_filename(filename, contrast):
+	(root, ext) = os.path.splitext(filename)
+	return root + '.' + contrast + ext
+
+
+def write_results(fit, gene_ids, output, contrasts=None, merge=False, num_top_genes=None, thld_pval=1., thld_fc=0.):
+	## the output of the CLI: first contrast to output, or a table per contrast (+ merged top genes)
+	if contrasts == None and not merge:
+		(indx, table) = top_table(fit, coef=0)
+		indx = select_genes(indx, table, thld_pval, thld_fc)
+		write_top_table(output, gene_ids, indx, table)
+		return
+
+	## one fit, a table per contrast
+	contrasts = fit.names if contrasts == None or contrasts == ['all'] else contrasts
+	tables = top_tables(fit, contrasts)
+	parts = []
+	for x in contrasts:
+		(indx, table) = tables[x]
+		indx = select_genes(indx, table, thld_pval, thld_fc)
+		write_top_table(contrast_filename(output, x), gene_ids, indx, table)
+		print "   contrast", x, ":", len(indx), "genes"
+		parts.append((indx, table))
+	if merge:
+		write_merged_table(output, gene_ids, merge_top_tables(parts, num_top_genes))
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	[header, rows, expr] = expr_store.load_expr(parsed.input_expr)
+	valid_chips = np.loadtxt(parsed.valid_chips, dtype=str, delimiter='\t', ndmin=2)
+	print "   group", parsed.group
+	fit = de_analysis(expr, header[1:], valid_chips, parsed.group)
+	write_results(fit, rows[:,0], parsed.output, parsed.contrasts, parsed.merge, parsed.num_top_genes,
+		parsed.thld_pval, parsed.thld_fc)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+# Null distribution of the limma DE statistics by label permutation, in memory.
+# Permuting the labels permutes the rows of the design, so X'X (and its inverse) is
+# the same for every permutation: the group sums of a whole batch of permutations
+# come out of one matrix product Y [X_p1 X_p2 ...], and the residual variances from
+# sum(y^2) - coef.(X'y). Only the summary table is written: one row per permutation
+# with the statistics permutate_de_gene_analysis.py computed from the top genes.
+# Batches run on a pool of -j worker processes that attach to the centered matrix in
+# shared memory; batch b draws its permutations from RandomState([seed, b]), so the
+# table is the same for any number of workers.
+# example:
+# python permutate_de_null.py -i ../data/run_proj_batch1-17_1/training/chipdata.txt -v ../data/run_proj_batch1-17_1/training/valid_chips.txt -g N_vs_P_vs_C -n 10000 -k 60 -s 0 -j 8 -o ../data/run_proj_batch1-17_1/permutation_experiments_results.txt
+
+import sys
+import argparse
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+from scipy.stats import t as t_dist
+import expr_store
+import limma
+from indexed_axis import IndexedAxis
+
+SUMMARY_COLUMNS = ['Experiment', 'mean logFC', 'max logFC', 'min logFC', 'mean p-value', 'min p-value', 'max p-value']
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Label permutation null distribution of limma DE genes.')
+	parser.add_argument('-i', '--input_expr', dest='input_expr')
+	parser.add_argument('-v', '--valid_chips', dest='valid_chips')
+	parser.add_argument('-g', '--group', dest='group', default='N_vs_P_vs_C', help='options: %s' % limma.groups)
+	parser.add_argument('-c', '--contrast', dest='contrast', default=None, help='default: the first contrast of the group')
+	parser.add_argument('-n', '--num_permuted', dest='num_permuted', type=int, default=1000)
+	parser.add_argument('-k', '--num_top_genes', dest='num_top_genes', type=int, default=60)
+	parser.add_argument('-b', '--batch_size', dest='batch_size', type=int, default=32)
+	parser.add_argument('-s', '--seed', dest='seed', type=int, default=None)
+	parser.add_argument('-j', '--workers', dest='workers', type=int, default=1)
+	parser.add_argument('-o', '--output_analysis', dest='output_analysis')
+	parsed = parser.parse_args(argv[1:])
+	return parsed
+
+
+class PermutationModel(object):
+	## everything shared by the permutations: centered data, sum of squares, design inverse
+	def __init__(self, expr, design, contrast, centered=False):
+		## rows are centered once; the group designs span the intercept, so residuals and contrasts are unchanged
+		self.y = np.asarray(expr, dtype=np.float64)
+		if not centered:
+			self.y = self.y - np.mean(self.y, axis=1)[:,np.newaxis]
+		self.yy = np.sum(self.y**2, axis=1)
+		self.design = design
+		self.cov = np.linalg.inv(np.dot(design.T, design))
+		self.contrast = contrast
+		self.stdev_unscaled = np.sqrt(np.dot(contrast, np.dot(self.cov, contrast)))
+		self.df_residual = design.shape[0] - np.linalg.matrix_rank(design)
+
+
+def permuted_fits(model, perms):
+	## logFC and residual variances (permutations x genes) of a batch of label permutations
+	(num_genes, k) = (model.y.shape[0], model.design.shape[1])
+	designs = np.hstack([model.design[p] for p in perms])
+	sums = np.dot(model.y, designs).reshape(num_genes, len(perms), k).transpose(1, 0, 2)
+	coef = np.dot(sums, model.cov)
+	rss = np.maximum(model.yy - np.sum(coef * sums, axis=2), 0)
+	return (np.dot(coef, model.contrast), rss / model.df_residual)
+
+
+def moderated_p(model, logfc, s2):
+	## eBayes p-values, with the variance prior fitted per permutation
+	(s2_post, s2_prior, df_prior) = limma.squeeze_var(s2, model.df_residual)
+	df_total = np.minimum(model.df_residual + np.atleast_1d(df_prior), model.df_residual * s2.shape[-1])
+	t = logfc / model.stdev_unscaled / np.sqrt(s2_post)
+	return 2 * t_dist.sf(np.abs(t), df_total[:,np.newaxis])
+
+
+def summarize_top_genes(logfc, pval, num_top_genes):
+	## per permutation: geo-mean, max, min of |logFC| and geo-mean, min, max of the p-values of the top genes by P
+	top = np.argpartition(pval, num_top_genes-1, axis=1)[:,:num_top_genes]
+	rows = np.arange(len(pval))[:,np.newaxis]
+	(logfc, pval) = (np.abs(logfc[rows, top]), pval[rows, top])
+	with np.errstate(divide='ignore'):
+		return np.column_stack((np.exp(np.mean(np.log(logfc), axis=1)), np.max(logfc, axis=1), np.min(logfc, axis=1),
+			np.exp(np.mean(np.log(pval), axis=1)), np.min(pval, axis=1), np.max(pval, axis=1)))
+
+
+def run_permutations(model, perms, num_top_genes):
+	(logfc, s2) = permuted_fits(model, perms)
+	return summarize_top_genes(logfc, moderated_p(model, logfc, s2), num_top_genes)
+
+
+def shared_matrix(expr, indx, chunk_size=limma.CHUNK_SIZE):
+	## the columns indx of expr with centered rows, written block by block into a RawArray that
+	## forked workers map instead of receiving a pickled copy; no full float64 copy is made
+	raw = RawArray('d', expr.shape[0] * len(indx))
+	shared = np.frombuffer(raw, dtype=np.float64).reshape(expr.shape[0], len(indx))
+	for start in range(0, expr.shape[0], chunk_size):
+		block = np.take(expr[start:start+chunk_size], indx, axis=1).astype(np.float64)
+		shared[start:start+chunk_size] = block - np.mean(block, axis=1)[:,np.newaxis]
+	return (raw, shared)
+
+
+def batch_permutations(seed, batch, batch_size, num_permuted, num_samples):
+	## independent, reproducible stream per batch
+	rs = np.random.RandomState([seed, batch])
+	count = min(batch_size, num_permuted - batch*batch_size)
+	return [rs.permutation(num_samples) for i in range(count)]
+
+
+_worker = {}
+
+
+def _init_worker(raw, shape, design, contrast, options):
+	y = np.frombuffer(raw, dtype=np.float64).reshape(shape)
+	_worker['model'] = PermutationModel(y, design, contrast, centered=True)
+	_worker['options'] = options
+
+
+def _run_batch(batch):
+	(seed, batch_size, num_permuted, num_top_genes) = _worker['options']
+	model = _worker['model']
+	perms = batch_permutations(seed, batch, batch_size, num_permuted, model.y.shape[1])
+	return (batch, run_permutations(model, perms, num_top_genes))
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	[header, rows, expr] = expr_store.load_expr(parsed.input_expr)
+	valid_chips = np.loadtxt(parsed.valid_chips, dtype=str, delimiter='\t', ndmin=2)
+	indx = IndexedAxis(header[1:], 'samples').positions(valid_chips[:,0])
+	(design, levels) = limma.design_matrix(valid_chips[:,1])
+	(names, contrasts) = limma.contrast_matrix(parsed.group, levels)
+	contrast = names[0] if parsed.contrast == None else parsed.contrast
+	if contrast not in names:
+		sys.exit("Error: unknown contrast %s, options: %s" % (contrast, ", ".join(names)))
+	(raw, y) = shared_matrix(expr, indx)
+	del expr
+	model = PermutationModel(y, design, contrasts[:,names.index(contrast)], centered=True)
+	num_samples = len(indx)
+	print "Genes x samples:", model.y.shape, ", contrast:", contrast
+
+	seed = parsed.seed if parsed.seed != None else np.random.randint(2**31)
+	print "Seed:", seed
+	num_batches = (parsed.num_permuted + parsed.batch_size - 1) / parsed.batch_size
+	options = (seed, parsed.batch_size, parsed.num_permuted, parsed.num_top_genes)
+
+	## null statistics are merged into their rows as batches come back, in any order
+	results = np.zeros((parsed.num_permuted+1, len(SUMMARY_COLUMNS)-1))
+	results[0] = run_permutations(model, [np.arange(num_samples)], parsed.num_top_genes)
+	_init_worker(raw, model.y.shape, design, model.contrast, options)
+	if parsed.workers > 1:
+		pool = multiprocessing.Pool(parsed.workers, _init_worker, (raw, model.y.shape, design, model.contrast, options))
+		batches = pool.imap_unordered(_run_batch, range(num_batches))
+	else:
+		batches = (_run_batch(b) for b in range(num_batches))
+	done = 0
+	for (batch, summary) in batches:
+		start = 1 + batch*parsed.batch_size
+		results[start:start+len(summary)] = summary
+		done += len(summary)
+		print "Permutations done:", done
+	if parsed.workers > 1:
+		pool.close()
+		pool.join()
+
+	row_names = np.array(['original'] + ['perm_data_'+str(i+1) for i in range(parsed.num_permuted)], dtype=str)[np.newaxis].T
+	results = np.vstack((np.array(SUMMARY_COLUMNS, dtype=str), np.hstack((row_names, np.array(results, dtype=str)))))
+	np.savetxt(parsed.output_analysis, results, fmt='%s', delimiter='\t')
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# Pipeline stages as a DAG: each stage is a command with explicit input and output
+# files, a stage depends on the stages that write its inputs, and independent
+# stages run concurrently as child processes on a fixed number of workers.
+# Wall-clock time and peak memory (max RSS from wait4) are recorded per stage.
+
+import sys
+import os
+import time
+import subprocess
+import stage_cache
+
+
+class Stage(object):
+	def __init__(self, name, command, inputs=[], outputs=[], log=None):
+		self.name = name
+		self.command = [str(x) for x in command]
+		self.inputs = list(inputs)
+		self.outputs = list(outputs)
+		self.log = log
+		self.status = 'pending'
+		self.start = None
+		self.wall_time = 0.
+		self.max_rss = 0.
+
+
+class Pipeline(object):
+	def __init__(self, log_directory=None, cache_directory=None):
+		self.stages = []
+		self.log_directory = log_directory
+		self.cache_directory = cache_directory
+
+	def add(self, name, command, inputs=[], outputs=[]):
+		if name in [s.name for s in self.stages]:
+			raise ValueError('Duplicated stage name: ' + name)
+		log = os.path.join(self.log_directory, name + '.log') if self.log_directory != None else None
+		stage = Stage(name, command, inputs, outputs, log)
+		self.stages.append(stage)
+		return stage
+
+	def dependencies(self):
+		## stage name -> names of the stages writing its inputs
+		producer = {}
+		for s in self.stages:
+			for output in s.outputs:
+				if os.path.abspath(output) in producer:
+					raise ValueError('Output written by two stages: ' + output)
+				producer[os.path.abspath(output)] = s.name
+		deps = {}
+		missing = []
+		for s in self.stages:
+			deps[s.name] = set()
+			for x in s.inputs:
+				if os.path.abspath(x) in producer:
+					deps[s.name].add(producer[os.path.abspath(x)])
+				elif not os.path.exists(x):
+					missing.append('%s (%s)' % (x, s.name))
+		if len(missing) > 0:
+			raise ValueError('Inputs neither present nor produced by a stage: ' + ', '.join(missing))
+		return deps
+
+	def _launch(self, stage):
+		stage.start = time.time()
+		stage.status = 'running'
+		for output in stage.outputs:
+			parent = os.path.dirname(os.path.abspath(output))
+			if not os.path.exists(parent):
+				os.makedirs(parent)
+		## stages without outputs (e.g. predictions printed to the log) always run
+		stage.cached = self.cache_directory != None and len(stage.outputs) > 0
+		if stage.cached:
+			(stage.key, stage.entry_dir, hit) = stage_cache.lookup(self.cache_directory,
+				stage.command, stage.inputs, stage.outputs, scan_command=False)
+			if hit:
+				stage_cache.restore(stage.entry_dir, stage.outputs)
+				stage.status = 'cached'
+				stage.wall_time = time.time() - stage.start
+				return None
+			stage_cache.prepare_outputs(stage.outputs)
+		out = open(stage.log, 'w') if stage.log != None else None
+		try:
+			proc = subprocess.Popen(stage.command, stdout=out, stderr=subprocess.STDOUT if out != None else None)
+		except OSError as e:
+			## e.g. Rscript not on the PATH: the stage fails, the rest of the DAG goes on
+			if out != None:
+				out.write('Error: cannot run %s: %s\n' % (stage.command[0], e))
+			stage.status = 'failed'
+			proc = None
+		if out != None:
+			out.close()
+		return proc
+
+	def _finish(self, stage, status, rusage):
+		stage.wall_time = time.time() - stage.start
+		stage.max_rss = rusage.ru_maxrss / 1024.
+		code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 1
+		if code == 0 and stage.cached:
+			code = stage_cache.commit(stage.entry_dir, stage.outputs, stage.command, stage.key)
+		stage.status = 'done' if code == 0 else 'failed'
+
+	def run(self, n_workers=1):
+		## returns True if every stage finished
+		if self.log_directory != None and not os.path.exists(self.log_directory):
+			os.makedirs(self.log_directory)
+		deps = self.dependencies()
+		by_name = dict((s.name, s) for s in self.stages)
+		running = {}
+		time_start = time.time()
+		while True:
+			## skip stages downstream of a failure, launch ready ones in declaration order
+			for s in self.stages:
+				if s.status == 'pending' and any(by_name[d].status in ('failed', 'skipped') for d in deps[s.name]):
+					s.status = 'skipped'
+			for s in self.stages:
+				if len(running) >= n_workers:
+					break
+				if s.status == 'pending' and all(by_name[d].status in ('done', 'cached') for d in deps[s.name]):
+					proc = self._launch(s)
+					if proc != None:
+						## the Popen object is kept alive, or subprocess would reap the child behind wait4
+						running[proc.pid] = (proc, s)
+						sys.stdout.write('[%7.1fs] started %s\n' % (time.time()-time_start, s.name))
+					else:
+						sys.stdout.write('[%7.1fs] %-7s %s\n' % (time.time()-time_start, s.status, s.name))
+					sys.stdout.flush()
+			if len(running) == 0:
+				if any(s.status == 'pending' and all(by_name[d].status in ('done', 'cached') for d in deps[s.name]) for s in self.stages):
+					continue
+				break
+			(pid, status, rusage) = os.wait4(-1, 0)
+			if pid not in running:
+				continue
+			(proc, s) = running.pop(pid)
+			proc.returncode = status
+			self._finish(s, status, rusage)
+			sys.stdout.write('[%7.1fs] %-7s %s (%.1fs, %.0f MB)\n' % (time.time()-time_start, s.status, s.name, s.wall_time, s.max_rss))
+			sys.stdout.flush()
+		self.total_time = time.time() - time_start
+		return all(s.status in ('done', 'cached') for s in self.stages)
+
+	def report(self, filename=None):
+		lines = ['\t'.join(['stage', 'status', 'wall_clock_sec', 'max_rss_mb', 'command'])]
+		for s in self.stages:
+			lines.append('\t'.join([s.name, s.status, '%.2f' % s.wall_time, '%.1f' % s.max_rss, ' '.join(s.command)]))
+		lines.append('\t'.join(['TOTAL', '', '%.2f' % self.total_time, '', '']))
+		if filename != None:
+			with open(filename, 'w') as f:
+				f.write('\n'.join(lines) + '\n')
+		return lines
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# Fused prepare_normalized_expr_data.py + split_expr_train_vs_test.py: one scan of the
+# normalized chip data writes the training/testing x filtered/full matrices.
+# example:
+# python prepare_and_split_expr_data.py -i ../data/run_proj_batch1-17_1/chipdata_rma.expression_console.good_rin.TXT -l ../data/external_data/Genecards_colon_cancer/GeneCards_Nanostring_CIViC_genes_annotated.txt -c 2 -v ../data/run_proj_batch1-17_1/valid_chips.txt -o ../data/run_proj_batch1-17_1
+
+import sys
+import os
+import argparse
+import operator
+import numpy as np
+import expr_stream
+from prepare_normalized_expr_data import format_sample_id
+from split_expr_train_vs_test import split_samples
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Filter normalized chip data and split it into training/testing sets in one pass.')
+	parser.add_argument('-i', '--input_expr', dest='input_expr')
+	parser.add_argument('-l', '--transcript_cluster_list', dest='transcript_cluster_list')
+	parser.add_argument('-c', '--column_number', dest='column_number', type=int)
+	parser.add_argument('-v', '--valid_chips', dest='valid_chips')
+	parser.add_argument('-o', '--output_directory', dest='output_directory')
+	parsed = parser.parse_args(argv[1:])
+	return parsed
+
+
+def column_projector(indx):
+	## picks the cells at indx out of a split row in one C-level call
+	if len(indx) == 0:
+		return lambda cells: ()
+	getter = operator.itemgetter(*indx)
+	if len(indx) == 1:
+		return lambda cells: (getter(cells),)
+	return getter
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	dir_tr = os.path.join(parsed.output_directory, 'training')
+	dir_te = os.path.join(parsed.output_directory, 'testing')
+	for d in [dir_tr, dir_te]:
+		if not os.path.exists(d):
+			os.makedirs(d)
+
+	tcs = expr_stream.read_transcript_clusters(parsed.transcript_cluster_list, parsed.column_number)
+	print "Transript cluster count:", len(tcs)
+
+	f = open(parsed.input_expr, "r")
+	header = f.readline().rstrip("\r\n").split("\t")
+	samples = np.array([format_sample_id(x) for x in header[1:]])
+
+	## precompute the column index arrays of both sets once
+	valid_chips = np.loadtxt(parsed.valid_chips, dtype=str)
+	(valid_chips_tr, indx_tr, valid_chips_te, indx_te) = split_samples(valid_chips, samples)
+	np.savetxt(os.path.join(dir_tr, 'valid_chips.txt'), valid_chips_tr, fmt="%s", delimiter="\t")
+	np.savetxt(os.path.join(dir_te, 'valid_chips.txt'), valid_chips_te, fmt="%s", delimiter="\t")
+	print "Training/testing chips:", len(indx_tr), len(indx_te)
+
+	project_tr = column_projector(indx_tr)
+	project_te = column_projector(indx_te)
+	out_tr = open(os.path.join(dir_tr, 'chipdata.txt'), "w")
+	out_tr_full = open(os.path.join(dir_tr, 'chipdata_full.txt'), "w")
+	out_te = open(os.path.join(dir_te, 'chipdata.txt'), "w")
+	out_te_full = open(os.path.join(dir_te, 'chipdata_full.txt'), "w")
+
+	line_tr = "\t".join((header[0],) + project_tr(list(samples))) + "\n"
+	line_te = "\t".join((header[0],) + project_te(list(samples))) + "\n"
+	for out in [out_tr, out_tr_full]:
+		out.write(line_tr)
+	for out in [out_te, out_te_full]:
+		out.write(line_te)
+
+	## route every row to the filtered and/or full outputs of both sets
+	count_filtered = 0
+	count_full = 0
+	for line in f:
+		tmp_arr = line.rstrip("\r\n").split("\t")
+		row_id = tmp_arr[0]
+		filtered = row_id in tcs
+		full = row_id.startswith("TC")
+		if not (filtered or full):
+			continue
+		cells = tmp_arr[1:]
+		line_tr = "\t".join((row_id,) + project_tr(cells)) + "\n"
+		line_te = "\t".join((row_id,) + project_te(cells)) + "\n"
+		if filtered:
+			out_tr.write(line_tr)
+			out_te.write(line_te)
+			count_filtered += 1
+		if full:
+			out_tr_full.write(line_tr)
+			out_te_full.write(line_te)
+			count_full += 1
+	f.close()
+	for out in [out_tr, out_tr_full, out_te, out_te_full]:
+		out.close()
+	print "Rows written (filtered, full):", count_filtered, count_full
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -2,6 +2,8 @@
 import sys
 import argparse
 import numpy as np
+import expr_store
+import expr_stream
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description='')
@@ -10,46 +12,53 @@ def parse_args(argv):
 	parser.add_argument('-c', '--column_number', dest='column_number', type=int)
 	parser.add_argument('-o1', '--output_expr_filtered', dest='output_expr_filtered')
 	parser.add_argument('-o2', '--output_expr_full', dest='output_expr_full')
+	parser.add_argument('-s', '--stream', dest='stream', action='store_true', default=False, help='filter the text input line by line in constant memory')
 	parsed = parser.parse_args(argv[1:])
 	return parsed
 
+def format_sample_id(column_name):
+	##modify header (sample_id.label)
+	tmp = column_name.split(" ")
+	return tmp[0] + "." + tmp[1].split(".")[0]
+
+def format_header(line):
+	header = line.rstrip("\r\n").split("\t")
+	return "\t".join([header[0]] + [format_sample_id(x) for x in header[1:]]) + "\n"
+
 def main(argv):
 	parsed = parse_args(argv)
 
 	##load gene filtering dictionary
-	f = open(parsed.transcript_cluster_list, "r")
-	lines = f.readlines()
-	tcs = set()
-	for line in lines:
-		tmp_arr = line.strip().split("\t")
-		if len(tmp_arr) > parsed.column_number:
-			for tmp_tc in tmp_arr[parsed.column_number].split(","):
-				tcs.add(tmp_tc)
-	f.close()
-	tcs = list(tcs)
+	tcs = expr_stream.read_transcript_clusters(parsed.transcript_cluster_list, parsed.column_number)
 	print "Transript cluster count:", len(tcs)
 
+	if parsed.stream:
+		##route each row to the filtered and/or full output in one pass
+		counts = expr_stream.route_rows(parsed.input_expr, 
+			[(parsed.output_expr_filtered, expr_stream.in_set(tcs)), 
+			(parsed.output_expr_full, expr_stream.is_tc)], 
+			convert_header=format_header)
+		print "Rows written (filtered, full):", counts[0], counts[1]
+		return
+
 	##load input expression data 
-	expr = np.loadtxt(parsed.input_expr, dtype=str, delimiter="\t")
+	[header, rownames, expr] = expr_store.load_expr(parsed.input_expr, keep_text=True)
 	
 	##modify header (sample_id.label)
-	for i in range(1,expr.shape[1]):
-		tmp = expr[0,i].split(" ")
-		sample = tmp[0] + "." + tmp[1].split(".")[0]
-		expr[0,i] = sample
+	header = [header[0]] + [format_sample_id(x) for x in header[1:]]
 
 	##filter genes
-	tc_indx_filtered = [0]
-	tc_indx_full = [0]
-	for i in range(1,expr.shape[0]):
-		if expr[i,0] in tcs:
+	tc_indx_filtered = []
+	tc_indx_full = []
+	for i in range(len(rownames)):
+		if rownames[i,0] in tcs:
 			tc_indx_filtered.append(i)
-		if expr[i,0].startswith("TC"):
+		if rownames[i,0].startswith("TC"):
 			tc_indx_full.append(i)
 
 	##save output expr
-	np.savetxt(parsed.output_expr_filtered, expr[tc_indx_filtered,:], fmt="%s", delimiter="\t")
-	np.savetxt(parsed.output_expr_full, expr[tc_indx_full,:], fmt="%s", delimiter="\t")
+	expr_store.write_expr(parsed.output_expr_filtered, header, rownames[tc_indx_filtered], expr[tc_indx_filtered,:])
+	expr_store.write_expr(parsed.output_expr_full, header, rownames[tc_indx_full], expr[tc_indx_full,:])
 
 if __name__ == "__main__":
     main(sys.argv)
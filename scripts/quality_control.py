@@ -5,6 +5,7 @@
 import sys
 import argparse
 import numpy as np
+import expr_store
 from random import random
 
 label_dict = {"N_vs_C":{"N":0, "C":1}, "N_vs_P_vs_C":{"N":0, "P":1, "C":2}}
@@ -81,26 +82,26 @@ def annotate_samples(chips, sample_sheet):
 
 
 def filter_data(valid_chips, data):
-	valid_col_idx = [0]
+	[header, rownames, expr] = data
+	valid_col_idx = []
 	valid_row_idx = []
 
-	data_header = [data[0,0]]
-	for i in range(1, len(data[0])):
-		chip_id = data[0,i].split('.')[0]
+	data_header = [header[0]]
+	for i in range(1, len(header)):
+		chip_id = header[i].split('.')[0]
 		for valid_chip in valid_chips:
 			if chip_id == valid_chip.split('.')[0]:
-				valid_col_idx.append(i)
+				valid_col_idx.append(i-1)
 				data_header.append(valid_chip)
 	data_header = np.array(data_header, dtype=str)
 
-	for i in range(1, len(data[:,0])):
-		if data[i,0].startswith('TC'):
+	for i in range(len(rownames)):
+		if rownames[i,0].startswith('TC'):
 			valid_row_idx.append(i)
 
-	new_data = data[valid_row_idx]
+	new_data = expr[valid_row_idx]
 	new_data = new_data[:,valid_col_idx]
-	new_data = np.vstack((data_header, new_data))
-	return new_data
+	return [data_header, rownames[valid_row_idx], new_data]
 
 
 def write_output(fn_valid_chips, fn_data, valid_chips, data, group):
@@ -113,7 +114,7 @@ def write_output(fn_valid_chips, fn_data, valid_chips, data, group):
 		test_flag[i] = 1 if random() > 0.8 else 0
 	# print "# of samples for testing:", np.count_nonzero(test_flag)
 	# np.savetxt(fn_valid_chips, np.hstack((valid_chips, labels, test_flag)), delimiter='\t', fmt='%s')
-	np.savetxt(fn_data, data, delimiter='\t', fmt='%s')
+	expr_store.write_expr(fn_data, data[0], data[1], data[2])
 
 
 def main(argv):
@@ -121,7 +122,7 @@ def main(argv):
 	num_samples = parsed.num_samples
 
 	## load files
-	data = np.loadtxt(parsed.data, dtype=str, delimiter='\t', usecols=range(num_samples+1))
+	data = expr_store.load_expr(parsed.data, 1, num_samples, keep_text=True)
 	qc_table = np.loadtxt(parsed.qc_table, dtype=str, delimiter='\t', skiprows=1)
 	sample_sheet = np.loadtxt(parsed.sample_sheet, dtype=str, delimiter='\t', skiprows=1)
 	valid_chips = get_all_chips(qc_table)
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# Quantized feature matrix. Every feature (TC) of a training set is cut once into at
+# most max_bins (<= 256) bins: at the midpoints between its distinct values if it has
+# few of them, at its quantiles otherwise. A value is stored as its uint8 bin code,
+# the number of bin edges below it, so code <= b is the same as value <= edges[b] and
+# tree splits on the codes are splits on the original values. Tree models (random
+# forest, boosting, decision trees) are trained on the uint8 codes, 4x smaller than the
+# float32 expression, whose split thresholds are shared by every fit on the training
+# set; QuantizedModel keeps the bin edges with the fitted model, so predict() takes the
+# raw features of new samples.
+# example:
+# edges = bin_edges(expr_tr, 256)
+# (codes_tr, codes_te) = (apply_bins(expr_tr, edges), apply_bins(expr_te, edges))
+# clf = QuantizedModel(RandomForestClassifier(n_estimators=1000), edges).fit(expr_tr, label_tr)
+
+import numpy as np
+from sklearn.base import BaseEstimator
+
+MAX_BINS = 256
+
+
+def bin_edges(X, max_bins=MAX_BINS):
+	## features x (max_bins-1) upper bin edges, padded with inf
+	if not 2 <= max_bins <= MAX_BINS:
+		raise ValueError("max_bins must be between 2 and %d, got %d" % (MAX_BINS, max_bins))
+	X = np.asarray(X, dtype=np.float64)
+	edges = np.full((X.shape[1], max_bins-1), np.inf)
+	percentiles = np.linspace(0, 100, max_bins+1)[1:-1]
+	for j in range(X.shape[1]):
+		values = np.unique(X[:,j])
+		if len(values) <= max_bins:
+			e = (values[:-1] + values[1:]) / 2.
+		else:
+			e = np.unique(np.percentile(X[:,j], percentiles))
+		edges[j,:len(e)] = e
+	return edges
+
+
+def apply_bins(X, edges):
+	## samples x features uint8 bin codes
+	X = np.asarray(X, dtype=np.float64)
+	if X.shape[1] != edges.shape[0]:
+		raise ValueError("%d features given, the bins have %d" % (X.shape[1], edges.shape[0]))
+	codes = np.empty(X.shape, dtype=np.uint8)
+	for j in range(X.shape[1]):
+		codes[:,j] = np.searchsorted(edges[j], X[:,j], side='left')
+	return codes
+
+
+class QuantizedModel(BaseEstimator):
+	## a tree model trained on bin codes, with the edges to bin the features it is given
+	def __init__(self, estimator, bin_edges=None, max_bins=MAX_BINS):
+		## bin_edges=None: the edges of the training set given to fit()
+		self.estimator = estimator
+		self.bin_edges = bin_edges
+		self.max_bins = max_bins
+
+	def fit(self, X, y, sample_weight=None):
+		self.bin_edges_ = self.bin_edges if self.bin_edges is not None else bin_edges(X, self.max_bins)
+		if sample_weight is None:
+			self.estimator.fit(apply_bins(X, self.bin_edges_), y)
+		else:
+			self.estimator.fit(apply_bins(X, self.bin_edges_), y, sample_weight=sample_weight)
+		return self
+
+	@classmethod
+	def fitted(cls, estimator, edges):
+		## wrap a model already trained on apply_bins(X, edges)
+		model = cls(estimator, edges)
+		model.bin_edges_ = edges
+		return model
+
+	@property
+	def classes_(self):
+		return self.estimator.classes_
+
+	@property
+	def feature_importances_(self):
+		return self.estimator.feature_importances_
+
+	def predict(self, X):
+		return self.estimator.predict(apply_bins(X, self.bin_edges_))
+
+	def predict_proba(self, X):
+		return self.estimator.predict_proba(apply_bins(X, self.bin_edges_))
+
+	def staged_predict(self, X):
+		return self.estimator.staged_predict(apply_bins(X, self.bin_edges_))
+
+	def score(self, X, y):
+		return self.estimator.score(apply_bins(X, self.bin_edges_), y)
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# Rank aggregation of many (possibly partial) ranked gene lists. The lists are put in
+# one genes x lists rank matrix (0-based ranks, NaN where a list does not have the
+# gene), scored all at once, and only the top k genes are selected (argpartition) and
+# sorted. Scores, lower is better:
+#   sum:  sum of the ranks, a missing gene ranked just after the end of the list
+#   mean: mean of the ranks normalized by the list lengths, missing = 1
+#   rra:  robust rank aggregation (Kolde et al. 2012): the smallest order-statistic
+#         p-value of the normalized ranks, Bonferroni-corrected over the lists
+# example:
+# (genes, ranks, lengths) = rank_matrix([list_1, list_2, ...])
+# top = top_k(aggregate(ranks, lengths, 'rra'), 400)
+
+import numpy as np
+from scipy.special import betainc
+
+methods = ['sum', 'mean', 'rra']
+
+
+def read_ranked_list(filename, skiprows=1):
+	## gene IDs (first column) of a ranked table, in order
+	with open(filename) as f:
+		lines = f.readlines()[skiprows:]
+	return np.array([x.split('\t', 1)[0].rstrip('\r\n') for x in lines if x.strip() != ''], dtype=str)
+
+
+def rank_matrix(lists):
+	## (gene IDs, genes x lists 0-based ranks with NaN for missing genes, list lengths)
+	lengths = np.array([len(x) for x in lists])
+	(genes, inverse) = np.unique(np.concatenate(lists), return_inverse=True)
+	ranks = np.full((len(genes), len(lists)), np.nan)
+	start = 0
+	for (j, n) in enumerate(lengths):
+		## reversed, so a gene listed twice keeps its first (best) rank
+		rows = inverse[start:start+n][::-1]
+		ranks[rows, j] = np.arange(n)[::-1]
+		start += n
+	return (genes, ranks, lengths)
+
+
+def normalized_ranks(ranks, lengths):
+	## ranks in (0, 1]: (rank+1)/length, missing = 1
+	r = (ranks + 1) / lengths.astype(np.float64)
+	r[np.isnan(r)] = 1.
+	return r
+
+
+def rra_scores(r):
+	## rho = min_k P(k-th smallest of n uniforms <= r_(k)), times n
+	n = r.shape[1]
+	k = np.arange(1, n+1, dtype=np.float64)
+	p = betainc(k, n - k + 1, np.sort(r, axis=1))
+	return np.minimum(np.min(p, axis=1) * n, 1.)
+
+
+def aggregate(ranks, lengths, method='sum'):
+	if method == 'sum':
+		return np.sum(np.where(np.isnan(ranks), lengths, ranks), axis=1)
+	elif method == 'mean':
+		return np.mean(normalized_ranks(ranks, lengths), axis=1)
+	elif method == 'rra':
+		return rra_scores(normalized_ranks(ranks, lengths))
+	raise ValueError("unknown rank aggregation method %s, options: %s" % (method, methods))
+
+
+def top_k(scores, k):
+	## indices of the k lowest scores in order (ties by index), without sorting all of them
+	if k == None or k >= len(scores):
+		return np.argsort(scores, kind='mergesort')
+	indx = np.sort(np.argpartition(scores, k-1)[:k])
+	return indx[np.argsort(scores[indx], kind='mergesort')]
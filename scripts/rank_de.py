@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# Rank-based (Mann-Whitney U) DE for all genes at once: the samples of every gene are
+# ranked with one sort over a block of genes (average ranks for ties), and U, the tie
+# correction and the normal-approximation p-value follow as array operations, as
+# scipy.stats.mannwhitneyu computes them one gene at a time. Contrasts over the same
+# samples share the ranking. BH-adjusted p-values are added to every table.
+# example:
+# python rank_de.py -i ../data/run_proj_batch1-17_1/training/chipdata.txt -v ../data/run_proj_batch1-17_1/training/valid_chips.txt -g N_vs_P_vs_C -o ../data/run_proj_batch1-17_1/training/top_de_genes.utest.txt
+
+import sys
+import argparse
+import numpy as np
+from scipy.stats import norm
+import expr_store
+import limma
+from indexed_axis import IndexedAxis
+
+## (name, control labels, case labels) of the valid chip labels
+group_contrasts = {'N_vs_C': [('CvsN', ['0'], ['1'])],
+					'N_vs_P_vs_C': [('CvsN', ['0'], ['2']), ('PvsN', ['0'], ['1']), ('CvsP', ['1'], ['2']), ('PCvsN', ['0'], ['1', '2'])]}
+alternatives = ['two-sided', 'less', 'greater']
+TABLE_COLUMNS = ['logFC', 'U', 'P.Value', 'adj.P.Val']
+CHUNK_SIZE = 8192
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Mann-Whitney U test of every gene between sample groups.')
+	parser.add_argument('-i', '--input_expr', dest='input_expr')
+	parser.add_argument('-v', '--valid_chips', dest='valid_chips')
+	parser.add_argument('-g', '--group', dest='group', default='N_vs_P_vs_C', help='options: %s' % sorted(group_contrasts.keys()))
+	parser.add_argument('-a', '--alternative', dest='alternative', default='two-sided', help='options: %s' % alternatives)
+	parser.add_argument('-o', '--output', dest='output', help='one table per contrast: <output>.<contrast>.txt')
+	parsed = parser.parse_args(argv[1:])
+	if parsed.group not in group_contrasts:
+		sys.exit("Error: unknown group %s, options: %s" % (parsed.group, sorted(group_contrasts.keys())))
+	if parsed.alternative not in alternatives:
+		sys.exit("Error: unknown alternative %s, options: %s" % (parsed.alternative, alternatives))
+	return parsed
+
+
+def rank_rows(x):
+	## average ranks (rankdata per row) and the tie term sum(t^3 - t) of every row
+	(num_rows, n) = x.shape
+	order = np.argsort(x, axis=1, kind='mergesort')
+	sorted_x = x[np.arange(num_rows)[:,np.newaxis], order]
+	new_value = np.ones((num_rows, n), dtype=bool)
+	new_value[:,1:] = sorted_x[:,1:] != sorted_x[:,:-1]
+	## tie groups numbered across all rows, so one bincount gives every group size
+	group = np.cumsum(new_value.ravel()) - 1
+	counts = np.bincount(group).astype(np.float64)
+	ends = np.cumsum(counts)
+	offset = (np.arange(num_rows) * n).repeat(n)
+	ranks = np.empty((num_rows, n))
+	ranks[np.arange(num_rows)[:,np.newaxis], order] = (ends[group] - (counts[group] - 1) / 2. - offset).reshape(num_rows, n)
+	group_row = np.repeat(np.arange(num_rows), n)[new_value.ravel()]
+	ties = np.bincount(group_row, weights=counts**3 - counts, minlength=num_rows)
+	return (ranks, ties)
+
+
+def u_test(ranks, ties, n1, n2, use_continuity=True, alternative=None):
+	## U statistics and p-values from the ranks of the first n1 (control) and next n2 columns,
+	## as scipy.stats.mannwhitneyu (alternative=None is its deprecated one-sided default)
+	n = n1 + n2
+	u1 = n1*n2 + n1*(n1+1)/2. - np.sum(ranks[:,:n1], axis=1)
+	u2 = n1*n2 - u1
+	T = 1 - ties / float(n**3 - n)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		sd = np.sqrt(T * n1 * n2 * (n+1) / 12.)
+		meanrank = n1*n2/2. + 0.5 * use_continuity
+		if alternative in [None, 'two-sided']:
+			bigu = np.maximum(u1, u2)
+		elif alternative == 'less':
+			bigu = u1
+		else:
+			bigu = u2
+		z = (bigu - meanrank) / sd
+	if alternative == None:
+		p = norm.sf(np.abs(z))
+	elif alternative == 'two-sided':
+		p = 2 * norm.sf(np.abs(z))
+	else:
+		p = norm.sf(z)
+	## all values identical: mannwhitneyu raises, here the gene gets p = 1
+	p[T == 0] = 1.
+	u = np.minimum(u1, u2) if alternative == None else u2
+	return (u, p)
+
+
+def mann_whitney(expr, contrasts, use_continuity=True, alternative=None, chunk_size=CHUNK_SIZE):
+	## {name: (U, p)} of every (name, control indices, case indices) contrast, over blocks of genes
+	num_genes = expr.shape[0]
+	results = dict((c[0], (np.zeros(num_genes), np.zeros(num_genes))) for c in contrasts)
+	## contrasts over the same samples are answered from one ranking
+	shared = {}
+	for (name, control, case) in contrasts:
+		key = tuple(sorted(np.concatenate((control, case))))
+		shared.setdefault(key, []).append((name, np.asarray(control), np.asarray(case)))
+	for start in range(0, num_genes, chunk_size):
+		block = np.asarray(expr[start:start+chunk_size], dtype=np.float64)
+		for (key, members) in shared.items():
+			samples = np.array(key, dtype=int)
+			(ranks, ties) = rank_rows(block[:,samples])
+			column = dict((s, j) for j, s in enumerate(key))
+			for (name, control, case) in members:
+				indx = [column[s] for s in np.concatenate((control, case))]
+				(u, p) = u_test(ranks[:,indx], ties, len(control), len(case), use_continuity, alternative)
+				results[name][0][start:start+chunk_size] = u
+				results[name][1][start:start+chunk_size] = p
+	return results
+
+
+def u_test_tables(expr, contrasts, log_scale=True, alternative=None):
+	## {name: (gene order by P, genes x TABLE_COLUMNS)}; logFC is the mean difference of
+	## log-scale data, or log2 of the mean ratio of linear data (NanoString counts)
+	results = mann_whitney(expr, contrasts, alternative=alternative)
+	tables = {}
+	for (name, control, case) in contrasts:
+		mean_control = np.mean(np.take(expr, control, axis=1), axis=1, dtype=np.float64)
+		mean_case = np.mean(np.take(expr, case, axis=1), axis=1, dtype=np.float64)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			logfc = mean_case - mean_control if log_scale else np.log2(mean_case / mean_control)
+		(u, p) = results[name]
+		tables[name] = (np.argsort(p, kind='mergesort'), np.column_stack((logfc, u, p, limma.p_adjust_bh(p))))
+	return tables
+
+
+def write_table(filename, gene_ids, indx, table):
+	with open(filename, 'w') as f:
+		f.write('\t'.join(TABLE_COLUMNS) + '\n')
+		for i in indx:
+			f.write(gene_ids[i] + '\t' + '\t'.join('%.15g' % x for x in table[i]) + '\n')
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	[header, rows, expr] = expr_store.load_expr(parsed.input_expr)
+	valid_chips = np.loadtxt(parsed.valid_chips, dtype=str, delimiter='\t', ndmin=2)
+	indx = IndexedAxis(header[1:], 'samples').positions(valid_chips[:,0])
+	labels = valid_chips[:,1]
+	contrasts = [(name, indx[np.in1d(labels, control)], indx[np.in1d(labels, case)])
+		for (name, control, case) in group_contrasts[parsed.group]]
+	tables = u_test_tables(expr, contrasts, log_scale=True, alternative=parsed.alternative)
+	for (name, control, case) in contrasts:
+		(order, table) = tables[name]
+		write_table(limma.contrast_filename(parsed.output, name), rows[:,0], order, table)
+		print "   contrast", name, ":", len(control), "vs", len(case), "samples"
+
+
+if __name__ == "__main__":
+    main(sys.argv)
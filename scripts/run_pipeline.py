@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# Pipeline runner: the steps of run_pipeline_*.sh declared as a DAG of stages
+# (prepare/QC, split, DE, convert, train, predict) with explicit inputs and outputs.
+# Independent branches (the DE calls, every NUM_TOP_GENES x ML_MODELS combination)
+# run concurrently on -j workers, unchanged stages are reused from the stage cache,
+# and a per-stage wall-clock/memory report is written to <data dir>/pipeline_report.txt.
+# example:
+# python run_pipeline.py -d ../data/run_proj_batch1-17_1 -g N_vs_P_vs_C -n chipdata_rma.expression_console.good_rin.TXT -l ../external_data/Genecards_colon_cancer/GeneCards_Nanostring_CIViC_genes_annotated.txt -p patient_info_sheet.txt -v valid_chips.txt --de_mode p_vs_n+c_vs_n -t 400 -m random_forest svm neural_net grad_boosting adaboost gauss_process -j 8
+
+import sys
+import os
+import argparse
+from pipeline_dag import Pipeline
+from limma import contrast_filename
+
+DIR_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+de_modes = ['group', 'p_vs_n+c_vs_n']
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Run the training/testing pipeline as a DAG of parallel stages.')
+	parser.add_argument('-d', '--data_directory', dest='data_directory')
+	parser.add_argument('-g', '--group', dest='group', default='N_vs_P_vs_C')
+	parser.add_argument('-n', '--normalized_chipdata', dest='normalized_chipdata', help='relative to the data directory')
+	parser.add_argument('-l', '--gene_filter_list', dest='gene_filter_list', help='relative to the data directory')
+	parser.add_argument('-c', '--column_number', dest='column_number', type=int, default=2)
+	parser.add_argument('-p', '--patient_sheet', dest='patient_sheet', default=None, help='relative to the data directory')
+	parser.add_argument('-v', '--valid_chips', dest='valid_chips', default='valid_chips.txt', help='relative to the data directory (written by QC when -q is given)')
+	parser.add_argument('-q', '--qc_table', dest='qc_table', default=None, help='run quality control (relative to the data directory)')
+	parser.add_argument('-s', '--sample_sheet', dest='sample_sheet', default=None)
+	parser.add_argument('--num_samples', dest='num_samples', type=int, default=None)
+	parser.add_argument('--qc_threshold', dest='qc_threshold', type=float, default=0.7)
+	parser.add_argument('--de_mode', dest='de_mode', default='group', choices=de_modes)
+	parser.add_argument('--pval', dest='pval', default='1')
+	parser.add_argument('--fc', dest='fc', default='0')
+	parser.add_argument('-t', '--num_top_genes', dest='num_top_genes', type=int, nargs='+', default=[200])
+	parser.add_argument('-m', '--ml_models', dest='ml_models', nargs='+', default=['svm'])
+	parser.add_argument('-j', '--workers', dest='workers', type=int, default=1)
+	parser.add_argument('--no_cache', dest='no_cache', action='store_true', default=False)
+	parsed = parser.parse_args(argv[1:])
+	return parsed
+
+
+def script(name):
+	return [sys.executable, os.path.join(DIR_SCRIPTS, name)]
+
+
+def add_prepare_stages(pipeline, parsed, d):
+	tr = os.path.join(d, 'training')
+	te = os.path.join(d, 'testing')
+	raw = os.path.join(d, parsed.normalized_chipdata)
+	gene_filter = os.path.join(d, parsed.gene_filter_list)
+	valid_chips = os.path.join(d, parsed.valid_chips)
+	outputs = [os.path.join(tr, 'chipdata.txt'), os.path.join(tr, 'chipdata_full.txt'), os.path.join(tr, 'valid_chips.txt'),
+		os.path.join(te, 'chipdata.txt'), os.path.join(te, 'chipdata_full.txt'), os.path.join(te, 'valid_chips.txt')]
+
+	if parsed.qc_table == None:
+		pipeline.add('prepare_split', script('prepare_and_split_expr_data.py') +
+			['-i', raw, '-l', gene_filter, '-c', parsed.column_number, '-v', valid_chips, '-o', d],
+			inputs=[raw, gene_filter, valid_chips], outputs=outputs)
+		return
+
+	## run_pipeline.sh flow: filter gene set, QC on filtered and full data, then split both
+	filtered = os.path.join(d, 'chipdata_geneset.txt')
+	pipeline.add('filter_gene_set', script('filter_gene_set.py') +
+		['-s', '-i', raw, '-l', gene_filter, '-c', parsed.column_number, '-o', filtered],
+		inputs=[raw, gene_filter], outputs=[filtered])
+	qc_table = os.path.join(d, parsed.qc_table)
+	sample_sheet = os.path.join(d, parsed.sample_sheet)
+	## QC writes the valid chip list; the full data QC only filters the matrix (-v foo in run_pipeline.sh)
+	for (name, data, valid_data, valid_list) in [('qc', filtered, 'chipdata_geneset_x_valid_chips.txt', valid_chips),
+		('qc_full', raw, 'chipdata_geneset_x_valid_chips_full.txt', os.path.join(d, 'valid_chips.qc_full.txt'))]:
+		pipeline.add(name, script('quality_control.py') +
+			['-n', parsed.num_samples, '-g', parsed.group, '-d', data, '-q', qc_table, '-s', sample_sheet,
+			'-t', parsed.qc_threshold, '-v', valid_list, '-o', os.path.join(d, valid_data)],
+			inputs=[data, qc_table, sample_sheet], outputs=[os.path.join(d, valid_data), valid_list])
+	pipeline.add('split', script('split_expr_train_vs_test.py') +
+		['-v', valid_chips, '-i', os.path.join(d, 'chipdata_geneset_x_valid_chips.txt'),
+		'-tr0', outputs[0], '-tr1', outputs[2], '-te0', outputs[3], '-te1', outputs[5]],
+		inputs=[valid_chips, os.path.join(d, 'chipdata_geneset_x_valid_chips.txt')],
+		outputs=[outputs[0], outputs[2], outputs[3], outputs[5]])
+	pipeline.add('split_full', script('split_expr_train_vs_test.py') +
+		['-v', valid_chips, '-i', os.path.join(d, 'chipdata_geneset_x_valid_chips_full.txt'),
+		'-tr0', outputs[1], '-te0', outputs[4]],
+		inputs=[valid_chips, os.path.join(d, 'chipdata_geneset_x_valid_chips_full.txt')],
+		outputs=[outputs[1], outputs[4]])
+
+
+def add_de_stages(pipeline, parsed, d):
+	## returns a function giving the stage command and outputs that write the top n DE genes
+	tr = os.path.join(d, 'training')
+	chipdata = os.path.join(tr, 'chipdata.txt')
+	if parsed.de_mode == 'group':
+		de_genes = os.path.join(tr, 'top_de_genes.all.txt')
+		valid_chips = os.path.join(tr, 'valid_chips.txt')
+		pipeline.add('de', ['Rscript', os.path.join(DIR_SCRIPTS, 'de_analysis.r'),
+			chipdata, valid_chips, parsed.group, parsed.pval, parsed.fc, de_genes],
+			inputs=[chipdata, valid_chips], outputs=[de_genes])
+		return (lambda n, out: (['sh', '-c', 'head -%d %s > %s' % (n+1, de_genes, out)], [out]), [de_genes])
+
+	## one three-group fit gives the PvsN and CvsN tables; each top gene count merges them
+	chipdata_inputs = [chipdata, os.path.join(tr, 'valid_chips.txt')]
+	de_command = script('limma.py') + ['-i', chipdata, '-v', os.path.join(tr, 'valid_chips.txt'), '-g', 'N_vs_P_vs_C',
+		'-p', parsed.pval, '-f', parsed.fc, '-c', 'PvsN', 'CvsN', '-m']
+	return (lambda n, out: (de_command + ['-t', n, '-o', out], [out] + [contrast_filename(out, x) for x in ['PvsN', 'CvsN']]),
+		chipdata_inputs)
+
+
+def build_pipeline(parsed):
+	d = os.path.abspath(parsed.data_directory)
+	tr = os.path.join(d, 'training')
+	te = os.path.join(d, 'testing')
+	pipeline = Pipeline(log_directory=os.path.join(d, 'logs'),
+		cache_directory=None if parsed.no_cache else os.path.join(d, '.stage_cache'))
+
+	add_prepare_stages(pipeline, parsed, d)
+	(select_top_genes, de_genes) = add_de_stages(pipeline, parsed, d)
+
+	for (name, dir_set, set_name) in [('train', tr, 'training'), ('test', te, 'testing')]:
+		pipeline.add('convert_full_' + name, script('convert_expr_for_ml.py') +
+			['-i', os.path.join(dir_set, 'chipdata_full.txt'), '-o', os.path.join(dir_set, set_name + '_set_full.txt')],
+			inputs=[os.path.join(dir_set, 'chipdata_full.txt')], outputs=[os.path.join(dir_set, set_name + '_set_full.txt')])
+
+	for n in parsed.num_top_genes:
+		## every top gene count gets its own directories, so the sweep can run in parallel
+		tr_n = os.path.join(tr, 'top_%d' % n)
+		te_n = os.path.join(te, 'top_%d' % n)
+		top_genes = os.path.join(tr_n, 'top_de_genes.txt')
+		(command, outputs) = select_top_genes(n, top_genes)
+		pipeline.add('top_genes_%d' % n, command, inputs=de_genes, outputs=outputs)
+
+		sets = {}
+		for (name, dir_set, dir_n, set_name) in [('train', tr, tr_n, 'training'), ('test', te, te_n, 'testing')]:
+			expr_set = os.path.join(dir_n, set_name + '_set.expr.txt')
+			out_set = os.path.join(dir_n, set_name + '_set.txt')
+			pipeline.add('convert_%s_%d' % (name, n), script('convert_expr_for_ml.py') +
+				['-t', top_genes, '-i', os.path.join(dir_set, 'chipdata.txt'), '-o', expr_set if parsed.patient_sheet != None else out_set],
+				inputs=[top_genes, os.path.join(dir_set, 'chipdata.txt')], outputs=[expr_set if parsed.patient_sheet != None else out_set])
+			if parsed.patient_sheet != None:
+				patient_sheet = os.path.join(d, parsed.patient_sheet)
+				pipeline.add('patient_info_%s_%d' % (name, n), script('incorporate_patient_info.py') +
+					['-p', patient_sheet, '-d', expr_set, '-o', out_set],
+					inputs=[patient_sheet, expr_set], outputs=[out_set])
+			sets[name] = out_set
+
+		for m in parsed.ml_models:
+			model = os.path.join(tr_n, m, m + '_model.pkl')
+			pipeline.add('train_%s_%d' % (m, n), script('crc_training.py') +
+				['-i', sets['train'], '-f', os.path.join(tr, 'training_set_full.txt'), '-a', m, '-o', os.path.join(tr_n, m)],
+				inputs=[sets['train'], os.path.join(tr, 'training_set_full.txt')], outputs=[model])
+			pipeline.add('predict_%s_%d' % (m, n), script('crc_prediction.py') +
+				['-i', sets['test'], '-f', os.path.join(te, 'testing_set_full.txt'), '-a', m, '-m', model],
+				inputs=[sets['test'], os.path.join(te, 'testing_set_full.txt'), model])
+	return pipeline
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	pipeline = build_pipeline(parsed)
+	print "Stages:", len(pipeline.stages), ", workers:", parsed.workers
+	succeeded = pipeline.run(parsed.workers)
+
+	report_file = os.path.join(parsed.data_directory, 'pipeline_report.txt')
+	print ""
+	print "\n".join(pipeline.report(report_file))
+	print "Per-stage logs in", os.path.join(parsed.data_directory, 'logs')
+	if not succeeded:
+		sys.exit("Error: some stages failed or were skipped.")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -37,6 +37,8 @@ CRC_PREDICTORS=${DIR_DATA}/../external_data/CIViC/civic_selected_genes_TCs.txt
 
 ##### END OF INPUT VARIABLES #####
 
+STAGE_CACHE="python ${DIR_SCRIPTS}/stage_cache.py -d ${DIR_DATA}/.stage_cache"
+
 echo "Num of total samples:" $NUM_SAMPLES
 echo "Label groups:" $GROUP
 echo "DE p-value treshold:" $THLD_PVAL
@@ -47,7 +49,7 @@ echo "Sample sheet:" $SAMPLE_SHEET
 echo ""
 
 echo "Filtering gene set ... "
-python ${DIR_SCRIPTS}/filter_gene_set.py -i $NORMALIZED_CHIPDATA_FULL -l $GENE_FILTER_LST -c 2 -o $NORMALIZED_CHIPDATA
+python ${DIR_SCRIPTS}/filter_gene_set.py -s -i $NORMALIZED_CHIPDATA_FULL -l $GENE_FILTER_LST -c 2 -o $NORMALIZED_CHIPDATA
 # NORMALIZED_CHIPDATA=$NORMALIZED_CHIPDATA_FULL
 
 echo "Running quality control ... "
@@ -74,13 +76,13 @@ for ML_MODEL in "${ML_MODELS[@]}"; do
 	echo "###" $ML_MODEL "###"
 	
 	echo "Preparing training/testing datasets ... "
-	python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/training/chipdata.txt -o ${DIR_DATA}/training/training_set.txt
-	python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/testing/chipdata.txt -o ${DIR_DATA}/testing/testing_set.txt
-	python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/training/training_set.txt
-	python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/testing/testing_set.txt 
+	$STAGE_CACHE -o ${DIR_DATA}/training/training_set.expr.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/training/chipdata.txt -o ${DIR_DATA}/training/training_set.expr.txt
+	$STAGE_CACHE -o ${DIR_DATA}/testing/testing_set.expr.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/testing/chipdata.txt -o ${DIR_DATA}/testing/testing_set.expr.txt
+	$STAGE_CACHE -o ${DIR_DATA}/training/training_set.txt -- python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/training/training_set.expr.txt -o ${DIR_DATA}/training/training_set.txt
+	$STAGE_CACHE -o ${DIR_DATA}/testing/testing_set.txt -- python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/testing/testing_set.expr.txt -o ${DIR_DATA}/testing/testing_set.txt
 
-	python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/training/chipdata_full.txt -o ${DIR_DATA}/training/training_set_full.txt
-	python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/testing/chipdata_full.txt -o ${DIR_DATA}/testing/testing_set_full.txt
+	$STAGE_CACHE -o ${DIR_DATA}/training/training_set_full.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/training/chipdata_full.txt -o ${DIR_DATA}/training/training_set_full.txt
+	$STAGE_CACHE -o ${DIR_DATA}/testing/testing_set_full.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/testing/chipdata_full.txt -o ${DIR_DATA}/testing/testing_set_full.txt
 
 	echo "Training models ... "
 	rm -rf $ML_MODEL
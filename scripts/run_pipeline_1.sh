@@ -20,23 +20,28 @@ CV_FOLDS=10
 
 ##### END OF INPUT VARIABLES #####
 
+STAGE_CACHE="python ${DIR_SCRIPTS}/stage_cache.py -d ${DIR_DATA}/.stage_cache"
+
 echo "Working directory:" $DIR_DATA
 echo "Label groups:" $GROUP
 # echo "Normalized expr data:" $NORMALIZED_CHIPDATA_FULL
 echo ""
 
 
-echo "Preparing normalized data ..."
-python ${DIR_SCRIPTS}/prepare_normalized_expr_data.py -i $NORMALIZED_CHIPDATA_FULL -l $GENE_FILTER_LST -c 2 -o1 ${DIR_DATA}/chipdata_geneset_x_valid_chips.txt -o2 ${DIR_DATA}/chipdata_geneset_x_valid_chips_full.txt
+echo "Preparing normalized data and splitting training/testing sets ..."
+python ${DIR_SCRIPTS}/prepare_and_split_expr_data.py -i $NORMALIZED_CHIPDATA_FULL -l $GENE_FILTER_LST -c 2 -v $VALID_CHIPS -o ${DIR_DATA}
+
+# echo "Preparing normalized data ..."
+# python ${DIR_SCRIPTS}/prepare_normalized_expr_data.py -s -i $NORMALIZED_CHIPDATA_FULL -l $GENE_FILTER_LST -c 2 -o1 ${DIR_DATA}/chipdata_geneset_x_valid_chips.txt -o2 ${DIR_DATA}/chipdata_geneset_x_valid_chips_full.txt
 # ##### Use full list of probesets
 # cp ${DIR_DATA}/chipdata_geneset_x_valid_chips_full.txt ${DIR_DATA}/chipdata_geneset_x_valid_chips.txt
 # #####
 
-echo "Splitting training/testing sets ... "
-mkdir -p ${DIR_DATA}/training
-mkdir -p ${DIR_DATA}/testing
-python ${DIR_SCRIPTS}/split_expr_train_vs_test.py -v $VALID_CHIPS -i ${DIR_DATA}/chipdata_geneset_x_valid_chips.txt -tr0 ${DIR_DATA}/training/chipdata.txt -tr1 ${DIR_DATA}/training/valid_chips.txt -te0 ${DIR_DATA}/testing/chipdata.txt -te1 ${DIR_DATA}/testing/valid_chips.txt
-python ${DIR_SCRIPTS}/split_expr_train_vs_test.py -v $VALID_CHIPS -i ${DIR_DATA}/chipdata_geneset_x_valid_chips_full.txt -tr0 ${DIR_DATA}/training/chipdata_full.txt -te0 ${DIR_DATA}/testing/chipdata_full.txt
+# echo "Splitting training/testing sets ... "
+# mkdir -p ${DIR_DATA}/training
+# mkdir -p ${DIR_DATA}/testing
+# python ${DIR_SCRIPTS}/split_expr_train_vs_test.py -v $VALID_CHIPS -i ${DIR_DATA}/chipdata_geneset_x_valid_chips.txt -tr0 ${DIR_DATA}/training/chipdata.txt -tr1 ${DIR_DATA}/training/valid_chips.txt -te0 ${DIR_DATA}/testing/chipdata.txt -te1 ${DIR_DATA}/testing/valid_chips.txt
+# python ${DIR_SCRIPTS}/split_expr_train_vs_test.py -v $VALID_CHIPS -i ${DIR_DATA}/chipdata_geneset_x_valid_chips_full.txt -tr0 ${DIR_DATA}/training/chipdata_full.txt -te0 ${DIR_DATA}/testing/chipdata_full.txt
 
 
 
@@ -52,11 +57,12 @@ python ${DIR_SCRIPTS}/split_expr_train_vs_test.py -v $VALID_CHIPS -i ${DIR_DATA}
 # 	echo "    cv fold "$i
 # 	Rscript ${DIR_SCRIPTS}/de_analysis.r ${DIR_DATA}/training/cv_folds/chipdata_random_${i}.txt ${DIR_DATA}/training/cv_folds/valid_chips_random_${i}.txt $GROUP 1 0 ${DIR_DATA}/training/cv_folds/top_de_genes_${i}.txt
 # done
+# python ${DIR_SCRIPTS}/split_cv_folds.py --de -i ${DIR_DATA}/training/chipdata.txt -v ${DIR_DATA}/training/valid_chips.txt -f $CV_FOLDS -g $GROUP -o ${DIR_DATA}/training/cv_folds
 
 
-echo "Analyzing PvsN, CvsN DE genes ... "
-Rscript ${DIR_SCRIPTS}/de_analysis.r ${DIR_DATA}/training/chipdata.txt ${DIR_DATA}/training/valid_chips.p_vs_n.txt N_vs_C 1 0 ${DIR_DATA}/training/top_de_genes.p_vs_n.txt
-Rscript ${DIR_SCRIPTS}/de_analysis.r ${DIR_DATA}/training/chipdata.txt ${DIR_DATA}/training/valid_chips.c_vs_n.txt N_vs_C 1 0 ${DIR_DATA}/training/top_de_genes.c_vs_n.txt
+# echo "Analyzing PvsN, CvsN DE genes ... "
+# Rscript ${DIR_SCRIPTS}/de_analysis.r ${DIR_DATA}/training/chipdata.txt ${DIR_DATA}/training/valid_chips.p_vs_n.txt N_vs_C 1 0 ${DIR_DATA}/training/top_de_genes.p_vs_n.txt
+# Rscript ${DIR_SCRIPTS}/de_analysis.r ${DIR_DATA}/training/chipdata.txt ${DIR_DATA}/training/valid_chips.c_vs_n.txt N_vs_C 1 0 ${DIR_DATA}/training/top_de_genes.c_vs_n.txt
 
 
 NUM_TOP_GENES_LIST=( 400 )
@@ -67,8 +73,10 @@ for NUM_TOP_GENES in "${NUM_TOP_GENES_LIST[@]}"; do
 	echo ""
 	# python ${DIR_SCRIPTS}/summarize_cv_de_genes.py -i ${DIR_DATA}/training/cv_folds -f $CV_FOLDS -t $NUM_TOP_GENES -o ${DIR_DATA}/training/top_de_genes.txt
 
-	head -$((NUM_TOP_GENES/2+1)) ${DIR_DATA}/training/top_de_genes.p_vs_n.txt > ${DIR_DATA}/training/top_de_genes.txt
-	head -$((NUM_TOP_GENES/2+1)) ${DIR_DATA}/training/top_de_genes.c_vs_n.txt | tail -$((NUM_TOP_GENES/2)) >> ${DIR_DATA}/training/top_de_genes.txt
+	# head -$((NUM_TOP_GENES/2+1)) ${DIR_DATA}/training/top_de_genes.p_vs_n.txt > ${DIR_DATA}/training/top_de_genes.txt
+	# head -$((NUM_TOP_GENES/2+1)) ${DIR_DATA}/training/top_de_genes.c_vs_n.txt | tail -$((NUM_TOP_GENES/2)) >> ${DIR_DATA}/training/top_de_genes.txt
+	echo "Analyzing PvsN, CvsN DE genes ... "
+	python ${DIR_SCRIPTS}/limma.py -i ${DIR_DATA}/training/chipdata.txt -v ${DIR_DATA}/training/valid_chips.txt -g N_vs_P_vs_C -p 1 -f 0 -c PvsN CvsN -m -t $NUM_TOP_GENES -o ${DIR_DATA}/training/top_de_genes.txt
 
 	ML_MODELS=(random_forest svm neural_net grad_boosting adaboost gauss_process)
 	# ML_MODELS=( svm )
@@ -76,13 +84,13 @@ for NUM_TOP_GENES in "${NUM_TOP_GENES_LIST[@]}"; do
 		echo "###" $ML_MODEL "###"
 		
 		echo "Preparing training/testing datasets ... "
-		python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/training/chipdata.txt -o ${DIR_DATA}/training/training_set.txt
-		python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/testing/chipdata.txt -o ${DIR_DATA}/testing/testing_set.txt
-		python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/training/training_set.txt
-		python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/testing/testing_set.txt 
+		$STAGE_CACHE -o ${DIR_DATA}/training/training_set.expr.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/training/chipdata.txt -o ${DIR_DATA}/training/training_set.expr.txt
+		$STAGE_CACHE -o ${DIR_DATA}/testing/testing_set.expr.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/testing/chipdata.txt -o ${DIR_DATA}/testing/testing_set.expr.txt
+		$STAGE_CACHE -o ${DIR_DATA}/training/training_set.txt -- python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/training/training_set.expr.txt -o ${DIR_DATA}/training/training_set.txt
+		$STAGE_CACHE -o ${DIR_DATA}/testing/testing_set.txt -- python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/testing/testing_set.expr.txt -o ${DIR_DATA}/testing/testing_set.txt
 
-		python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/training/chipdata_full.txt -o ${DIR_DATA}/training/training_set_full.txt
-		python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/testing/chipdata_full.txt -o ${DIR_DATA}/testing/testing_set_full.txt
+		$STAGE_CACHE -o ${DIR_DATA}/training/training_set_full.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/training/chipdata_full.txt -o ${DIR_DATA}/training/training_set_full.txt
+		$STAGE_CACHE -o ${DIR_DATA}/testing/testing_set_full.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/testing/chipdata_full.txt -o ${DIR_DATA}/testing/testing_set_full.txt
 
 		echo "Training models ... "
 		rm -rf $ML_MODEL
@@ -21,6 +21,8 @@ CV_FOLDS=10
 
 ##### END OF INPUT VARIABLES #####
 
+STAGE_CACHE="python ${DIR_SCRIPTS}/stage_cache.py -d ${DIR_DATA}/.stage_cache"
+
 echo "Working directory:" $DIR_DATA
 echo "Label groups:" $GROUP
 # echo "Normalized expr data:" $NORMALIZED_CHIPDATA_FULL
@@ -28,7 +30,7 @@ echo ""
 
 
 echo "Preparing normalized data ..."
-# python ${DIR_SCRIPTS}/prepare_normalized_expr_data.py -i $NORMALIZED_CHIPDATA_FULL -l $GENE_FILTER_LST -c 2 -o1 ${DIR_DATA}/chipdata_geneset_x_valid_chips.txt -o2 ${DIR_DATA}/chipdata_geneset_x_valid_chips_full.txt
+# python ${DIR_SCRIPTS}/prepare_normalized_expr_data.py -s -i $NORMALIZED_CHIPDATA_FULL -l $GENE_FILTER_LST -c 2 -o1 ${DIR_DATA}/chipdata_geneset_x_valid_chips.txt -o2 ${DIR_DATA}/chipdata_geneset_x_valid_chips_full.txt
 
 
 
@@ -93,13 +95,13 @@ for NUM_TOP_GENES in "${NUM_TOP_GENES_LIST[@]}"; do
 		echo "###" $ML_MODEL "###"
 		
 		echo "Preparing training/testing datasets ... "
-		# python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/training/chipdata.txt -o ${DIR_DATA}/training/training_set.txt
-		# python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/testing/chipdata.txt -o ${DIR_DATA}/testing/testing_set.txt
-		# python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/training/training_set.txt
-		# python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/testing/testing_set.txt 
+		# $STAGE_CACHE -o ${DIR_DATA}/training/training_set.expr.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/training/chipdata.txt -o ${DIR_DATA}/training/training_set.expr.txt
+		# $STAGE_CACHE -o ${DIR_DATA}/testing/testing_set.expr.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/testing/chipdata.txt -o ${DIR_DATA}/testing/testing_set.expr.txt
+		# $STAGE_CACHE -o ${DIR_DATA}/training/training_set.txt -- python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/training/training_set.expr.txt -o ${DIR_DATA}/training/training_set.txt
+		# $STAGE_CACHE -o ${DIR_DATA}/testing/testing_set.txt -- python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/testing/testing_set.expr.txt -o ${DIR_DATA}/testing/testing_set.txt
 
-		# python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/training/chipdata_full.txt -o ${DIR_DATA}/training/training_set_full.txt
-		# python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/testing/chipdata_full.txt -o ${DIR_DATA}/testing/testing_set_full.txt
+		# $STAGE_CACHE -o ${DIR_DATA}/training/training_set_full.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/training/chipdata_full.txt -o ${DIR_DATA}/training/training_set_full.txt
+		# $STAGE_CACHE -o ${DIR_DATA}/testing/testing_set_full.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/testing/chipdata_full.txt -o ${DIR_DATA}/testing/testing_set_full.txt
 
 		echo "Training models ... "
 		rm -rf $ML_MODEL
@@ -115,13 +117,13 @@ for NUM_TOP_GENES in "${NUM_TOP_GENES_LIST[@]}"; do
 
 
 	# echo "Preparing training/testing datasets ... "
-	# python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/training/chipdata.txt -o ${DIR_DATA}/training/training_set.txt
-	# python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/testing/chipdata.txt -o ${DIR_DATA}/testing/testing_set.txt
-	# python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/training/training_set.txt
-	# python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/testing/testing_set.txt 
+	# $STAGE_CACHE -o ${DIR_DATA}/training/training_set.expr.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/training/chipdata.txt -o ${DIR_DATA}/training/training_set.expr.txt
+	# $STAGE_CACHE -o ${DIR_DATA}/testing/testing_set.expr.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -t ${DIR_DATA}/training/top_de_genes.txt -i ${DIR_DATA}/testing/chipdata.txt -o ${DIR_DATA}/testing/testing_set.expr.txt
+	# $STAGE_CACHE -o ${DIR_DATA}/training/training_set.txt -- python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/training/training_set.expr.txt -o ${DIR_DATA}/training/training_set.txt
+	# $STAGE_CACHE -o ${DIR_DATA}/testing/testing_set.txt -- python ${DIR_SCRIPTS}/incorporate_patient_info.py -p ${PATIENT_SHEET} -d ${DIR_DATA}/testing/testing_set.expr.txt -o ${DIR_DATA}/testing/testing_set.txt
 
-	# python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/training/chipdata_full.txt -o ${DIR_DATA}/training/training_set_full.txt
-	# python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/testing/chipdata_full.txt -o ${DIR_DATA}/testing/testing_set_full.txt
+	# $STAGE_CACHE -o ${DIR_DATA}/training/training_set_full.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/training/chipdata_full.txt -o ${DIR_DATA}/training/training_set_full.txt
+	# $STAGE_CACHE -o ${DIR_DATA}/testing/testing_set_full.txt -- python ${DIR_SCRIPTS}/convert_expr_for_ml.py -i ${DIR_DATA}/testing/chipdata_full.txt -o ${DIR_DATA}/testing/testing_set_full.txt
 
 	# echo "Training models ... "
 	# rm -rf ${DIR_DATA}/training/ensemble
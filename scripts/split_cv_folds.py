@@ -1,8 +1,27 @@
 #!/usr/bin/python
+# Random stratified CV folds of the training chips (by the .N/.P/.C sample suffix).
+# By default the chipdata and valid chips of every leave-one-fold-out training set are
+# written for de_analysis.r. With --de the leave-fold-out DE tables are computed
+# directly: the group counts, sums and sums of squares of every fold are accumulated
+# once, each training set's statistics are the totals minus the held-out fold, and
+# top_de_genes_<i>.txt is written for summarize_cv_de_genes.py without per-fold data.
+# The folds are index arrays (cv_folds.StratifiedFolds); the DE stage accumulates each
+# fold from a view of the chips arranged in fold order once, not a copy per fold.
+# example:
+# python split_cv_folds.py -i ../data/run_proj_batch1-17_1/training/chipdata.txt -v ../data/run_proj_batch1-17_1/training/valid_chips.txt -f 10 -g N_vs_P_vs_C -o ../data/run_proj_batch1-17_1/training/cv_folds
+# python split_cv_folds.py --de -s 0 -i ../data/run_proj_batch1-17_1/training/chipdata.txt -v ../data/run_proj_batch1-17_1/training/valid_chips.txt -f 10 -g N_vs_P_vs_C -o ../data/run_proj_batch1-17_1/training/cv_folds
 import sys
 import argparse
 import numpy as np
-import random
+import expr_store
+import limma
+import de_state
+from indexed_axis import IndexedAxis
+from cv_folds import StratifiedFolds
+
+## sample name suffixes the folds are stratified by
+group_suffixes = {'N_vs_C': ['N', 'C'],
+				'N_vs_P_vs_C': ['N', 'P', 'C']}
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description="")
@@ -10,71 +29,64 @@ def parse_args(argv):
 	parser.add_argument('-v', '--valid_chips', dest='valid_chips')
 	parser.add_argument('-f', '--n_folds', dest='n_folds', type=int, default=10)
 	parser.add_argument('-g', '--group', dest='group')
+	parser.add_argument('-s', '--seed', dest='seed', type=int, default=None)
+	parser.add_argument('--de', dest='de', action='store_true', default=False, help='write the leave-fold-out DE tables instead of the fold data')
 	parser.add_argument('-o', '--output_directory', dest='output_directory')
 	parsed = parser.parse_args(argv[1:])
 	return parsed
 
-def main(argv):
-	parsed = parse_args(argv)
+def split_folds(suffixes, group, n_folds, seed=None):
+	## column indices of every fold: each suffix's samples shuffled and split into n_folds chunks
+	if group not in group_suffixes:
+		sys.exit("Group unavalilable!")
+	return StratifiedFolds(suffixes, n_folds, seed, groups=group_suffixes[group])
 
+def write_fold_data(parsed):
 	valid = np.loadtxt(parsed.valid_chips, dtype=str, delimiter="\t")
 	expr = np.loadtxt(parsed.input_expr, dtype=str, delimiter="\t")
-	labels = ['header']
-	for i in range(1,expr.shape[1]):
-		labels.append(expr[0,i].split(".")[1])
-	labels = np.array(labels)
+	suffixes = np.array([x.split(".")[1] for x in expr[0,1:]])
+	folds = split_folds(suffixes, parsed.group, parsed.n_folds, parsed.seed)
+	for i in range(parsed.n_folds):
+		indx_combined = folds.train(i)
+		np.savetxt(parsed.output_directory+'/chipdata_random_'+str(i+1)+'.txt',
+			expr[:,np.concatenate(([0], indx_combined+1))], fmt='%s', delimiter='\t')
+		np.savetxt(parsed.output_directory+'/valid_chips_random_'+str(i+1)+'.txt',
+			valid[indx_combined], fmt='%s', delimiter='\t')
 
-	if parsed.group == 'N_vs_C':
-		indx_N = np.where(labels == "N")[0]
-		indx_C = np.where(labels == "C")[0]
-		random.shuffle(indx_N)
-		random.shuffle(indx_C)
-		indx_N_rand_chunks = np.array_split(indx_N, parsed.n_folds)
-		indx_C_rand_chunks = np.array_split(indx_C, parsed.n_folds)
-		for i in range(parsed.n_folds):
-			indx_combined = [0]
-			for j in range(parsed.n_folds):
-				if j != i:
-					indx_combined += list(indx_N_rand_chunks[j]) 
-					indx_combined += list(indx_C_rand_chunks[j])
-			rand_expr = expr[:,indx_combined]
-			del indx_combined[0]
-			indx_combined = [k-1 for k in indx_combined]
-			rand_valid = valid[indx_combined]
-			np.savetxt(parsed.output_directory+'/chipdata_random_'+str(i+1)+'.txt',
-				rand_expr, fmt='%s', delimiter='\t')
-			np.savetxt(parsed.output_directory+'/valid_chips_random_'+str(i+1)+'.txt',
-				rand_valid, fmt='%s', delimiter='\t')
+def fold_states(expr, genes, samples, labels, folds, group):
+	## one DE state per fold, all accumulated around the same per-gene shift
+	chips = folds.arrange(expr, axis=1)
+	state = de_state.new_state(chips, genes, labels[folds.order], group)
+	states = []
+	for (i, indx) in enumerate(folds.folds):
+		fold = de_state.DEState(genes, state.levels, group, state.shift)
+		fold.add(folds.fold(chips, i, axis=1), genes, samples[indx], labels[indx])
+		states.append(fold)
+	return states
 
-	elif parsed.group == 'N_vs_P_vs_C':
-		indx_N = np.where(labels == "N")[0]
-		indx_P = np.where(labels == "P")[0]
-		indx_C = np.where(labels == "C")[0]
-		random.shuffle(indx_N)
-		random.shuffle(indx_P)
-		random.shuffle(indx_C)
-		indx_N_rand_chunks = np.array_split(indx_N, parsed.n_folds)
-		indx_P_rand_chunks = np.array_split(indx_P, parsed.n_folds)
-		indx_C_rand_chunks = np.array_split(indx_C, parsed.n_folds)
-		for i in range(parsed.n_folds):
-			indx_combined = [0]
-			for j in range(parsed.n_folds):
-				if j != i:
-					indx_combined += list(indx_N_rand_chunks[j]) 
-					indx_combined += list(indx_P_rand_chunks[j])
-					indx_combined += list(indx_C_rand_chunks[j])
-			rand_expr = expr[:,indx_combined]
-			del indx_combined[0]
-			indx_combined = [k-1 for k in indx_combined]
-			rand_valid = valid[indx_combined]
-			np.savetxt(parsed.output_directory+'/chipdata_random_'+str(i+1)+'.txt',
-				rand_expr, fmt='%s', delimiter='\t')
-			np.savetxt(parsed.output_directory+'/valid_chips_random_'+str(i+1)+'.txt',
-				rand_valid, fmt='%s', delimiter='\t')
+def write_fold_de(parsed):
+	[header, rows, expr] = expr_store.load_expr(parsed.input_expr)
+	samples = np.asarray(header[1:])
+	valid = np.loadtxt(parsed.valid_chips, dtype=str, delimiter="\t", ndmin=2)
+	labels = valid[IndexedAxis(valid[:,0], 'valid chips').positions(samples),1]
+	suffixes = np.array([x.split(".")[1] for x in samples])
+	folds = split_folds(suffixes, parsed.group, parsed.n_folds, parsed.seed)
 
+	states = fold_states(expr, rows[:,0], samples, labels, folds, parsed.group)
+	total = reduce(lambda a, b: a.merged(b), states)
+	for i in range(parsed.n_folds):
+		## same table as de_analysis.r <fold data> <group> 1 0
+		fit = total.without(states[i]).ebayes()
+		limma.write_results(fit, rows[:,0], parsed.output_directory+'/top_de_genes_'+str(i+1)+'.txt')
+		print "    cv fold", i+1, ":", len(samples) - len(folds.folds[i]), "samples"
+
+def main(argv):
+	parsed = parse_args(argv)
+	if parsed.de:
+		write_fold_de(parsed)
 	else:
-		sys.exit("Group unavalilable!")
+		write_fold_data(parsed)
 
 
 if __name__ == "__main__":
-    main(sys.argv)
\ No newline at end of file
+    main(sys.argv)
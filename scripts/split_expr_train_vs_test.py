@@ -2,6 +2,8 @@
 import sys
 import argparse
 import numpy as np
+from indexed_axis import IndexedAxis
+import expr_store
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description='')
@@ -14,34 +16,32 @@ def parse_args(argv):
 	parsed = parser.parse_args(argv[1:])
 	return parsed
 
+def split_samples(valid_chips, samples):
+	## index arrays of the training (flag "0") and testing (flag "1") chips in samples
+	samples = IndexedAxis(samples, 'samples')
+	chips = IndexedAxis(valid_chips[:,0], 'valid chips')
+	valid_chips = valid_chips[chips.positions(np.intersect1d(valid_chips[:,0], samples.ids)),:]
+	indx_valid_chips_tr = np.where(valid_chips[:,2] == "0")[0]
+	indx_valid_chips_te = np.where(valid_chips[:,2] == "1")[0]
+	indx_tr = samples.positions(valid_chips[indx_valid_chips_tr, 0])
+	indx_te = samples.positions(valid_chips[indx_valid_chips_te, 0])
+	return (valid_chips[indx_valid_chips_tr,:], indx_tr, valid_chips[indx_valid_chips_te,:], indx_te)
+
 def main(argv):
 	parsed = parse_args(argv)
 	
-	expr = np.loadtxt(parsed.input_expr, dtype=str, delimiter="\t")
-	rownames = expr[:,0][np.newaxis].T
-	expr = expr[:,1:]
+	[header, rownames, expr] = expr_store.load_expr(parsed.input_expr, keep_text=True)
+	samples = header[1:]
 
 	valid_chips = np.loadtxt(parsed.valid_chips, dtype=str)
-	intersected_indx = []
-	for c in np.intersect1d(valid_chips[:,0], expr[0,:]):
-		intersected_indx.append(np.where(valid_chips[:,0] == c)[0][0])
-		
-	valid_chips = valid_chips[intersected_indx,:]
-	indx_valid_chips_tr = np.where(valid_chips[:,2] == "0")[0]
-	indx_valid_chips_te = np.where(valid_chips[:,2] == "1")[0]
-	indx_tr = []
-	indx_te = []
-	for c in valid_chips[indx_valid_chips_tr, 0]:
-		indx_tr.append(np.where(expr[0,:] == c)[0][0])
-	for c in valid_chips[indx_valid_chips_te, 0]:
-		indx_te.append(np.where(expr[0,:] == c)[0][0])
+	(valid_chips_tr, indx_tr, valid_chips_te, indx_te) = split_samples(valid_chips, samples)
 
-	np.savetxt(parsed.train_expr, np.hstack((rownames, expr[:,indx_tr])), fmt="%s", delimiter="\t")
+	expr_store.write_expr(parsed.train_expr, np.append(header[0], samples[indx_tr]), rownames, expr[:,indx_tr])
 	if parsed.train_valid_chips != None:
-		np.savetxt(parsed.train_valid_chips, valid_chips[indx_valid_chips_tr,:], fmt="%s", delimiter="\t")
-	np.savetxt(parsed.test_expr, np.hstack((rownames, expr[:,indx_te])), fmt="%s", delimiter="\t")
+		np.savetxt(parsed.train_valid_chips, valid_chips_tr, fmt="%s", delimiter="\t")
+	expr_store.write_expr(parsed.test_expr, np.append(header[0], samples[indx_te]), rownames, expr[:,indx_te])
 	if parsed.test_valid_chips != None:
-		np.savetxt(parsed.test_valid_chips, valid_chips[indx_valid_chips_te,:], fmt="%s", delimiter="\t")
+		np.savetxt(parsed.test_valid_chips, valid_chips_te, fmt="%s", delimiter="\t")
 
 if __name__ == "__main__":
     main(sys.argv)
\ No newline at end of file
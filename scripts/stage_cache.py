@@ -0,0 +1,196 @@
+#!/usr/bin/python
+# Content-addressed cache for pipeline stages. A stage is keyed by its command line
+# and the content hashes of its inputs (every existing file named on the command
+# line plus any -i paths). If an entry for the key exists its outputs are linked
+# into place and the command is skipped; otherwise the command runs and its
+# outputs are stored under the key.
+# example:
+# python stage_cache.py -d ../data/run_proj_batch1-17_1/.stage_cache -o ../data/run_proj_batch1-17_1/training/training_set.txt -- python convert_expr_for_ml.py -t ../data/run_proj_batch1-17_1/training/top_de_genes.txt -i ../data/run_proj_batch1-17_1/training/chipdata.txt -o ../data/run_proj_batch1-17_1/training/training_set.txt
+
+import sys
+import os
+import argparse
+import hashlib
+import json
+import shutil
+import subprocess
+
+HASH_INDEX = 'file_hashes.json'
+MANIFEST = 'manifest.json'
+BLOCK_SIZE = 1 << 22
+
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description='Run a pipeline stage unless its outputs are cached for the same inputs and arguments.')
+	parser.add_argument('-d', '--cache_directory', dest='cache_directory')
+	parser.add_argument('-i', '--inputs', dest='inputs', nargs='*', default=[])
+	parser.add_argument('-o', '--outputs', dest='outputs', nargs='+')
+	parser.add_argument('command', nargs=argparse.REMAINDER)
+	parsed = parser.parse_args(argv[1:])
+	if len(parsed.command) > 0 and parsed.command[0] == '--':
+		parsed.command = parsed.command[1:]
+	return parsed
+
+
+def _load_json(filename, default):
+	if not os.path.isfile(filename):
+		return default
+	with open(filename, 'r') as f:
+		return json.load(f)
+
+
+def _dump_json(filename, data):
+	## written to a temporary file and renamed, so concurrent stages never read half a file
+	tmp = filename + '.%d.tmp' % os.getpid()
+	with open(tmp, 'w') as f:
+		json.dump(data, f, indent=1, sort_keys=True)
+	os.rename(tmp, filename)
+
+
+def _list_files(path):
+	if os.path.isfile(path):
+		return [path]
+	files = []
+	for (root, dirs, names) in os.walk(path):
+		dirs.sort()
+		for name in sorted(names):
+			files.append(os.path.join(root, name))
+	return files
+
+
+def hash_file(filename, hash_index):
+	## content hashes are remembered by (size, mtime), so unchanged multi-GB inputs are read once
+	filename = os.path.abspath(filename)
+	st = os.stat(filename)
+	entry = hash_index.get(filename)
+	if entry != None and entry[0] == st.st_size and entry[1] == st.st_mtime:
+		return entry[2]
+	h = hashlib.sha1()
+	with open(filename, 'rb') as f:
+		block = f.read(BLOCK_SIZE)
+		while block:
+			h.update(block)
+			block = f.read(BLOCK_SIZE)
+	hash_index[filename] = [st.st_size, st.st_mtime, h.hexdigest()]
+	return h.hexdigest()
+
+
+def stage_key(command, inputs, outputs, hash_index, scan_command=True):
+	## scan_command=False keys on the declared inputs only (paths on the command line may be output directories)
+	outputs = set(os.path.abspath(x) for x in outputs)
+	h = hashlib.sha1()
+	h.update(json.dumps(command).encode('utf-8'))
+	paths = [x for x in (list(command) if scan_command else []) + list(inputs)
+		if os.path.exists(x) and os.path.abspath(x) not in outputs]
+	for path in sorted(set(os.path.abspath(x) for x in paths)):
+		for filename in _list_files(path):
+			h.update(filename.encode('utf-8'))
+			h.update(hash_file(filename, hash_index).encode('utf-8'))
+	return h.hexdigest()
+
+
+def _link(src, dst):
+	## hard links share the bytes with the cache entry; fall back to a copy across devices
+	if os.path.isdir(src):
+		os.makedirs(dst)
+		for name in os.listdir(src):
+			_link(os.path.join(src, name), os.path.join(dst, name))
+		return
+	try:
+		os.link(src, dst)
+	except OSError:
+		shutil.copy2(src, dst)
+
+
+def _remove(path):
+	if os.path.isdir(path) and not os.path.islink(path):
+		shutil.rmtree(path)
+	elif os.path.lexists(path):
+		os.remove(path)
+
+
+def _entry_names(outputs):
+	return ['%d_%s' % (j, os.path.basename(os.path.normpath(outputs[j]))) for j in range(len(outputs))]
+
+
+def restore(entry_dir, outputs):
+	for (name, output) in zip(_entry_names(outputs), outputs):
+		cached = os.path.join(entry_dir, name)
+		if os.path.isfile(output) and os.path.samefile(cached, output):
+			continue
+		_remove(output)
+		parent = os.path.dirname(os.path.abspath(output))
+		if not os.path.exists(parent):
+			os.makedirs(parent)
+		_link(cached, output)
+
+
+def store(entry_dir, outputs, command, key):
+	tmp_dir = entry_dir + '.%d.tmp' % os.getpid()
+	_remove(tmp_dir)
+	os.makedirs(tmp_dir)
+	for (name, output) in zip(_entry_names(outputs), outputs):
+		_link(output, os.path.join(tmp_dir, name))
+	_dump_json(os.path.join(tmp_dir, MANIFEST), {'key': key, 'command': command,
+		'outputs': [os.path.abspath(x) for x in outputs]})
+	if os.path.exists(entry_dir):
+		shutil.rmtree(tmp_dir)
+	else:
+		os.rename(tmp_dir, entry_dir)
+
+
+def lookup(cache_directory, command, inputs, outputs, scan_command=True):
+	## returns (key, entry directory, whether the entry exists)
+	if not os.path.exists(cache_directory):
+		os.makedirs(cache_directory)
+	hash_index_file = os.path.join(cache_directory, HASH_INDEX)
+	hash_index = _load_json(hash_index_file, {})
+	key = stage_key(command, inputs, outputs, hash_index, scan_command)
+	_dump_json(hash_index_file, hash_index)
+	entry_dir = os.path.join(cache_directory, key[:2], key)
+	return (key, entry_dir, os.path.isfile(os.path.join(entry_dir, MANIFEST)))
+
+
+def prepare_outputs(outputs):
+	## outputs from an older version are replaced, never written through
+	for output in outputs:
+		_remove(output)
+
+
+def commit(entry_dir, outputs, command, key):
+	missing = [x for x in outputs if not os.path.exists(x)]
+	if len(missing) > 0:
+		sys.stderr.write('Error: stage did not write %s\n' % ', '.join(missing))
+		return 1
+	if not os.path.exists(os.path.dirname(entry_dir)):
+		os.makedirs(os.path.dirname(entry_dir))
+	store(entry_dir, outputs, command, key)
+	return 0
+
+
+def run_stage(cache_directory, command, inputs, outputs):
+	## returns (exit code, whether the cached outputs were used)
+	(key, entry_dir, hit) = lookup(cache_directory, command, inputs, outputs)
+	if hit:
+		restore(entry_dir, outputs)
+		return (0, True)
+
+	prepare_outputs(outputs)
+	code = subprocess.call(command)
+	if code != 0:
+		return (code, False)
+	return (commit(entry_dir, outputs, command, key), False)
+
+
+def main(argv):
+	parsed = parse_args(argv)
+	if len(parsed.command) == 0:
+		sys.exit('Error: no stage command given.')
+	(code, cached) = run_stage(parsed.cache_directory, parsed.command, parsed.inputs, parsed.outputs)
+	if cached:
+		print('Cached: %s' % ' '.join(parsed.outputs))
+	sys.exit(code)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
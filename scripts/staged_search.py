@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# Staged CV search for boosting (GradientBoostingClassifier, AdaBoostClassifier).
+# Every candidate of the grid without n_estimators (e.g. every learning rate) is fitted
+# once per fold with the largest n_estimators, and the accuracy of every prefix of the
+# ensemble (1..n_estimators stages) is read from staged_predict, so the whole
+# (candidate x n_estimators) validation surface costs one fit per candidate and fold.
+# The early stopping point of a candidate is the smallest n_estimators with its best
+# mean CV accuracy. cv_results_ holds every candidate at its stopping point in the
+# GridSearchCV layout, so crc_training.parse_cv_result reads it as before; surface_
+# holds the mean CV accuracy of every candidate and stage.
+# example:
+# clf = StagedBoostingCV(GradientBoostingClassifier(), {'learning_rate': [.01, .005, .001], 'n_estimators': [1000]}, cv=10, n_jobs=4)
+# clf.fit(expr_tr, label_tr)
+# params = parse_cv_result(clf)
+# write_surface(clf.candidates_, clf.surface_, 'grad_boosting_staged_surface.txt')
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, check_cv
+from sklearn.externals.joblib import Parallel, delayed
+
+
+def staged_accuracy(clf, X, y, n_stages):
+	## accuracy after every stage of a fitted boosting model; an ensemble that stopped
+	## early (AdaBoost with a perfect fit) keeps its last accuracy for the later stages
+	y = np.asarray(y)
+	scores = np.array([np.mean(pred == y) for pred in clf.staged_predict(X)])
+	scores = scores[:n_stages]
+	return np.append(scores, np.repeat(scores[-1], n_stages - len(scores)))
+
+
+def _staged_fold(estimator, params, X, y, sample_weight, train, test, n_stages):
+	clf = clone(estimator).set_params(**params)
+	if sample_weight is None:
+		clf.fit(X[train], y[train])
+	else:
+		clf.fit(X[train], y[train], sample_weight=sample_weight[train])
+	return (staged_accuracy(clf, X[train], y[train], n_stages), staged_accuracy(clf, X[test], y[test], n_stages))
+
+
+class StagedBoostingCV(object):
+	def __init__(self, estimator, param_grid, cv=5, n_jobs=1):
+		self.estimator = estimator
+		self.param_grid = param_grid
+		self.cv = cv
+		self.n_jobs = n_jobs
+
+	def fit(self, X, y, sample_weight=None):
+		(X, y) = (np.asarray(X), np.asarray(y))
+		sample_weight = None if sample_weight is None else np.asarray(sample_weight)
+		grid = dict(self.param_grid)
+		n_stages = max(grid.pop('n_estimators', [self.estimator.n_estimators]))
+		candidates = list(ParameterGrid(grid))
+		folds = list(check_cv(self.cv, y, classifier=True).split(X, y))
+		scores = Parallel(n_jobs=self.n_jobs)(delayed(_staged_fold)(self.estimator, dict(p, n_estimators=n_stages), X, y, sample_weight, train, test, n_stages)
+			for p in candidates for (train, test) in folds)
+		## candidates x folds x stages
+		train_scores = np.array([s[0] for s in scores]).reshape(len(candidates), len(folds), n_stages)
+		test_scores = np.array([s[1] for s in scores]).reshape(len(candidates), len(folds), n_stages)
+
+		self.candidates_ = candidates
+		self.surface_ = np.mean(test_scores, axis=1)
+		self.train_surface_ = np.mean(train_scores, axis=1)
+		stops = np.argmax(self.surface_, axis=1)
+		rows = np.arange(len(candidates))
+		self.cv_results_ = {'params': [dict(p, n_estimators=int(s)+1) for (p, s) in zip(candidates, stops)],
+			'mean_test_score': self.surface_[rows, stops],
+			'std_test_score': np.std(test_scores, axis=1)[rows, stops],
+			'mean_train_score': self.train_surface_[rows, stops]}
+		self.cv_results_['rank_test_score'] = np.argsort(np.argsort(-self.cv_results_['mean_test_score'], kind='mergesort')) + 1
+		self.best_index_ = int(np.argmax(self.cv_results_['mean_test_score']))
+		self.best_params_ = self.cv_results_['params'][self.best_index_]
+		self.best_score_ = self.cv_results_['mean_test_score'][self.best_index_]
+		print "Staged CV:", len(candidates), "candidates x", len(folds), "folds, early stopping at", self.best_params_['n_estimators'], "of", n_stages, "stages"
+		return self
+
+
+def write_surface(candidates, surface, filename):
+	## one row per candidate, one column per n_estimators
+	with open(filename, 'w') as f:
+		f.write('params\t' + '\t'.join(str(n+1) for n in range(surface.shape[1])) + '\n')
+		for (p, row) in zip(candidates, surface):
+			f.write(','.join('%s=%s' % (k, p[k]) for k in sorted(p)) + '\t' + '\t'.join('%.4f' % x for x in row) + '\n')
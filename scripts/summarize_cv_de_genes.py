@@ -1,36 +1,41 @@
 #!/usr/bin/python
+# Aggregate the ranked DE lists of the CV folds (top_de_genes_<i>.txt) into one list
+# of the top genes; genes missing from some fold lists are ranked after their end.
+# example:
+# python summarize_cv_de_genes.py -i ../data/run_proj_batch1-17_1/training/cv_folds -f 10 -t 400 -o ../data/run_proj_batch1-17_1/training/top_de_genes.txt
+# python summarize_cv_de_genes.py -i ../data/run_proj_batch1-17_1/training/cv_folds -f 10 -t 400 -m rra -o ../data/run_proj_batch1-17_1/training/top_de_genes.txt
 import sys
 import argparse
 import numpy as np
-# import scipy.stats as ss
-import operator
+import rank_aggregation
+
+## score column of the output per method
+score_names = {'sum': 'sum_ranking', 'mean': 'mean_ranking', 'rra': 'rra_score'}
 
 def parse_args(argv):
 	parser = argparse.ArgumentParser(description="")
 	parser.add_argument('-i', '--cv_directory', dest='cv_directory')
 	parser.add_argument('-f', '--n_folds', dest='n_folds', type=int, default=10)
 	parser.add_argument('-t', '--n_top_genes', dest='n_top_genes', type=int)
+	parser.add_argument('-m', '--method', dest='method', default='sum', help='options: %s' % rank_aggregation.methods)
 	parser.add_argument('-o', '--output_file', dest='output_file')
 	parsed = parser.parse_args(argv[1:])
+	if parsed.method not in rank_aggregation.methods:
+		sys.exit("Error: unknown method %s, options: %s" % (parsed.method, rank_aggregation.methods))
 	return parsed
 
 def main(argv):
 	parsed = parse_args(argv)
 
-	rankings = {}
-	for i in range(parsed.n_folds):
-		cv_de = np.loadtxt(parsed.cv_directory+'/top_de_genes_'+str(i+1)+'.txt', dtype=str, skiprows=1, usecols=[0])
-		if i == 0:
-			for j in range(len(cv_de)):
-				rankings[cv_de[j]] = j
-		else:
-			for j in range(len(cv_de)):
-				rankings[cv_de[j]] += j
-	
-	out = np.array(sorted(rankings.items(), key=operator.itemgetter(1)))
-	header = np.array(["gene", "sum_ranking"])[np.newaxis]
-	out = np.vstack((header, out[:parsed.n_top_genes]))
-	np.savetxt(parsed.output_file, out, fmt="%s", delimiter="\t")
+	lists = [rank_aggregation.read_ranked_list(parsed.cv_directory+'/top_de_genes_'+str(i+1)+'.txt') for i in range(parsed.n_folds)]
+	(genes, ranks, lengths) = rank_aggregation.rank_matrix(lists)
+	scores = rank_aggregation.aggregate(ranks, lengths, parsed.method)
+	top = rank_aggregation.top_k(scores, parsed.n_top_genes)
+
+	with open(parsed.output_file, 'w') as f:
+		f.write("gene\t" + score_names[parsed.method] + "\n")
+		for i in top:
+			f.write(genes[i] + "\t" + ('%.15g' % scores[i]) + "\n")
 
 if __name__ == "__main__":
-    main(sys.argv)
\ No newline at end of file
+    main(sys.argv)
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# limma.py against the topTable output of de_analysis.r on a toy matrix (data/: 300 TCs x
+# 4 N, 3 P, 4 C chips, 35 TCs DE). The expected tables (CvsN, all genes, sorted by P) were
+# computed with inmoose 0.9.1, a python port of limma's lmFit/eBayes/topTable checked
+# against R, as no R was at hand; with R they are regenerated from the scripts directory by
+# Rscript de_analysis.r tests/data/limma_toy_expr.txt tests/data/limma_toy_valid_chips.txt N_vs_P_vs_C 1 0 tests/data/limma_toy_toptable_N_vs_P_vs_C.txt
+# Rscript de_analysis.r tests/data/limma_toy_expr.txt tests/data/limma_toy_valid_chips_N_vs_C.txt N_vs_C 1 0 tests/data/limma_toy_toptable_N_vs_C.txt
+# example:
+# python -m unittest discover -s tests
+
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import limma
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def load_toy(valid_chips):
+	## float64 values as R reads them, not the float32 of expr_store
+	expr = np.loadtxt(os.path.join(DATA, 'limma_toy_expr.txt'), dtype=str, delimiter='\t')
+	valid = np.loadtxt(os.path.join(DATA, valid_chips), dtype=str, delimiter='\t')
+	return (expr[1:,0], expr[0,1:], expr[1:,1:].astype(np.float64), valid)
+
+
+class TopTableTest(unittest.TestCase):
+	def check_group(self, group, valid_chips):
+		(genes, samples, expr, valid) = load_toy(valid_chips)
+		fit = limma.de_analysis(expr, samples, valid, group)
+		(indx, table) = limma.top_table(fit, coef=0)
+		expected = np.loadtxt(os.path.join(DATA, 'limma_toy_toptable_' + group + '.txt'), dtype=str, delimiter='\t', skiprows=1)
+		self.assertEqual(list(genes[indx]), list(expected[:,0]))
+		for column in ['t', 'P.Value', 'adj.P.Val', 'logFC', 'B']:
+			j = limma.TOP_TABLE_COLUMNS.index(column)
+			np.testing.assert_allclose(table[indx,j], expected[:,j+1].astype(np.float64), rtol=1e-9, err_msg=column)
+
+	def test_n_vs_p_vs_c(self):
+		self.check_group('N_vs_P_vs_C', 'limma_toy_valid_chips.txt')
+
+	def test_n_vs_c(self):
+		self.check_group('N_vs_C', 'limma_toy_valid_chips_N_vs_C.txt')
+
+
+class TmixtureTest(unittest.TestCase):
+	def test_missing_statistics_dropped(self):
+		## NA statistics are neither selected nor counted in ngenes
+		rs = np.random.RandomState(0)
+		tstat = rs.standard_t(5, 1000)
+		tstat[:50] *= 4
+		v0 = limma.tmixture(tstat, .5, 5., .01, (.01, 100))
+		self.assertEqual(limma.tmixture(np.append([np.nan]*10, tstat), .5, 5., .01, (.01, 100)), v0)
+
+
+if __name__ == "__main__":
+    unittest.main()